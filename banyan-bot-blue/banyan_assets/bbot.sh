@@ -1,12 +1,2 @@
 #!/bin/bash
-backplane &
-sleep 3
-sudo python3 /home/pi/crickit_gateway.py &
-sleep 5
-sudo python3 /home/pi/robot_control.py &
-sleep 2
-sudo python3 /home/pi/bluetooth_gateway.py &
-sleep 4
-
-
-
+python3 /home/pi/bbot_launcher.py -f /home/pi/bbot_launch.csv &
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+"""
+bbot_launcher.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import csv
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import msgpack
+import zmq
+from python_banyan.banyan_base import BanyanBase
+
+from zmq_options import QUERY_READY_TOPIC, READY_TOPIC
+
+
+def local_ip_address():
+    """
+    The address that the backplane binds to, found the same way
+    as the backplane finds it.
+    :return: IP address of this computer
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(('8.8.8.8', 1))
+        return s.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+    finally:
+        s.close()
+
+
+class Component(object):
+    """
+    A component of the robot, as described by a row of the
+    launcher csv file.
+    """
+
+    def __init__(self, name, command_string, after, timeout):
+        """
+        :param name: process name - passed to the component with -n,
+                     and used in its readiness announcement
+        :param command_string: command that starts the component
+        :param after: names of the components that must be ready first
+        :param timeout: seconds to wait for the readiness announcement
+        """
+        self.name = name
+        self.command = shlex.split(command_string) + ['-n', name]
+        self.after = after
+        self.timeout = timeout
+        self.process = None
+
+        # launcher times in seconds from the launcher start
+        self.started = None
+        self.ready = None
+
+        # boot phases announced by the component
+        self.phases = []
+
+        # waiting, started, ready, timed out or exited
+        self.state = 'waiting'
+
+
+class BbotLauncher(BanyanBase):
+    """
+    Starts the backplane and the components of the robot, each as
+    soon as the components it depends on are ready, instead of after
+    fixed delays.
+
+    A component is ready when it publishes its readiness announcement
+    on the component_ready topic. Until then it is asked again every
+    QUERY_INTERVAL seconds, in case the first announcement was missed.
+    A component that is not ready within its timeout, or that exits,
+    is reported, and the components that depend on it are started
+    anyway.
+
+    The launcher csv file has the columns:
+    name,command_string,after,timeout
+    after is a space separated list of names, and may be empty.
+
+    When all of the components are ready, the boot phases of each are
+    reported, and the launcher stays running until Control-C, when it
+    stops the components and the backplane.
+
+    usage: bbot_launcher.py [-h] [-b BACKPLANE] [-f LAUNCH_FILE]
+                            [-p PUBLISHER_PORT] [-s SUBSCRIBER_PORT]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -b BACKPLANE          Command that starts the backplane, or None
+                                if it is already running
+          -f LAUNCH_FILE        Launcher csv file
+          -p PUBLISHER_PORT     Publisher IP port
+          -s SUBSCRIBER_PORT    Subscriber IP port
+    """
+
+    # seconds between readiness queries
+    QUERY_INTERVAL = .5
+
+    # the longest time in seconds to wait for the backplane
+    BACKPLANE_TIMEOUT = 10
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        self.start_time = time.monotonic()
+        self.components = self.read_launch_file(kwargs['launch_file'])
+        self.backplane = None
+        ip_address = local_ip_address()
+
+        if kwargs['backplane']:
+            self.backplane = subprocess.Popen(
+                shlex.split(kwargs['backplane']))
+            try:
+                self.wait_for_backplane(ip_address, kwargs['publisher_port'])
+            except (KeyboardInterrupt, RuntimeError):
+                self.backplane.send_signal(signal.SIGINT)
+                raise
+        self.backplane_ready = self.elapsed()
+        print('Backplane ready at %.2f seconds' % self.backplane_ready)
+
+        super(BbotLauncher, self).__init__(
+            back_plane_ip_address=ip_address,
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name='BbotLauncher')
+        self.set_subscriber_topic(READY_TOPIC)
+        self.poller = zmq.Poller()
+        self.poller.register(self.subscriber, zmq.POLLIN)
+
+        try:
+            self.boot()
+            self.print_boot_phases()
+            self.supervise()
+        except KeyboardInterrupt:
+            self.clean_up()
+            sys.exit(0)
+
+    @staticmethod
+    def read_launch_file(launch_file):
+        """
+        :param launch_file: launcher csv file name
+        :return: the components in file order
+        """
+        components = []
+        with open(launch_file) as csv_file:
+            for row in csv.DictReader(csv_file):
+                components.append(Component(row['name'],
+                                            row['command_string'],
+                                            row['after'].split(),
+                                            float(row['timeout'])))
+
+        names = [component.name for component in components]
+        for component in components:
+            for name in component.after:
+                if name not in names:
+                    raise RuntimeError('Unknown component: ', name)
+        return components
+
+    def elapsed(self):
+        """
+        :return: seconds since the launcher was started
+        """
+        return time.monotonic() - self.start_time
+
+    def wait_for_backplane(self, ip_address, publisher_port):
+        """
+        Wait until the backplane accepts connections.
+        :param ip_address: backplane IP address
+        :param publisher_port: backplane publisher port
+        """
+        deadline = time.monotonic() + self.BACKPLANE_TIMEOUT
+        while True:
+            try:
+                socket.create_connection((ip_address, int(publisher_port)),
+                                         timeout=1).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('Backplane not started')
+                time.sleep(.02)
+
+    def boot(self):
+        """
+        Start each component when the components it depends on are
+        ready, until every component is ready or has failed.
+        """
+        names = {component.name: component for component in self.components}
+        next_query = time.monotonic()
+
+        while True:
+            for component in self.components:
+                if component.state == 'waiting' and \
+                        all(names[name].state not in ('waiting', 'started')
+                            for name in component.after):
+                    component.process = subprocess.Popen(component.command)
+                    component.started = self.elapsed()
+                    component.state = 'started'
+                    print('Started %s at %.2f seconds' % (component.name,
+                                                          component.started))
+
+            started = [component for component in self.components
+                       if component.state == 'started']
+            if not started and all(component.state != 'waiting'
+                                   for component in self.components):
+                return
+
+            for component in started:
+                if component.process.poll() is not None:
+                    component.state = 'exited'
+                    print('%s exited with %d' % (component.name,
+                                                 component.process.returncode))
+                elif self.elapsed() - component.started > component.timeout:
+                    component.state = 'timed out'
+                    print('%s not ready after %.1f seconds' %
+                          (component.name, component.timeout))
+
+            if time.monotonic() >= next_query:
+                self.publish_payload({}, QUERY_READY_TOPIC)
+                next_query += self.QUERY_INTERVAL
+
+            if self.poller.poll(100):
+                topic, payload = self.subscriber.recv_multipart()
+                self.component_ready(msgpack.unpackb(payload, raw=False))
+
+    def component_ready(self, payload):
+        """
+        Record a readiness announcement.
+        :param payload: the announcement
+        """
+        for component in self.components:
+            if component.name == payload.get('component') and \
+                    component.state == 'started':
+                component.ready = self.elapsed()
+                component.phases = payload.get('phases', [])
+                component.state = 'ready'
+                print('%s ready at %.2f seconds' % (component.name,
+                                                    component.ready))
+
+    def print_boot_phases(self):
+        """
+        Print when each component was started and became ready,
+        and the boot phases that it announced.
+        """
+        print('Boot phases - seconds from the launcher start, phases '
+              'in seconds from the component start:')
+        print('  %-24s %8.2f' % ('backplane', self.backplane_ready))
+        for component in self.components:
+            line = '  %-24s %8s' % (component.name, component.state)
+            if component.started is not None:
+                line += '  started %6.2f' % component.started
+            if component.ready is not None:
+                line += '  ready %6.2f' % component.ready
+            for phase, seconds in component.phases:
+                line += '  %s %.2f' % (phase, seconds)
+            print(line)
+        print('Boot complete in %.2f seconds' % self.elapsed())
+
+    def supervise(self):
+        """
+        Report components that exit, until Control-C.
+        """
+        running = [component for component in self.components
+                   if component.process and component.process.poll() is None]
+        while running:
+            time.sleep(1)
+            for component in list(running):
+                if component.process.poll() is not None:
+                    print('%s exited with %d' % (component.name,
+                                                 component.process.returncode))
+                    running.remove(component)
+        while True:
+            time.sleep(1)
+
+    def clean_up(self):
+        """
+        Stop the components, last started first, then the backplane.
+        """
+        processes = [component.process for component in
+                     sorted(self.components, key=lambda component:
+                            component.started or 0, reverse=True)
+                     if component.process]
+        if self.backplane:
+            processes.append(self.backplane)
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+                try:
+                    process.wait(5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        super(BbotLauncher, self).clean_up()
+
+
+def bbot_launcher():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="backplane", default="backplane",
+                        help="Command that starts the backplane, or None "
+                             "if it is already running")
+    parser.add_argument("-f", dest="launch_file", default="bbot_launch.csv",
+                        help="Launcher csv file")
+    parser.add_argument("-p", dest="publisher_port", default='43124',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43125',
+                        help="Subscriber IP port")
+
+    args = parser.parse_args()
+
+    if args.backplane == 'None':
+        args.backplane = None
+    kw_options = {'backplane': args.backplane,
+                  'launch_file': args.launch_file,
+                  'publisher_port': args.publisher_port,
+                  'subscriber_port': args.subscriber_port}
+
+    BbotLauncher(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    bbot_launcher()
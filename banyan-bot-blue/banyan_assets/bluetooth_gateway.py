@@ -23,45 +23,59 @@ import argparse
 import json
 import subprocess
 import signal
+import socket
 import sys
 import subprocess
 import threading
 
-from bluetooth import *
-
-from boltons.socketutils import BufferedSocket
+import msgpack
+from boltons.socketutils import BufferedSocket, ConnectionClosed
 
 from python_banyan.banyan_base import BanyanBase
 
+from zmq_options import SocketOptions
+
 
 # noinspection PyMethodMayBeStatic,PyBroadException
-class BlueToothGateway(BanyanBase, threading.Thread):
+class BlueToothGateway(SocketOptions, BanyanBase, threading.Thread):
     """
     This class implements Bluetooth an RFCOMM server or client,
     configurable from command line options.
 
+    With the tcp transport, a TCP socket stands in for the RFCOMM
+    socket, so that the gateway can be tested against
+    test_fixtures/fixture_server.py without Bluetooth. The client
+    connects to SERVER_BT_ADDRESS, which is then an IP address.
+
     usage: bluetooth_gateway.py [-h] [-a SERVER_BT_ADDRESS]
                             [-b BACK_PLANE_IP_ADDRESS] [-g GATEWAY_TYPE]
-                            [-j JSON_DATA] [-l PUBLISH_TOPIC]
+                            [-j JSON_DATA] [-k TRANSPORT] [-l PUBLISH_TOPIC]
                             [-m SUBSCRIBER_LIST [SUBSCRIBER_LIST ...]]
-                            [-n PROCESS_NAME] [-p PUBLISHER_PORT]
+                            [-n PROCESS_NAME] [-o TCP_PORT] [-p PUBLISHER_PORT]
                             [-s SUBSCRIBER_PORT] [-t LOOP_TIME] [-u UUID]
+                            [-y RECEIVE_MODE] [-z SOCKET_PROFILE]
 
         optional arguments:
           -h, --help            show this help message and exit
-          -a SERVER_BT_ADDRESS  Bluetooth MAC Address of Bluetooth Gateway
+          -a SERVER_BT_ADDRESS  Bluetooth MAC Address of Bluetooth Gateway,
+                                or IP address for the tcp transport
           -b BACK_PLANE_IP_ADDRESS
                                 None or IP address used by Back Plane
           -g GATEWAY_TYPE       Type of Gateway : server or client
           -j JSON_DATA          Bluetooth packets json encoded True or False
+          -k TRANSPORT          rfcomm or tcp
           -l PUBLISH_TOPIC      Banyan publisher topic
           -m SUBSCRIBER_LIST [SUBSCRIBER_LIST ...]
                                 Banyan topics space delimited: topic1 topic2 topic3
           -n PROCESS_NAME       Set process name in banner
+          -o TCP_PORT           TCP port for the tcp transport
           -p PUBLISHER_PORT     Publisher IP port
           -s SUBSCRIBER_PORT    Subscriber IP port
           -t LOOP_TIME          Event Loop Timer in seconds
           -u UUID               Bluetooth UUID
+          -y RECEIVE_MODE       Receive loop: sleep or poll
+          -z SOCKET_PROFILE     zmq socket profile: default, low_latency or
+                                throughput
 
     """
 
@@ -74,10 +88,13 @@ class BlueToothGateway(BanyanBase, threading.Thread):
                  gateway_type=BTG_SERVER, publish_topic=None,
                  uuid='e35d6386-1802-414f-b2b9-375c92fa23e0',
                  server_bt_address=None, subscriber_list=None,
-                 json_data=False):
+                 json_data=False, socket_profile='default',
+                 receive_mode='sleep', transport='rfcomm', tcp_port=43130):
         """
         This method initialize the class for operation
 
+        :param transport: rfcomm, or tcp to test without Bluetooth
+        :param tcp_port: port for the tcp transport
         """
         # save input parameters as instance variables
         self.back_plane_ip_address = back_plane_ip_address
@@ -100,6 +117,11 @@ class BlueToothGateway(BanyanBase, threading.Thread):
         self.uuid = uuid
         self.server_bt_address = server_bt_address
         self.json_data = json_data
+        self.transport = transport
+        self.tcp_port = tcp_port
+
+        if self.transport not in ('rfcomm', 'tcp'):
+            raise RuntimeError('Unknown transport: ', self.transport)
 
         # initialize the parent
 
@@ -110,6 +132,8 @@ class BlueToothGateway(BanyanBase, threading.Thread):
             process_name=self.process_name,
             loop_time=self.loop_time)
 
+        self.apply_socket_profile(socket_profile, receive_mode)
+
         self.subscriber_list = subscriber_list
 
         for topic in self.subscriber_list:
@@ -118,6 +142,79 @@ class BlueToothGateway(BanyanBase, threading.Thread):
 
         print('Publish to   : ', self.publish_topic)
 
+        if self.transport == 'tcp':
+            self.client_sock = self.tcp_connect()
+        else:
+            self.client_sock = self.rfcomm_connect()
+
+        self.mark_phase('connected')
+
+        # wrap the socket for both client and server
+        self.bsock = BufferedSocket(self.client_sock)
+
+        # cleared when the peer closes the bluetooth connection
+        self.connected = True
+
+        if self.receive_mode == 'poll':
+            # the receive loop handles bluetooth data as it arrives
+            self.add_poll_handler(self.client_sock.fileno(),
+                                  self.receive_bluetooth)
+            self.bt_publisher = self.publisher
+        else:
+            # the receive thread publishes on its own socket, since
+            # this thread publishes the readiness announcement
+            self.bt_publisher = self.create_publisher()
+
+            # create a thread to handle receipt of bluetooth data
+            threading.Thread.__init__(self)
+            self.daemon = True
+
+            # start the thread
+            self.start()
+
+        self.announce_ready(self.process_name)
+
+        # this will keep the program running forever
+        try:
+            self.receive_loop()
+        except KeyboardInterrupt:
+            self.clean_up()
+            sys.exit(0)
+
+    def incoming_message_processing(self, topic, payload):
+        """
+        Process the incoming Banyan message to
+        be sent to the Bluetooth network
+        :param topic: topic string
+        :param payload: payload data
+        """
+
+        # if the bluetooth device requires json encoding
+        if self.json_data:
+            data_out = json.dumps(payload)
+            data_out = data_out.encode('utf-8')
+
+            try:
+                self.bsock.send(data_out)
+            except Exception as e:
+                self.clean_up()
+                raise RuntimeError('Write Error')
+        else:
+            # convert the payload to a string
+            data_out = str(payload['report'])
+            data_out = data_out.encode('utf-8')
+            self.client_sock.send(data_out)
+
+    def rfcomm_connect(self):
+        """
+        Accept a connection from, or connect to, the remote
+        Bluetooth device.
+        :return: the connected RFCOMM socket
+        """
+        # import here so that the tcp transport may be used on
+        # machines without pybluez
+        import bluetooth
+
         mac = self.find_local_mac_address()
         if mac:
             print('Local Bluetooth MAC Address: ', mac)
@@ -126,29 +223,30 @@ class BlueToothGateway(BanyanBase, threading.Thread):
             sys.exit(0)
 
         if self.gateway_type == self.BTG_SERVER:
-            self.server_sock = BluetoothSocket(RFCOMM)
-            self.server_sock.bind(("", PORT_ANY))
+            self.server_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+            self.server_sock.bind(("", bluetooth.PORT_ANY))
             self.server_sock.listen(1)
 
             port = self.server_sock.getsockname()[1]
 
-            advertise_service(self.server_sock, "BanyanBlueToothServer",
-                              service_id=uuid,
-                              service_classes=[uuid, SERIAL_PORT_CLASS],
-                              profiles=[SERIAL_PORT_PROFILE],
-                              )
+            bluetooth.advertise_service(
+                self.server_sock, "BanyanBlueToothServer",
+                service_id=self.uuid,
+                service_classes=[self.uuid, bluetooth.SERIAL_PORT_CLASS],
+                profiles=[bluetooth.SERIAL_PORT_PROFILE],
+            )
 
             print("Waiting for connection on RFCOMM channel %d" % port)
             try:
-                self.client_sock, self.client_info = self.server_sock.accept()
+                client_sock, self.client_info = self.server_sock.accept()
             except KeyboardInterrupt:
                 self.clean_up()
                 sys.exit(0)
 
             print("Accepted connection from ", self.client_info)
         else:
-            service_matches = find_service(uuid=self.uuid,
-                                           address=self.server_bt_address)
+            service_matches = bluetooth.find_service(
+                uuid=self.uuid, address=self.server_bt_address)
 
             if len(service_matches) == 0:
                 print("Could not find the remote Bluetooth server - exiting")
@@ -163,49 +261,41 @@ class BlueToothGateway(BanyanBase, threading.Thread):
             print("connecting to \"%s\" on %s" % (name, host))
 
             # Create the client socket
-            self.client_sock = BluetoothSocket(RFCOMM)
-            self.client_sock.connect((host, port))
-
-        # wrap the socket for both client and server
-        self.bsock = BufferedSocket(self.client_sock)
+            client_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+            client_sock.connect((host, port))
 
-        # create a thread to handle receipt of bluetooth data
-        threading.Thread.__init__(self)
-        self.daemon = True
+        return client_sock
 
-        # start the thread
-        self.start()
-
-        # this will keep the program running forever
-        try:
-            self.receive_loop()
-        except KeyboardInterrupt:
-            self.clean_up()
-            sys.exit(0)
-
-    def incoming_message_processing(self, topic, payload):
+    def tcp_connect(self):
         """
-        Process the incoming Banyan message to
-        be sent to the Bluetooth network
-        :param topic: topic string
-        :param payload: payload data
+        Accept a connection from, or connect to, a TCP stand-in for
+        the remote Bluetooth device.
+        :return: the connected TCP socket
         """
+        if self.gateway_type == self.BTG_SERVER:
+            self.server_sock = socket.socket(socket.AF_INET,
+                                             socket.SOCK_STREAM)
+            self.server_sock.setsockopt(socket.SOL_SOCKET,
+                                        socket.SO_REUSEADDR, 1)
+            self.server_sock.bind(("", self.tcp_port))
+            self.server_sock.listen(1)
 
-        # if the bluetooth device requires json encoding
-        if self.json_data:
-            data_out = json.dumps(payload)
-            data_out = data_out.encode('utf-8')
-
+            print("Waiting for connection on TCP port %d" % self.tcp_port)
             try:
-                self.bsock.send(data_out)
-            except Exception as e:
+                client_sock, self.client_info = self.server_sock.accept()
+            except KeyboardInterrupt:
                 self.clean_up()
-                raise RuntimeError('Write Error')
+                sys.exit(0)
+
+            print("Accepted connection from ", self.client_info)
         else:
-            # convert the payload to a string
-            data_out = str(payload['report'])
-            data_out = data_out.encode('utf-8')
-            self.client_sock.send(data_out)
+            host = self.server_bt_address or '127.0.0.1'
+            print("connecting to %s:%d" % (host, self.tcp_port))
+            client_sock = socket.create_connection((host, self.tcp_port))
+
+        # small messages are sent as soon as they are written
+        client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return client_sock
 
     def find_local_mac_address(self):
         """
@@ -231,34 +321,77 @@ class BlueToothGateway(BanyanBase, threading.Thread):
         :return:
         """
 
-        while True:
-            # if json encoding look for termination character
-            # used for a dictionary
-            if self.json_data:
+        while self.connected:
+            try:
+                self.receive_bluetooth()
+            except KeyboardInterrupt:
+                self.clean_up()
+                sys.exit(0)
+
+    def receive_bluetooth(self):
+        """
+        Publish the packets available from the bluetooth interface.
+        This is called by the receive thread, or by the poll receive
+        loop when the bluetooth socket is readable.
+        """
+        # if json encoding look for termination character
+        # used for a dictionary
+        if self.json_data:
+            # a single read may bring in more than one dictionary
+            while True:
                 try:
                     data = self.bsock.recv_until(b'}',
                                                  timeout=0,
                                                  with_delimiter=True)
                 except KeyboardInterrupt:
-                    self.clean_up()
-                    sys.exit(0)
+                    raise
+                except ConnectionClosed:
+                    self.bluetooth_closed()
+                    return
                 except Exception as e:
+                    return
+
+                # a malformed frame is dropped, not the connection
+                try:
+                    data = json.loads(data.decode())
+                except ValueError:
+                    print('Malformed bluetooth data: ', data)
                     continue
 
-                data = data.decode()
-                data = json.loads(data)
+                self.publish_bluetooth(data)
 
-                self.publish_payload(data, self.publish_topic)
+        # data is not json encoded
+        else:
+            data = self.client_sock.recv(1)
+            if not data:
+                self.bluetooth_closed()
+                return
+            try:
+                payload = {'command': data.decode()}
+            except ValueError:
+                print('Malformed bluetooth data: ', data)
+                return
+            self.publish_bluetooth(payload)
 
-            # data is not json encoded
-            else:
-                try:
-                    data = (self.client_sock.recv(1)).decode()
-                except KeyboardInterrupt:
-                    self.clean_up()
-                    sys.exit(0)
-                payload = {'command': data}
-                self.publish_payload(payload, self.publish_topic)
+    def bluetooth_closed(self):
+        """
+        The peer closed the bluetooth connection. Stop reading it,
+        so that the closed socket is not read in a busy loop.
+        """
+        print('Bluetooth connection closed')
+        self.connected = False
+        if self.receive_mode == 'poll':
+            self.remove_poll_handler(self.client_sock.fileno())
+
+    def publish_bluetooth(self, payload):
+        """
+        Publish a payload received from the bluetooth interface
+        on the socket owned by the receiving thread.
+        :param payload: payload data
+        """
+        message = msgpack.packb(payload, use_bin_type=True)
+        self.bt_publisher.send_multipart([self.publish_topic.encode(),
+                                          message])
 
 
 def bluetooth_gateway():
@@ -271,6 +404,8 @@ def bluetooth_gateway():
                         help="Type of Gateway : server or client"),
     parser.add_argument("-j", dest="json_data", default="False",
                         help="Bluetooth packets json encoded true or false"),
+    parser.add_argument("-k", dest="transport", default="rfcomm",
+                        help="rfcomm, or tcp to test without Bluetooth"),
     parser.add_argument("-l", dest="publish_topic", default="from_bt_gateway",
                         help="Banyan publisher topic"),
     parser.add_argument("-m", dest="subscriber_list",
@@ -279,6 +414,8 @@ def bluetooth_gateway():
                              "topic3")
     parser.add_argument("-n", dest="process_name", default="None",
                         help="Set process name in banner")
+    parser.add_argument("-o", dest="tcp_port", default='43130',
+                        help="TCP port for the tcp transport"),
     parser.add_argument("-p", dest="publisher_port", default='43124',
                         help="Publisher IP port")
     parser.add_argument("-s", dest="subscriber_port", default='43125',
@@ -288,6 +425,12 @@ def bluetooth_gateway():
     parser.add_argument("-u", dest="uuid",
                         default="e35d6386-1802-414f-b2b9-375c92fa23e0",
                         help="Bluetooth UUID")
+    parser.add_argument("-y", dest="receive_mode", default="sleep",
+                        help="Receive loop: sleep for loop_time when idle "
+                             "or poll - block until a message arrives")
+    parser.add_argument("-z", dest="socket_profile", default="default",
+                        help="zmq socket profile: default, low_latency "
+                             "or throughput")
 
     args = parser.parse_args()
 
@@ -321,7 +464,11 @@ def bluetooth_gateway():
         'gateway_type': args.gateway_type,
         'uuid': args.uuid,
         'server_bt_address': args.server_bt_address,
-        'subscriber_list': args.subscriber_list
+        'subscriber_list': args.subscriber_list,
+        'socket_profile': args.socket_profile,
+        'receive_mode': args.receive_mode,
+        'transport': args.transport,
+        'tcp_port': int(args.tcp_port)
     }
 
     BlueToothGateway(**kw_options)
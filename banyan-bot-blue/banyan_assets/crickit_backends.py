@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+
+"""
+crickit_backends.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import json
+import threading
+import time
+
+
+# noinspection PyMethodMayBeStatic
+class CrickitBackend(object):
+    """
+    The hardware interface used by the CrickitGateway.
+
+    Each control type is addressed by a channel number starting at 0:
+
+    signals  0 - 7
+    touch    0 - 3
+    drives   0 - 3
+    servos   0 - 3
+    motors   0 - 1
+    steppers 'drive' or 'motor'
+    """
+
+    # signal pin modes
+    INPUT = 'input'
+    INPUT_PULLUP = 'input_pullup'
+    OUTPUT = 'output'
+
+    # stepper directions
+    FORWARD = 'forward'
+    BACKWARD = 'backward'
+
+    # stepper styles
+    SINGLE = 'single'
+    DOUBLE = 'double'
+    INTERLEAVE = 'interleave'
+
+    # the OneGPIO commands the Crickit supports
+    COMMANDS = ('digital_write', 'pwm_write', 'servo_position',
+                'set_mode_analog_input', 'set_mode_digital_input',
+                'set_mode_digital_input_pullup', 'set_mode_digital_output',
+                'set_mode_pwm', 'set_mode_servo', 'dc_motor_forward',
+                'dc_motor_reverse', 'stepper_drive_forward',
+                'stepper_drive_reverse', 'stepper_forward', 'stepper_reverse',
+                'set_pixel')
+
+    def signal_pin_mode(self, signal, mode):
+        """
+        Set the mode for a signal pin
+        :param signal: 0 - 7
+        :param mode: INPUT, INPUT_PULLUP or OUTPUT
+        """
+        raise NotImplementedError
+
+    def signal_digital_read(self, signal):
+        """
+        :param signal: 0 - 7
+        :return: 0 or 1
+        """
+        raise NotImplementedError
+
+    def signal_digital_write(self, signal, value):
+        """
+        :param signal: 0 - 7
+        :param value: 0 or 1
+        """
+        raise NotImplementedError
+
+    def signal_analog_read(self, signal):
+        """
+        :param signal: 0 - 7
+        :return: 0 - 1023
+        """
+        raise NotImplementedError
+
+    def touch_read(self, pad):
+        """
+        :param pad: 0 - 3
+        :return: True if touched
+        """
+        raise NotImplementedError
+
+    def drive_frequency(self, drive, frequency):
+        """
+        :param drive: 0 - 3
+        :param frequency: pwm frequency in Hz
+        """
+        raise NotImplementedError
+
+    def drive_fraction(self, drive, fraction):
+        """
+        :param drive: 0 - 3
+        :param fraction: 0.0 - 1.0
+        """
+        raise NotImplementedError
+
+    def servo_angle(self, servo, angle):
+        """
+        :param servo: 0 - 3
+        :param angle: 0 - 180
+        """
+        raise NotImplementedError
+
+    def motor_throttle(self, motor, throttle):
+        """
+        :param motor: 0 or 1
+        :param throttle: -1.0 - 1.0
+        """
+        raise NotImplementedError
+
+    def stepper_onestep(self, port, direction, style):
+        """
+        Move a stepper a single step
+        :param port: 'drive' or 'motor'
+        :param direction: FORWARD or BACKWARD
+        :param style: SINGLE, DOUBLE or INTERLEAVE
+        """
+        raise NotImplementedError
+
+    def stepper_release(self, port):
+        """
+        Release the coils of a stepper
+        :param port: 'drive' or 'motor'
+        """
+        raise NotImplementedError
+
+    def neopixel_set_pixel(self, number_of_pixels, pixel_position, color):
+        """
+        Clear the strip and set a single pixel
+        :param number_of_pixels: pixels on ring or strip
+        :param pixel_position: pixel number to control - zero is the first
+        :param color: (red, green, blue)
+        """
+        raise NotImplementedError
+
+
+class AdafruitCrickitBackend(CrickitBackend):
+    """
+    The Crickit Hat, accessed through the adafruit_crickit library.
+    """
+
+    def __init__(self):
+        # import here so that the simulator may be used on
+        # machines without the adafruit libraries
+        from adafruit_crickit import crickit
+        from adafruit_motor import stepper
+
+        self.crickit = crickit
+        self.stepper = stepper
+
+        # get a seesaw object - this is a low level adafruit thingy
+        self.ss = crickit.seesaw
+
+        self.signals = [crickit.SIGNAL1, crickit.SIGNAL2, crickit.SIGNAL3,
+                        crickit.SIGNAL4, crickit.SIGNAL5, crickit.SIGNAL6,
+                        crickit.SIGNAL7, crickit.SIGNAL8]
+        self.touch_pads = [crickit.touch_1, crickit.touch_2, crickit.touch_3,
+                           crickit.touch_4]
+        self.drives = [crickit.drive_1, crickit.drive_2, crickit.drive_3,
+                       crickit.drive_4]
+        self.servos = [crickit.servo_1, crickit.servo_2, crickit.servo_3,
+                       crickit.servo_4]
+        self.motors = [crickit.dc_motor_1, crickit.dc_motor_2]
+        self.steppers = {'drive': crickit.drive_stepper_motor,
+                         'motor': crickit.stepper_motor}
+
+        self.pin_modes = {self.INPUT: self.ss.INPUT,
+                          self.INPUT_PULLUP: self.ss.INPUT_PULLUP,
+                          self.OUTPUT: self.ss.OUTPUT}
+        self.directions = {self.FORWARD: stepper.FORWARD,
+                           self.BACKWARD: stepper.BACKWARD}
+        self.styles = {self.SINGLE: stepper.SINGLE,
+                       self.DOUBLE: stepper.DOUBLE,
+                       self.INTERLEAVE: stepper.INTERLEAVE}
+
+    def signal_pin_mode(self, signal, mode):
+        self.ss.pin_mode(self.signals[signal], self.pin_modes[mode])
+
+    def signal_digital_read(self, signal):
+        return int(self.ss.digital_read(self.signals[signal]))
+
+    def signal_digital_write(self, signal, value):
+        self.ss.digital_write(self.signals[signal], value)
+
+    def signal_analog_read(self, signal):
+        return self.ss.analog_read(self.signals[signal])
+
+    def touch_read(self, pad):
+        return self.touch_pads[pad].value
+
+    def drive_frequency(self, drive, frequency):
+        self.drives[drive].frequency = frequency
+
+    def drive_fraction(self, drive, fraction):
+        self.drives[drive].fraction = fraction
+
+    def servo_angle(self, servo, angle):
+        self.servos[servo].angle = angle
+
+    def motor_throttle(self, motor, throttle):
+        self.motors[motor].throttle = throttle
+
+    def stepper_onestep(self, port, direction, style):
+        self.steppers[port].onestep(direction=self.directions[direction],
+                                    style=self.styles[style])
+
+    def stepper_release(self, port):
+        self.steppers[port].release()
+
+    def neopixel_set_pixel(self, number_of_pixels, pixel_position, color):
+        self.crickit.init_neopixel(number_of_pixels)
+
+        # Assign to a variable to get a short name and to save time.
+        np = self.crickit.neopixel
+        np.fill(0)
+        np[pixel_position] = color
+
+
+class SimulatedCrickitBackend(CrickitBackend):
+    """
+    A deterministic, in memory Crickit.
+
+    Every call is counted as an I2C transaction and takes i2c_latency
+    seconds. Input changes are applied from an input script, a list of
+    dictionaries of the form:
+
+    {'transaction': 100, 'input': 'signal', 'channel': 0, 'value': 1}
+
+    The change is applied when the transaction count reaches the
+    transaction number. 'input' is one of signal, analog or touch.
+    """
+
+    def __init__(self, i2c_latency=0.0, input_script=None):
+        """
+        :param i2c_latency: time in seconds for each simulated I2C transaction
+        :param input_script: list of scripted input changes
+        """
+        self.i2c_latency = i2c_latency
+        self.input_script = sorted(input_script or [],
+                                   key=lambda event: event['transaction'])
+        self.script_index = 0
+
+        # the poll thread and the receive loop both use the backend
+        self.lock = threading.Lock()
+        self.transactions = 0
+
+        self.signal_modes = [None] * 8
+        self.signal_levels = [0] * 8
+        self.analog_levels = [0] * 8
+        self.touch_levels = [False] * 4
+        self.drive_frequencies = [0] * 4
+        self.drive_fractions = [0.0] * 4
+        self.servo_angles = [None] * 4
+        self.motor_throttles = [0.0] * 2
+        self.stepper_positions = {'drive': 0, 'motor': 0}
+        self.pixels = []
+
+    def transaction(self):
+        """
+        Count a transaction, apply any scripted input changes that are
+        due and wait for the simulated bus.
+        """
+        with self.lock:
+            self.transactions += 1
+            while self.script_index < len(self.input_script) and \
+                    self.input_script[self.script_index]['transaction'] <= \
+                    self.transactions:
+                self.set_input(**self.input_script[self.script_index])
+                self.script_index += 1
+
+        if self.i2c_latency:
+            time.sleep(self.i2c_latency)
+
+    # noinspection PyUnusedLocal
+    def set_input(self, input, channel, value, transaction=None):
+        """
+        Change a simulated input level
+        :param input: signal, analog or touch
+        :param channel: input channel number
+        :param value: new level
+        :param transaction: not used - allows script entries to be passed directly
+        """
+        if input == 'signal':
+            self.signal_levels[channel] = int(value)
+        elif input == 'analog':
+            self.analog_levels[channel] = value
+        elif input == 'touch':
+            self.touch_levels[channel] = bool(value)
+        else:
+            raise RuntimeError('Unknown simulated input: ', input)
+
+    def signal_pin_mode(self, signal, mode):
+        self.transaction()
+        self.signal_modes[signal] = mode
+        if mode == self.INPUT_PULLUP:
+            self.signal_levels[signal] = 1
+
+    def signal_digital_read(self, signal):
+        self.transaction()
+        return self.signal_levels[signal]
+
+    def signal_digital_write(self, signal, value):
+        self.transaction()
+        self.signal_levels[signal] = int(value)
+
+    def signal_analog_read(self, signal):
+        self.transaction()
+        return self.analog_levels[signal]
+
+    def touch_read(self, pad):
+        self.transaction()
+        return self.touch_levels[pad]
+
+    def drive_frequency(self, drive, frequency):
+        self.transaction()
+        self.drive_frequencies[drive] = frequency
+
+    def drive_fraction(self, drive, fraction):
+        self.transaction()
+        self.drive_fractions[drive] = fraction
+
+    def servo_angle(self, servo, angle):
+        self.transaction()
+        self.servo_angles[servo] = angle
+
+    def motor_throttle(self, motor, throttle):
+        self.transaction()
+        self.motor_throttles[motor] = throttle
+
+    # noinspection PyUnusedLocal
+    def stepper_onestep(self, port, direction, style):
+        self.transaction()
+        if direction == self.FORWARD:
+            self.stepper_positions[port] += 1
+        else:
+            self.stepper_positions[port] -= 1
+
+    def stepper_release(self, port):
+        self.transaction()
+
+    def neopixel_set_pixel(self, number_of_pixels, pixel_position, color):
+        self.transaction()
+        self.pixels = [(0, 0, 0)] * number_of_pixels
+        self.pixels[pixel_position] = tuple(color)
+
+
+def load_input_script(file_name):
+    """
+    Read a simulator input script from a json file
+    :param file_name: json file containing a list of input changes
+    :return: the input script
+    """
+    with open(file_name) as script_file:
+        return json.load(script_file)
+
+
+def crickit_backend(backend_type, i2c_latency=0.0, input_script=None):
+    """
+    Create a backend by name
+    :param backend_type: 'crickit' or 'simulated'
+    :param i2c_latency: simulated I2C transaction time in seconds
+    :param input_script: json file name for simulated input changes
+    :return: a CrickitBackend
+    """
+    if backend_type == 'crickit':
+        return AdafruitCrickitBackend()
+    elif backend_type == 'simulated':
+        if input_script:
+            input_script = load_input_script(input_script)
+        return SimulatedCrickitBackend(i2c_latency, input_script)
+    else:
+        raise RuntimeError('Unknown backend type: ', backend_type)
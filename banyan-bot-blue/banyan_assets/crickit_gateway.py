@@ -20,22 +20,31 @@ crickit_gateway.py
 
 """
 import argparse
+import queue
 import signal
 import sys
 import threading
 import time
 
-from adafruit_crickit import crickit
-from adafruit_motor import stepper
-from python_banyan.gateway_base import GatewayBase
+from crickit_backends import CrickitBackend, crickit_backend
+from i2c_scheduler import I2cBusScheduler
+from onegpio_core import OneGpioGateway
 
 
 # noinspection PyMethodMayBeStatic,PyMethodMayBeStatic,SpellCheckingInspection,DuplicatedCode
-class CrickitGateway(GatewayBase, threading.Thread):
+class CrickitGateway(OneGpioGateway, threading.Thread):
     """
     A OneGPIO type gateway for the Adafruit Crickit Hat for the Raspberry Pi
     """
 
+    # gateway level commands - the hardware commands are declared
+    # by the backend
+    COMMANDS = ('query_write_rates', 'query_i2c_latency')
+
+    # commands that may be coalesced in the receive loop
+    SETPOINT_COMMANDS = ('pwm_write', 'servo_position', 'dc_motor_forward',
+                         'dc_motor_reverse')
+
     # noinspection PyDefaultArgument,PyRedundantParentheses
     def __init__(self, *subscriber_list, **kwargs):
         """
@@ -74,6 +83,24 @@ class CrickitGateway(GatewayBase, threading.Thread):
         # pin 22 neopixel
         self.NEOPIXEL_BASE = 24
 
+        # The hardware backend - the real Crickit or a simulation of it.
+        # It is needed by init_pins_dictionary, which is called
+        # when the parent is initialized.
+        self.backend = crickit_backend(kwargs['backend'],
+                                       i2c_latency=kwargs['i2c_latency'],
+                                       input_script=kwargs['input_script'])
+
+        # The input polling thread and the banyan receive loop both
+        # use the I2C bus. All backend access goes through a single
+        # bus worker so that transactions never overlap.
+        self.bus = I2cBusScheduler()
+        self.bus.start()
+
+        # The input polling thread and the banyan receive loop both
+        # publish reports. Publishing only queues a (payload, topic)
+        # pair, and a single publisher thread owns the publisher socket.
+        self.report_queue = queue.SimpleQueue()
+
         # initialize the parent
         super(CrickitGateway, self).__init__(
             subscriber_list=subscriber_list,
@@ -85,14 +112,38 @@ class CrickitGateway(GatewayBase, threading.Thread):
                 'publisher_port'],
             process_name=kwargs[
                 'process_name'],
-            board_type=kwargs['board_type']
+            board_type=kwargs['board_type'],
+            report_topic=kwargs['report_topic'],
+            numeric_timestamps=kwargs['numeric_timestamps'],
+            backend_commands=self.backend.COMMANDS,
+            socket_profile=kwargs['socket_profile'],
+            receive_mode=kwargs['receive_mode']
         )
 
-        # get the report topic passed in
-        self.report_topic = kwargs['report_topic']
+        # the parent has finished setting up the publisher socket
+        self.report_publisher = threading.Thread(target=self.publish_reports)
+        self.report_publisher.daemon = True
+        self.report_publisher.start()
+
+        # Slider driven GUIs send a stream of setpoints for the
+        # drives, servos and dc motors. When coalescing is enabled,
+        # only the latest setpoint for each actuator received during
+        # a pass of the receive loop is written to the hardware.
+        self.coalesce = kwargs['coalesce']
+
+        # latest unwritten setpoint for each actuator, keyed by pin number
+        self.pending_setpoints = {}
 
-        # get a seesaw object - this is a low level adafruit thingy
-        self.ss = crickit.seesaw
+        # last value written to each actuator, keyed by pin number
+        self.last_written = {}
+
+        # per actuator statistics used to calculate write rates
+        self.write_counts = {}
+        self.skipped_writes = {}
+        self.write_rate_start = time.time()
+
+        # publish all of the input changes of a poll cycle as one report
+        self.batch_reports = kwargs['batch_reports']
 
         # We need a seperate thread to poll the inputs
         # Adafruit does not provide for callbacks.
@@ -102,6 +153,10 @@ class CrickitGateway(GatewayBase, threading.Thread):
 
         # start the thread to perform input polling
         self.start()
+        self.mark_phase('hardware')
+
+        self.announce_ready(kwargs['process_name'],
+                            report_topic=self.report_topic)
 
         # start the banyan receive loop
         try:
@@ -132,56 +187,56 @@ class CrickitGateway(GatewayBase, threading.Thread):
 
         self.pins_dictionary = [
             # SIGNALS - 0
-            {'crickit_object': crickit.SIGNAL1,
+            {'channel': 0,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL2,
+            {'channel': 1,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL3,
+            {'channel': 2,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL4,
+            {'channel': 3,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL5,
+            {'channel': 4,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL6,
+            {'channel': 5,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL7,
+            {'channel': 6,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.SIGNAL8,
+            {'channel': 7,
              'modes': ['input', 'input_pullup', 'analog_input',
                        'digital_output'],
              'current_mode': None, 'enabled': False,
@@ -189,25 +244,25 @@ class CrickitGateway(GatewayBase, threading.Thread):
              },
 
             # TOUCH PADS - 8
-            {'crickit_object': crickit.touch_1,
+            {'channel': 0,
              'modes': ['input'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.touch_2,
+            {'channel': 1,
              'modes': ['input'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.touch_3,
+            {'channel': 2,
              'modes': ['input'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.touch_4,
+            {'channel': 3,
              'modes': ['input'],
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
@@ -215,71 +270,71 @@ class CrickitGateway(GatewayBase, threading.Thread):
 
             # DRIVES - 12
 
-            {'crickit_object': crickit.drive_1,
+            {'channel': 0,
              'modes': ['pwm'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.drive_2,
+            {'channel': 1,
              'modes': ['pwm'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'last_value': None, 'callback': None
              },
 
-            {'crickit_object': crickit.drive_3,
+            {'channel': 2,
              'modes': ['pwm'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              },
 
-            {'crickit_object': crickit.drive_4,
+            {'channel': 3,
              'modes': ['pwm'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              },
 
             # SERVOS - 16
-            {'crickit_object': crickit.servo_1,
+            {'channel': 0,
              'modes': ['servo'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'min_pulse': 500, 'max_pulse': 2500
              },
 
-            {'crickit_object': crickit.servo_2,
+            {'channel': 1,
              'modes': ['servo'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'min_pulse': 500, 'max_pulse': 2500
              },
 
-            {'crickit_object': crickit.servo_3,
+            {'channel': 2,
              'modes': ['servo'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'min_pulse': 500, 'max_pulse': 2500
              },
 
-            {'crickit_object': crickit.servo_4,
+            {'channel': 3,
              'modes': ['servo'], 'frequency': 1000,
              'current_mode': None, 'enabled': False,
              'min_pulse': 500, 'max_pulse': 2500
              },
 
             # DC MOTORS - 20
-            {'crickit_object': crickit.dc_motor_1,
+            {'channel': 0,
              'modes': ['dc_motor'],
              'current_mode': None, 'enabled': False,
              },
 
-            {'crickit_object': crickit.dc_motor_2,
+            {'channel': 1,
              'modes': ['dc_motor'],
              'current_mode': None, 'enabled': False,
              },
 
             # STEPPERS 23
-            {'crickit_object': crickit.stepper_motor,
+            {'channel': 'motor',
              'modes': ['stepper'],
              'current_mode': None, 'enabled': False,
              },
 
-            {'crickit_object': crickit.drive_stepper_motor,
+            {'channel': 'drive',
              'modes': ['drive_stepper'],
              },
         ]
@@ -287,42 +342,83 @@ class CrickitGateway(GatewayBase, threading.Thread):
         # This is a workaround for an adafruit library anomaly -
         # without these 2 lines, if a dc motor is connected,
         # it will start spinning by itself.
-        stepper_motor = crickit.stepper_motor
-        stepper_motor.release()
+        self.bus.submit(I2cBusScheduler.SAFETY, self.backend.stepper_release,
+                        'motor')
 
-    def additional_banyan_messages(self, topic, payload):
+    def dc_motor_forward(self, topic, payload):
         """
-        This method will pass any messages not handled by this class to the
-        specific gateway class. Must be overwritten by the hardware gateway
-        class.
+        Set the speed of a dc motor. The direction is set by the
+        sign of the speed.
+
+        Typical message: to_hardware {'command': 'dc_motor_forward', 'motor': 1, 'speed': 0.5}
+
         :param topic: message topic
         :param payload: message payload
         """
+        self.dc_motor_move(payload['motor'] - 1, payload['speed'])
 
-        # dc motor commands
-        if payload['command'] == 'dc_motor_forward' or payload['command'] == \
-                'dc_motor_reverse':
-            self.dc_motor_move(payload['motor'] - 1, payload['speed'])
-
-        # stepper commands
-        elif payload['command'] == 'stepper_drive_forward':
-            self.stepper_drive('drive', stepper.FORWARD, payload['steps'],
-                               payload['style'], payload['speed'])
-        elif payload['command'] == 'stepper_drive_reverse':
-            self.stepper_drive('drive', stepper.BACKWARD, payload['steps'],
-                               payload['style'], payload['speed'])
-        elif payload['command'] == 'stepper_forward':
-            self.stepper_drive('motor', stepper.FORWARD, payload['steps'],
-                               payload['style'], payload['speed'])
-        elif payload['command'] == 'stepper_reverse':
-            self.stepper_drive('motor', stepper.BACKWARD, payload['steps'],
-                               payload['style'], payload['speed'])
-        # pixel commands
-        elif payload['command'] == 'set_pixel':
-            self.neo_pixel_control(payload['number_of_pixels'], payload['pixel_position'],
-                                   payload['red'], payload['green'], payload['blue'])
-        else:
-            raise RuntimeError('Unknown command: ', payload['command'])
+    # the direction is set by the sign of the speed
+    dc_motor_reverse = dc_motor_forward
+
+    def query_write_rates(self, topic, payload):
+        """
+        Typical message: to_hardware {'command': 'query_write_rates'}
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.publish_write_rates()
+
+    def query_i2c_latency(self, topic, payload):
+        """
+        Typical message: to_hardware {'command': 'query_i2c_latency'}
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.publish_i2c_latency()
+
+    def stepper_drive_forward(self, topic, payload):
+        """
+        Typical message: to_hardware {'steps': '100', 'command': 'stepper_drive_forward',
+                                      'speed': 0.0, 'style': 'Single'}
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.stepper_drive('drive', CrickitBackend.FORWARD, payload['steps'],
+                           payload['style'], payload['speed'])
+
+    def stepper_drive_reverse(self, topic, payload):
+        """
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.stepper_drive('drive', CrickitBackend.BACKWARD, payload['steps'],
+                           payload['style'], payload['speed'])
+
+    def stepper_forward(self, topic, payload):
+        """
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.stepper_drive('motor', CrickitBackend.FORWARD, payload['steps'],
+                           payload['style'], payload['speed'])
+
+    def stepper_reverse(self, topic, payload):
+        """
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.stepper_drive('motor', CrickitBackend.BACKWARD, payload['steps'],
+                           payload['style'], payload['speed'])
+
+    def set_pixel(self, topic, payload):
+        """
+        Typical message: to_hardware {'number_of_pixels': 8, 'command': 'set_pixel', 'green': 128,
+                                      'red': 121, 'pixel_position': 4, 'blue': 137}
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.neo_pixel_control(payload['number_of_pixels'], payload['pixel_position'],
+                               payload['red'], payload['green'], payload['blue'])
 
     def stepper_drive(self, port, direction, number_of_steps, the_style, inter_step_delay):
         """
@@ -340,26 +436,19 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param the_style: Single, Double or Interleave
         :param inter_step_delay: time between steps
         """
-        if port == 'drive':
-            stepper_motor = crickit.drive_stepper_motor
-        else:
-            stepper_motor = crickit.stepper_motor
-
         if the_style == 'Double':
-            the_style = stepper.DOUBLE
+            the_style = CrickitBackend.DOUBLE
         elif the_style == 'Interleave':
-            the_style = stepper.INTERLEAVE
+            the_style = CrickitBackend.INTERLEAVE
         else:
-            the_style = stepper.SINGLE
+            the_style = CrickitBackend.SINGLE
 
-        if direction == stepper.FORWARD:
-            for steps in range(int(number_of_steps)):
-                stepper_motor.onestep(direction=stepper.FORWARD, style=the_style)
-                time.sleep(inter_step_delay)
-        else:
-            for steps in range(int(number_of_steps)):
-                stepper_motor.onestep(direction=stepper.BACKWARD, style=the_style)
-                time.sleep(inter_step_delay)
+        # wait for each step to be performed, so that the delay
+        # is between the steps and not between their submissions
+        for steps in range(int(number_of_steps)):
+            self.bus.call(I2cBusScheduler.COMMAND, self.backend.stepper_onestep,
+                          port, direction, the_style)
+            time.sleep(inter_step_delay)
 
     def neo_pixel_control(self, number_of_pixels, pixel_position, red, green, blue):
         """
@@ -374,29 +463,9 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param green: color value
         :param blue: color value
         """
-        crickit.init_neopixel(number_of_pixels)
-
-        crickit.neopixel.fill(0)
-
-        # Assign to a variable to get a short name and to save time.
-        np = crickit.neopixel
-
-        np[pixel_position] = (red, green, blue)
-
-    def analog_write(self, topic, payload):
-        """
-        Not used for the crickit
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def digital_read(self, pin):
-        """
-        Not used for the crickit
-        :param pin:
-        """
-        raise NotImplementedError
+        self.bus.submit(I2cBusScheduler.COMMAND, self.backend.neopixel_set_pixel,
+                        number_of_pixels, pixel_position, (red, green, blue),
+                        key='neopixel')
 
     def digital_write(self, topic, payload):
         """
@@ -409,73 +478,12 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin']
-        the_object = self.pins_dictionary[pin]['crickit_object']
+        channel = self.pins_dictionary[pin]['channel']
 
         value = payload['value']
-        self.ss.digital_write(the_object, value)
-
-    def disable_analog_reporting(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def disable_digital_reporting(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def enable_analog_reporting(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def enable_digital_reporting(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def i2c_read(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def i2c_write(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
-    def play_tone(self, topic, payload):
-        """
-        Not used for the crickit
-
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
+        self.bus.submit(I2cBusScheduler.COMMAND,
+                        self.backend.signal_digital_write, channel, value,
+                        key=pin)
 
     def pwm_write(self, topic, payload):
         """
@@ -488,10 +496,7 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin'] + self.DRIVE_BASE
-        the_object = self.pins_dictionary[pin]['crickit_object']
-
-        the_value = payload['value']
-        the_object.fraction = the_value
+        self.set_actuator(pin, payload['value'])
 
     def servo_position(self, topic, payload):
         """
@@ -504,10 +509,7 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin'] + self.SERVO_BASE
-        the_object = self.pins_dictionary[pin]['crickit_object']
-
-        the_angle = payload['position']
-        the_object.angle = the_angle
+        self.set_actuator(pin, payload['position'])
 
     def set_mode_analog_input(self, topic, payload):
         """
@@ -520,16 +522,14 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin']
-        if self.pins_dictionary[pin]['current_mode'] is not None:
-            self.mode_previously_set_warning(pin, self.pins_dictionary[pin]['current_mode'])
+        if not self.claim_pin_mode(pin, self.ANALOG_INPUT_MODE):
             return
 
-        self.pins_dictionary[pin]['current_mode'] = self.ANALOG_INPUT_MODE
         self.pins_dictionary[pin]['enabled'] = True
 
     def set_mode_digital_input(self, topic, payload):
         """
-        Set a signal to digital input
+        Set a signal or touch pin to digital input
 
         Typical message: to_hardware {'command': 'set_mode_digital_input', 'pin': 5}
 
@@ -537,23 +537,19 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin']
-        if self.pins_dictionary[pin]['current_mode'] is not None:
-            self.mode_previously_set_warning(pin, self.pins_dictionary[pin]['current_mode'])
+        if not self.claim_pin_mode(pin, self.DIGITAL_INPUT_MODE):
             return
 
-        self.pins_dictionary[pin]['enabled'] = True
-        self.pins_dictionary[pin]['last_value'] = 0
-        self.pins_dictionary[pin]['current_mode'] = self.DIGITAL_INPUT_MODE
-
         # handle signals
         if 0 <= pin <= 7:
-            the_object = self.pins_dictionary[pin]['crickit_object']
-            self.ss.pin_mode(the_object, self.ss.INPUT)
+            channel = self.pins_dictionary[pin]['channel']
+            self.bus.submit(I2cBusScheduler.COMMAND,
+                            self.backend.signal_pin_mode, channel,
+                            CrickitBackend.INPUT)
 
-        # handle the touch pins
-        if 8 <= pin <= 11:
-            self.pins_dictionary[pin]['enabled'] = True
-            self.pins_dictionary[pin]['last_value'] = 0
+        # signals and touch pins are polled once enabled
+        self.pins_dictionary[pin]['last_value'] = 0
+        self.pins_dictionary[pin]['enabled'] = True
 
     def set_mode_digital_input_pullup(self, topic, payload):
         """
@@ -566,16 +562,15 @@ class CrickitGateway(GatewayBase, threading.Thread):
         """
 
         pin = payload['pin']
-        if self.pins_dictionary[pin]['current_mode'] is not None:
-            self.mode_previously_set_warning(pin, self.pins_dictionary[pin]['current_mode'])
+        if not self.claim_pin_mode(pin, self.DIGITAL_INPUT_PULLUP_MODE):
             return
 
-        self.pins_dictionary[pin]['enabled'] = True
-        self.pins_dictionary[pin]['last_value'] = 0
-        self.pins_dictionary[pin]['current_mode'] = self.DIGITAL_INPUT_PULLUP_MODE
+        channel = self.pins_dictionary[pin]['channel']
+        self.bus.submit(I2cBusScheduler.COMMAND, self.backend.signal_pin_mode,
+                        channel, CrickitBackend.INPUT_PULLUP)
 
-        the_object = self.pins_dictionary[pin]['crickit_object']
-        self.ss.pin_mode(the_object, self.ss.INPUT_PULLUP)
+        self.pins_dictionary[pin]['last_value'] = 0
+        self.pins_dictionary[pin]['enabled'] = True
 
     def set_mode_digital_output(self, topic, payload):
         """
@@ -586,25 +581,13 @@ class CrickitGateway(GatewayBase, threading.Thread):
         """
 
         pin = payload['pin']
+        if not self.claim_pin_mode(pin, self.DIGITAL_OUTPUT_MODE):
+            return
 
-        if self.pins_dictionary[pin]['current_mode'] is not None:
-            if self.pins_dictionary[pin]['current_mode'] != self.DIGITAL_OUTPUT_MODE:
-                self.mode_previously_set_warning(pin,
-                                                 self.pins_dictionary[pin]['current_mode'])
-                return
-
-        the_object = self.pins_dictionary[pin]['crickit_object']
-
-        self.ss.pin_mode(the_object, self.ss.OUTPUT)
-
-    def set_mode_i2c(self, topic, payload):
-        """
-        Not used for the crickit
+        channel = self.pins_dictionary[pin]['channel']
 
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
+        self.bus.submit(I2cBusScheduler.COMMAND, self.backend.signal_pin_mode,
+                        channel, CrickitBackend.OUTPUT)
 
     def set_mode_pwm(self, topic, payload):
         """
@@ -616,69 +599,253 @@ class CrickitGateway(GatewayBase, threading.Thread):
         :param payload: message payload
         """
         pin = payload['pin'] + self.DRIVE_BASE
-        if self.pins_dictionary[pin]['current_mode'] is not None:
-            if self.pins_dictionary[pin]['current_mode'] != self.PWM_OUTPUT_MODE:
-                self.mode_previously_set_warning(pin,
-                                                 self.pins_dictionary[pin]['current_mode'])
-                return
+        if not self.claim_pin_mode(pin, self.PWM_OUTPUT_MODE):
+            return
 
-        the_object = self.pins_dictionary[pin]['crickit_object']
+        channel = self.pins_dictionary[pin]['channel']
 
-        the_object.frequency = 1000
+        self.bus.submit(I2cBusScheduler.COMMAND, self.backend.drive_frequency,
+                        channel, 1000)
 
     def set_mode_servo(self, topic, payload):
         """
-        Not used for crickit, but gui sends the following message:
-        to_hardware {'command': 'set_mode_servo', 'pin': 1}
+        The crickit servos need no setup, but the mode is recorded
+        so that it is included in the pin_modes report.
+
+        Typical message: to_hardware {'command': 'set_mode_servo', 'pin': 1}
 
         :param topic: message topic
         :param payload: message payload
         """
-        pass
+        self.claim_pin_mode(payload['pin'] + self.SERVO_BASE, self.SERVO_MODE)
 
-    def set_mode_sonar(self, topic, payload):
+    def claim_pin_mode(self, pin, mode):
         """
-        Not used for crickit
-        :param topic: message topic
-        :param payload: message payload
+        Record the mode of a pin.
+
+        Setting a pin to the mode it already has is accepted without
+        touching the hardware, so clients may safely repeat set_mode
+        commands. Once set, the mode of a pin may not be changed - the
+        request is answered with an error report.
+
+        :param pin: virtual pin number
+        :param mode: pin mode
+        :return: True if the mode needs to be applied to the hardware
         """
-        raise NotImplementedError
+        current_mode = self.pins_dictionary[pin]['current_mode']
+        if current_mode is None:
+            self.pins_dictionary[pin]['current_mode'] = mode
+            return True
 
-    def set_mode_stepper(self, topic, payload):
+        if current_mode != mode:
+            self.publish_error('Mode not set for pin %d - current mode is %s' %
+                               (pin, self.MODE_NAMES[current_mode]))
+        return False
+
+    def get_pin_modes(self):
         """
-        Not used for crickit - mode does not need to set - the stepper objects
-        are used directly.
-        :param topic: message topic
-        :param payload: message payload
+        The modes of the signal, touch, drive and servo pins.
+        Drives and servos are numbered as in their set_mode commands.
+
+        :return: A list of [pin, mode name]
         """
-        raise NotImplementedError
+        modes = []
+        for pin in range(self.SIGNAL_BASE, self.SERVO_MAX + 1):
+            mode = self.pins_dictionary[pin]['current_mode']
+            if mode is None:
+                continue
+            if self.DRIVE_BASE <= pin <= self.DRIVE_MAX:
+                modes.append([pin - self.DRIVE_BASE, self.MODE_NAMES[mode]])
+            elif self.SERVO_BASE <= pin <= self.SERVO_MAX:
+                modes.append([pin - self.SERVO_BASE, self.MODE_NAMES[mode]])
+            else:
+                modes.append([pin, self.MODE_NAMES[mode]])
+        return modes
 
-    def set_mode_tone(self, topic, payload):
+    def dc_motor_move(self, motor, speed):
         """
-        Not used for crickit
-        :param topic: message topic
-        :param payload: message payload
+        Set the specified motor to the specified speed.
+        Typical message: to_hardware {'command': 'dc_motor_forward', 'motor': 1, 'speed': 0.5}
+
+        :param motor: 0 or 1
+        :param speed: motor speed
         """
-        raise NotImplementedError
+        self.set_actuator(motor + self.MOTOR_BASE, speed)
 
-    def stepper_write(self, topic, payload):
+    def set_actuator(self, pin, value):
         """
-        Not used for crickit - stepper objects are handled directly
-        :param topic: message topic
+        Set a drive, servo or dc motor to a new value.
+
+        If coalescing is enabled, the value is held until the end of
+        the current receive loop pass, replacing any value previously
+        held for the pin. Otherwise it is written immediately.
+
+        :param pin: drive, servo or dc motor pin number
+        :param value: pwm fraction, servo angle or motor throttle
+        """
+        if self.coalesce:
+            self.pending_setpoints[pin] = value
+        else:
+            self.write_actuator(pin, value)
+
+    def flush_setpoints(self):
+        """
+        Write all held setpoints to the hardware.
+        """
+        setpoints = self.pending_setpoints
+        self.pending_setpoints = {}
+        for pin, value in setpoints.items():
+            self.write_actuator(pin, value)
+
+    def write_actuator(self, pin, value):
+        """
+        Write a value to a drive, servo or dc motor. The I2C write
+        is skipped if the value is the same as the last value written.
+
+        :param pin: drive, servo or dc motor pin number
+        :param value: pwm fraction, servo angle or motor throttle
+        """
+        if self.last_written.get(pin) == value:
+            self.skipped_writes[pin] = self.skipped_writes.get(pin, 0) + 1
+            return
+
+        channel = self.pins_dictionary[pin]['channel']
+
+        priority = I2cBusScheduler.COMMAND
+
+        if self.DRIVE_BASE <= pin <= self.DRIVE_MAX:
+            write = self.backend.drive_fraction
+        elif self.SERVO_BASE <= pin <= self.SERVO_MAX:
+            write = self.backend.servo_angle
+        elif self.MOTOR_BASE <= pin <= self.MOTOR_MAX:
+            write = self.backend.motor_throttle
+            # stopping a motor goes to the front of the queue
+            if not value:
+                priority = I2cBusScheduler.SAFETY
+        else:
+            raise RuntimeError('Not an actuator pin: ', pin)
+
+        # recorded before the submit, so that a failed write can clear it
+        self.last_written[pin] = value
+        self.write_counts[pin] = self.write_counts.get(pin, 0) + 1
+
+        self.bus.submit(priority, self.write_setpoint, write, pin, channel,
+                        value, key=pin)
+
+    def write_setpoint(self, write, pin, channel, value):
+        """
+        Perform an actuator write. This is called from the I2C bus worker.
+        If the write fails, the value is no longer recorded as written,
+        so that the next setpoint of the same value is not skipped.
+
+        :param write: backend write function
+        :param pin: drive, servo or dc motor pin number
+        :param channel: backend channel of the pin
+        :param value: pwm fraction, servo angle or motor throttle
+        """
+        try:
+            write(channel, value)
+        except Exception:
+            if self.last_written.get(pin) == value:
+                self.last_written.pop(pin, None)
+            raise
+
+    def get_write_rates(self):
+        """
+        Get the hardware write statistics for each actuator since
+        the last time this method was called.
+
+        :return: A list of [pin, writes, skipped writes, writes per second]
+        """
+        now = time.time()
+        elapsed = now - self.write_rate_start
+        rates = []
+        for pin in sorted(set(self.write_counts) | set(self.skipped_writes)):
+            writes = self.write_counts.get(pin, 0)
+            rates.append([pin, writes, self.skipped_writes.get(pin, 0),
+                          writes / elapsed if elapsed else 0.0])
+
+        self.write_counts = {}
+        self.skipped_writes = {}
+        self.write_rate_start = now
+        return rates
+
+    def publish_write_rates(self):
+        """
+        Publish the actuator write statistics.
+
+        Typical message: to_hardware {'command': 'query_write_rates'}
+        Typical report: {'report': 'write_rates', 'rates': [[12, 10, 140, 2.5]]}
+        """
+        payload = {'report': 'write_rates', 'rates': self.get_write_rates()}
+        self.publish_payload(payload, self.report_topic)
+
+    def publish_i2c_latency(self):
+        """
+        Publish the I2C bus queue latency histograms. Bucket n of each
+        histogram counts operations that waited from 2**(n-1) up to
+        2**n microseconds.
+
+        Typical message: to_hardware {'command': 'query_i2c_latency'}
+        Typical report: {'report': 'i2c_latency', 'superseded': 0,
+                         'histograms': {'safety': [...], 'command': [...],
+                                        'poll': [...]}}
+        """
+        payload = {'report': 'i2c_latency',
+                   'histograms': self.bus.get_latency_histograms(),
+                   'superseded': self.bus.superseded}
+        self.publish_payload(payload, self.report_topic)
+
+    def publish_payload(self, payload, topic=''):
+        """
+        Queue a payload for the publisher thread.
         :param payload: message payload
+        :param topic: message topic
         """
-        raise NotImplementedError
+        self.report_queue.put((payload, topic))
 
-    def dc_motor_move(self, motor, speed):
+    def publish_reports(self):
         """
-        Set the specified motor to the specified speed.
-        Typical message: to_hardware {'command': 'digital_write', 'value': 0, 'pin': 0}
+        The publisher thread. Publish the queued payloads.
+        """
+        while True:
+            payload, topic = self.report_queue.get()
+            try:
+                super(CrickitGateway, self).publish_payload(payload, topic)
+            except Exception as e:
+                print('Report publisher error: ', repr(e))
 
-        :param motor: 1 or 2
-        :param speed: motor speed
+    def receive_idle(self):
+        """
+        A pass of the receive loop has ended - write the latest
+        setpoint for each actuator.
         """
-        motor_object = self.pins_dictionary[motor + self.MOTOR_BASE]['crickit_object']
-        motor_object.throttle = speed
+        self.flush_setpoints()
+
+    def get_queue_depths(self):
+        """
+        Add the I2C bus queue and the held setpoints to the queue statistics.
+        :return: A dictionary of queue statistics
+        """
+        depths = super(CrickitGateway, self).get_queue_depths()
+        depths['i2c_queue'] = self.bus.queue.qsize()
+        depths['report_queue'] = self.report_queue.qsize()
+        depths['pending_setpoints'] = len(self.pending_setpoints)
+        return depths
+
+    def incoming_message_processing(self, topic, payload):
+        """
+        Messages are sent here from the receive_loop.
+
+        Held setpoints are written before any command that is not
+        itself a setpoint, so that commands are applied in order.
+
+        :param topic: Message Topic string
+        :param payload: Message Data
+        """
+        if payload.get('command') not in self.SETPOINT_COMMANDS:
+            self.flush_setpoints()
+        super(CrickitGateway, self).incoming_message_processing(topic, payload)
 
     def run(self):
         """
@@ -688,83 +855,107 @@ class CrickitGateway(GatewayBase, threading.Thread):
         """
 
         while True:
-            # check the signal inputs
-            for pin in range(0, 8):
-                the_object = self.pins_dictionary[pin]['crickit_object']
-                if self.pins_dictionary[pin]['enabled']:
-                    if self.pins_dictionary[pin][
-                        'current_mode'] == self.DIGITAL_INPUT_MODE or \
-                            self.pins_dictionary[pin]['current_mode'] \
-                            == self.DIGITAL_INPUT_PULLUP_MODE:
-                        the_input = int(self.ss.digital_read(the_object))
-
-                        if the_input != self.pins_dictionary[pin]['last_value']:
-                            self.pins_dictionary[pin]['last_value'] = the_input
-                            timestamp = self.get_time_stamp()
-                            payload = {'report': 'digital_input', 'pin': pin,
-                                       'value':
-                                           the_input, 'timestamp': timestamp}
-                            self.publish_payload(payload, self.report_topic)
-
-                    elif self.pins_dictionary[pin]['current_mode'] \
-                            == self.ANALOG_INPUT_MODE:
-                        the_input = self.ss.analog_read(the_object)
-                        if the_input != self.pins_dictionary[pin]['last_value']:
-                            self.pins_dictionary[pin]['last_value'] = the_input
-                            timestamp = self.get_time_stamp()
-                            payload = {'report': 'analog_input', 'pin': pin,
-                                       'value':
-                                           the_input, 'timestamp': timestamp}
-                            self.publish_payload(payload, self.report_topic)
-
-            # check the touch pins
-            for pin in range(8, 12):
-                the_object = self.pins_dictionary[pin]['crickit_object']
-
-                if self.pins_dictionary[pin]['enabled']:
-                    touch_value = the_object.value
-
-                    if touch_value != self.pins_dictionary[pin]['last_value']:
-                        self.pins_dictionary[pin]['last_value'] = touch_value
-                        timestamp = self.get_time_stamp()
-                        payload = {'report': 'digital_input', 'pin': pin,
-                                   'value':
-                                       touch_value, 'timestamp': timestamp}
-                        self.publish_payload(payload, self.report_topic)
+            inputs = self.read_inputs()
+
+            changes = []
+            for report, pin, the_input in inputs:
+                if the_input != self.pins_dictionary[pin]['last_value']:
+                    self.pins_dictionary[pin]['last_value'] = the_input
+                    changes.append((report, pin, the_input))
+
+            if changes:
+                if self.batch_reports:
+                    self.publish_input_batch(changes)
+                else:
+                    for report, pin, the_input in changes:
+                        self.publish_report({'report': report, 'pin': pin,
+                                             'value': the_input})
 
             time.sleep(.1)
 
-    def get_time_stamp(self):
+    def publish_input_batch(self, changes):
         """
-        Get the time of the pin change occurence
-        :return: Time stamp
+        Publish the input changes of a poll cycle as a single report.
+
+        {'report': 'input_batch', 'inputs': [[pin, value, timestamp], ...],
+         'analog': [pins reported as analog_input]}
+
+        Subscribers expand the batch with report_batch.unpack_input_batch.
+
+        :param changes: A list of (report type, pin, value)
         """
-        t = time.time()
-        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+        # all of the inputs were read in the same poll cycle,
+        # so they share a time stamp
+        payload = self.time_stamp_report({'report': 'input_batch'})
+        timestamp = payload.pop('timestamp')
+        payload['inputs'] = [[pin, value, timestamp]
+                             for report, pin, value in changes]
+        payload['analog'] = [pin for report, pin, value in changes
+                             if report == 'analog_input']
+        self.publish_payload(payload, self.report_topic)
 
-    def mode_previously_set_warning(self, pin, mode):
+    def read_inputs(self):
         """
-        Check if user already set the pin and print warning to console.
-        :param pin:
-        :param mode:
-        :return: Print warning to console
+        Read all of the enabled signal and touch inputs.
+
+        Each read is a separate bus operation, so that safety and
+        command operations queued during a poll cycle are performed
+        before the rest of the reads.
+
+        :return: A list of (report type, pin, value)
         """
-        print('Warning: Mode Not Set For Pin: ', pin)
-        if mode == self.DIGITAL_INPUT_MODE:
-            print('Current Mode is Digital Input')
-        elif mode == self.DIGITAL_OUTPUT_MODE:
-            print('Current Mode is Digital Input')
-        elif mode == self.ANALOG_INPUT_MODE:
-            print('Current Mode is Analog Input')
+        inputs = []
+        poll = I2cBusScheduler.POLL
+
+        # check the signal inputs
+        for pin in range(0, 8):
+            channel = self.pins_dictionary[pin]['channel']
+            if self.pins_dictionary[pin]['enabled']:
+                if self.pins_dictionary[pin][
+                    'current_mode'] == self.DIGITAL_INPUT_MODE or \
+                        self.pins_dictionary[pin]['current_mode'] \
+                        == self.DIGITAL_INPUT_PULLUP_MODE:
+                    inputs.append(('digital_input', pin, self.bus.call(
+                        poll, self.backend.signal_digital_read, channel)))
+
+                elif self.pins_dictionary[pin]['current_mode'] \
+                        == self.ANALOG_INPUT_MODE:
+                    inputs.append(('analog_input', pin, self.bus.call(
+                        poll, self.backend.signal_analog_read, channel)))
+
+        # check the touch pins
+        for pin in range(8, 12):
+            channel = self.pins_dictionary[pin]['channel']
+
+            if self.pins_dictionary[pin]['enabled']:
+                inputs.append(('digital_input', pin, self.bus.call(
+                    poll, self.backend.touch_read, channel)))
+
+        return inputs
 
 
 def crickit_gateway():
     parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="batch_reports", default="false",
+                        help="Publish the input changes of each poll cycle "
+                             "as one input_batch report: true or false")
     parser.add_argument("-b", dest="back_plane_ip_address", default="None",
                         help="None or IP address used by Back Plane")
+    parser.add_argument("-c", dest="coalesce", default="true",
+                        help="Write only the latest drive, servo and motor "
+                             "setpoints: true or false")
     parser.add_argument("-d", dest="board_type", default="None",
                         help="This parameter identifies the target GPIO "
                              "device")
+    parser.add_argument("-e", dest="numeric_timestamps", default="false",
+                        help="Report time stamps as epoch seconds plus "
+                             "monotonic nanoseconds: true or false")
+    parser.add_argument("-i", dest="i2c_latency", default="0.0",
+                        help="Simulated I2C transaction time in seconds")
+    parser.add_argument("-j", dest="input_script", default="None",
+                        help="Simulated input script json file")
+    parser.add_argument("-k", dest="backend", default="crickit",
+                        help="Hardware backend: crickit or simulated")
     parser.add_argument("-l", dest="subscriber_list",
                         default="to_hardware", nargs='+',
                         help="Banyan topics space delimited: topic1 topic2 "
@@ -779,12 +970,23 @@ def crickit_gateway():
                         help="Subscriber IP port")
     parser.add_argument("-t", dest="loop_time", default=".1",
                         help="Event Loop Timer in seconds")
+    parser.add_argument("-y", dest="receive_mode", default="sleep",
+                        help="Receive loop: sleep for loop_time when idle "
+                             "or poll - block until a message arrives")
+    parser.add_argument("-z", dest="socket_profile", default="default",
+                        help="zmq socket profile: default, low_latency "
+                             "or throughput")
 
     args = parser.parse_args()
     if args.back_plane_ip_address == 'None':
         args.back_plane_ip_address = None
     if args.board_type == 'None':
-        args.back_plane_ip_address = None
+        args.board_type = None
+    args.coalesce = args.coalesce.lower() == 'true'
+    args.numeric_timestamps = args.numeric_timestamps.lower() == 'true'
+    args.batch_reports = args.batch_reports.lower() == 'true'
+    if args.input_script == 'None':
+        args.input_script = None
     kw_options = {
         'back_plane_ip_address': args.back_plane_ip_address,
         'publisher_port': args.publisher_port,
@@ -792,7 +994,15 @@ def crickit_gateway():
         'process_name': args.process_name,
         'loop_time': float(args.loop_time),
         'report_topic': args.report_topic,
-        'board_type': args.board_type}
+        'board_type': args.board_type,
+        'coalesce': args.coalesce,
+        'backend': args.backend,
+        'i2c_latency': float(args.i2c_latency),
+        'input_script': args.input_script,
+        'numeric_timestamps': args.numeric_timestamps,
+        'batch_reports': args.batch_reports,
+        'socket_profile': args.socket_profile,
+        'receive_mode': args.receive_mode}
 
     try:
         app = CrickitGateway(args.subscriber_list, **kw_options)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+edge_capture.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+
+class EdgeRing(object):
+    """
+    A preallocated ring buffer of input edges.
+
+    There is a single writer, the input callback thread, and a single
+    reader, the publisher thread. The writer only advances head and the
+    reader only advances tail, so no lock is needed. If the reader falls
+    more than a ring behind, the oldest edges are dropped. Edges whose
+    slots the writer may have reused while they were being copied are
+    dropped as well, so a taken edge is never torn.
+    """
+
+    def __init__(self, size=1024):
+        """
+        :param size: number of edges the ring can hold
+        """
+        self.size = size
+        self.pins = [0] * size
+        self.levels = [0] * size
+        self.times = [0] * size
+
+        # total number of edges written and read
+        self.head = 0
+        self.tail = 0
+
+        # total number of edges dropped
+        self.dropped = 0
+
+    def put(self, pin, level, monotonic_ns):
+        """
+        Record an edge
+        :param pin: input pin
+        :param level: level after the edge
+        :param monotonic_ns: monotonic time of the edge
+        """
+        slot = self.head % self.size
+        self.pins[slot] = pin
+        self.levels[slot] = level
+        self.times[slot] = monotonic_ns
+        self.head += 1
+
+    def take(self):
+        """
+        Remove all of the recorded edges
+        :return: A list of [pin, level, monotonic_ns], oldest first
+        """
+        head = self.head
+        start = max(self.tail, head - self.size)
+
+        edges = []
+        for index in range(start, head):
+            slot = index % self.size
+            edges.append([self.pins[slot], self.levels[slot],
+                          self.times[slot]])
+
+        # The writer may have advanced while the slots were copied.
+        # Edge index is intact only if the writer has not started
+        # writing edge index + size, which reuses its slot.
+        overwritten = min(max(self.head - self.size + 1 - start, 0),
+                          len(edges))
+        if overwritten:
+            edges = edges[overwritten:]
+
+        self.dropped += start - self.tail + overwritten
+        self.tail = head
+        return edges
+
+
+class PulseTimer(object):
+    """
+    Pulse width and frequency of an input, derived from its edges.
+    """
+
+    def __init__(self):
+        self.last_rise = None
+        self.width_ns = None
+        self.period_ns = None
+
+    def add_edge(self, level, monotonic_ns):
+        """
+        :param level: level after the edge
+        :param monotonic_ns: monotonic time of the edge
+        """
+        if level:
+            if self.last_rise is not None:
+                self.period_ns = monotonic_ns - self.last_rise
+            self.last_rise = monotonic_ns
+        elif self.last_rise is not None:
+            self.width_ns = monotonic_ns - self.last_rise
+
+    def timing(self):
+        """
+        :return: [high pulse width in ns, rising edge period in ns,
+                 frequency in Hz] for the most recent pulses
+        """
+        frequency = None
+        if self.period_ns:
+            frequency = 1000000000 / self.period_ns
+        return [self.width_ns, self.period_ns, frequency]
@@ -1,12 +1,2 @@
 #!/bin/bash
-backplane &
-sleep 3
-sudo python3 /home/pi/exp_pro_gateway.py &
-sleep 5
-sudo python3 /home/pi/robot_control.py &
-sleep 2
-sudo python3 /home/pi/bluetooth_gateway.py &
-sleep 4
-
-
-
+python3 /home/pi/bbot_launcher.py -f /home/pi/exp_bbot_launch.csv &
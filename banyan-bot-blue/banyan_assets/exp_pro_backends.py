@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+"""
+exp_pro_backends.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import json
+import random
+import threading
+import time
+
+
+# noinspection PyMethodMayBeStatic
+class ExpProBackend(object):
+    """
+    The hardware interface used by the ExpProGateway.
+
+    Inputs, touch pads, analog inputs and motors are numbered
+    starting at 1, as they are on the Explorer HAT. Outputs and lights
+    are addressed by their gpio pin numbers.
+
+    Callbacks are called on threads owned by the backend.
+    """
+
+    # gpio pin numbers of the digital inputs 1 - 4
+    INPUT_PINS = (23, 22, 24, 25)
+
+    # gpio pin numbers of the lights (blue, yellow, red and green)
+    # followed by outputs 1 - 4
+    OUTPUT_PINS = (4, 17, 27, 5, 6, 12, 13, 16)
+
+    # the OneGPIO commands the Explorer HAT supports
+    COMMANDS = ('digital_write', 'dc_motor_forward', 'dc_motor_reverse',
+                'dc_motors_set', 'set_mode_analog_input',
+                'set_mode_digital_input', 'set_mode_digital_input_pullup',
+                'set_mode_digital_output', 'set_mode_servo')
+
+    def input_on_high(self, channel, callback, bouncetime):
+        """
+        :param channel: 1 - 4
+        :param callback: called with an object whose pin attribute is
+                         the gpio pin number
+        :param bouncetime: debounce time in milliseconds
+        """
+        raise NotImplementedError
+
+    def input_on_low(self, channel, callback, bouncetime):
+        """
+        :param channel: 1 - 4
+        :param callback: called with an object whose pin attribute is
+                         the gpio pin number
+        :param bouncetime: debounce time in milliseconds
+        """
+        raise NotImplementedError
+
+    def touch_pressed(self, callback):
+        """
+        :param callback: called with (pad, state) for pads 1 - 8
+        """
+        raise NotImplementedError
+
+    def touch_released(self, callback):
+        """
+        :param callback: called with (pad, state) for pads 1 - 8
+        """
+        raise NotImplementedError
+
+    def analog_changed(self, channel, callback, threshold):
+        """
+        :param channel: 1 - 4
+        :param callback: called with (analog object, value in volts)
+        :param threshold: minimum change in volts reported
+        """
+        raise NotImplementedError
+
+    def output_brightness(self, pin, brightness):
+        """
+        :param pin: gpio pin number of a light or output
+        :param brightness: 0 - 100
+        """
+        raise NotImplementedError
+
+    def motor_speed(self, motor, speed):
+        """
+        :param motor: 1 or 2
+        :param speed: -100 - 100
+        """
+        raise NotImplementedError
+
+    def motors_speed(self, speed_1, speed_2):
+        """
+        Set the speed of both motors
+        :param speed_1: motor 1 speed -100 - 100
+        :param speed_2: motor 2 speed -100 - 100
+        """
+        self.motor_speed(1, speed_1)
+        self.motor_speed(2, speed_2)
+
+    def start(self):
+        """
+        Called after all of the callbacks have been assigned.
+        """
+        pass
+
+
+class ExplorerHatBackend(ExpProBackend):
+    """
+    The Explorer HAT Pro, accessed through the explorerhat library.
+    """
+
+    def __init__(self):
+        # import here so that the simulator may be used on
+        # machines without the explorerhat library
+        import explorerhat as eh
+
+        self.eh = eh
+
+        self.inputs = [eh.input.one, eh.input.two, eh.input.three,
+                       eh.input.four]
+        self.analog_inputs = [eh.analog.one, eh.analog.two, eh.analog.three,
+                              eh.analog.four]
+        self.motors = [eh.motor.one, eh.motor.two]
+        self.outputs = dict(zip(self.OUTPUT_PINS,
+                                [eh.light.blue, eh.light.yellow,
+                                 eh.light.red, eh.light.green,
+                                 eh.output.one, eh.output.two,
+                                 eh.output.three, eh.output.four]))
+
+    def input_on_high(self, channel, callback, bouncetime):
+        self.inputs[channel - 1].on_high(callback, bouncetime)
+
+    def input_on_low(self, channel, callback, bouncetime):
+        self.inputs[channel - 1].on_low(callback, bouncetime)
+
+    def touch_pressed(self, callback):
+        self.eh.touch.pressed(callback)
+
+    def touch_released(self, callback):
+        self.eh.touch.released(callback)
+
+    def analog_changed(self, channel, callback, threshold):
+        self.analog_inputs[channel - 1].changed(callback, threshold)
+
+    def output_brightness(self, pin, brightness):
+        self.outputs[pin].brightness(brightness)
+
+    def motor_speed(self, motor, speed):
+        self.motors[motor - 1].speed(speed)
+
+    def motors_speed(self, speed_1, speed_2):
+        # the explorerhat library sets each motor separately
+        self.eh.motor.one.speed(speed_1)
+        self.eh.motor.two.speed(speed_2)
+
+
+class SimulatedInput(object):
+    """
+    The object passed to digital input callbacks
+    """
+
+    def __init__(self, pin):
+        """
+        :param pin: gpio pin number
+        """
+        self.pin = pin
+
+
+class SimulatedExpProBackend(ExpProBackend):
+    """
+    A simulated Explorer HAT Pro.
+
+    When started, one generator thread for each type of input calls the
+    assigned callbacks at event_rate events per second. Digital inputs
+    and touch pads toggle, and analog inputs take a random walk, calling
+    back when the change exceeds the threshold.
+
+    If an input script is provided, it is played instead. It is a list of
+    dictionaries of the form:
+
+    {'time': 1.5, 'input': 'digital', 'channel': 1, 'value': 1}
+
+    'time' is in seconds from start and 'input' is one of digital, touch
+    or analog.
+    """
+
+    def __init__(self, event_rate=100.0, input_script=None, seed=None):
+        """
+        :param event_rate: events per second for each type of input
+        :param input_script: list of scripted input events
+        :param seed: random number seed
+        """
+        self.event_rate = event_rate
+        self.input_script = sorted(input_script or [],
+                                   key=lambda event: event['time'])
+        self.random = random.Random(seed)
+
+        self.high_callbacks = {}
+        self.low_callbacks = {}
+        self.pressed_callback = None
+        self.released_callback = None
+        self.analog_callbacks = {}
+        self.thresholds = {}
+
+        self.input_levels = [0] * 4
+        self.touch_levels = [0] * 8
+        self.analog_levels = [0.0] * 4
+        self.analog_reported = [0.0] * 4
+        self.output_levels = {pin: 0 for pin in self.OUTPUT_PINS}
+        self.motor_speeds = [0, 0]
+
+        # number of callbacks called
+        self.events = 0
+        self.lock = threading.Lock()
+
+    def input_on_high(self, channel, callback, bouncetime):
+        self.high_callbacks[channel] = callback
+
+    def input_on_low(self, channel, callback, bouncetime):
+        self.low_callbacks[channel] = callback
+
+    def touch_pressed(self, callback):
+        self.pressed_callback = callback
+
+    def touch_released(self, callback):
+        self.released_callback = callback
+
+    def analog_changed(self, channel, callback, threshold):
+        self.analog_callbacks[channel] = callback
+        self.thresholds[channel] = threshold
+
+    def output_brightness(self, pin, brightness):
+        self.output_levels[pin] = brightness
+
+    def motor_speed(self, motor, speed):
+        self.motor_speeds[motor - 1] = speed
+
+    def motors_speed(self, speed_1, speed_2):
+        self.motor_speeds = [speed_1, speed_2]
+
+    def start(self):
+        """
+        Start the event generator threads
+        """
+        if self.input_script:
+            generators = [self.play_script]
+        else:
+            generators = [self.digital_events, self.touch_events]
+            if self.analog_callbacks:
+                generators.append(self.analog_events)
+
+        for generator in generators:
+            thread = threading.Thread(target=generator)
+            thread.daemon = True
+            thread.start()
+
+    def count_event(self):
+        with self.lock:
+            self.events += 1
+
+    def set_input(self, input, channel, value):
+        """
+        Change a simulated input and call its callback
+        :param input: digital, touch or analog
+        :param channel: input channel, starting at 1
+        :param value: new level
+        """
+        if input == 'digital':
+            self.input_levels[channel - 1] = value
+            if value:
+                callback = self.high_callbacks.get(channel)
+            else:
+                callback = self.low_callbacks.get(channel)
+            if callback:
+                self.count_event()
+                callback(SimulatedInput(self.INPUT_PINS[channel - 1]))
+        elif input == 'touch':
+            self.touch_levels[channel - 1] = value
+            if value:
+                callback = self.pressed_callback
+            else:
+                callback = self.released_callback
+            if callback:
+                self.count_event()
+                callback(channel, value)
+        elif input == 'analog':
+            self.analog_levels[channel - 1] = value
+            callback = self.analog_callbacks.get(channel)
+            if callback and abs(value - self.analog_reported[channel - 1]) \
+                    >= self.thresholds[channel]:
+                self.analog_reported[channel - 1] = value
+                self.count_event()
+                callback(None, value)
+        else:
+            raise RuntimeError('Unknown simulated input: ', input)
+
+    def paced(self):
+        """
+        A generator that yields at event_rate times per second
+        """
+        interval = 1 / self.event_rate
+        next_event = time.monotonic()
+        while True:
+            next_event += interval
+            delay = next_event - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield
+
+    def digital_events(self):
+        for _ in self.paced():
+            channel = self.random.randint(1, 4)
+            self.set_input('digital', channel,
+                           1 - self.input_levels[channel - 1])
+
+    def touch_events(self):
+        for _ in self.paced():
+            channel = self.random.randint(1, 8)
+            self.set_input('touch', channel,
+                           1 - self.touch_levels[channel - 1])
+
+    def analog_events(self):
+        channels = list(self.analog_callbacks)
+        for _ in self.paced():
+            channel = self.random.choice(channels)
+            value = self.analog_levels[channel - 1] + \
+                self.random.uniform(-0.5, 0.5)
+            self.set_input('analog', channel, min(max(value, 0.0), 5.0))
+
+    def play_script(self):
+        start = time.monotonic()
+        for event in self.input_script:
+            delay = start + event['time'] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.set_input(event['input'], event['channel'], event['value'])
+
+
+def load_input_script(file_name):
+    """
+    Read a simulator input script from a json file
+    :param file_name: json file containing a list of input events
+    :return: the input script
+    """
+    with open(file_name) as script_file:
+        return json.load(script_file)
+
+
+def exp_pro_backend(backend_type, event_rate=100.0, input_script=None):
+    """
+    Create a backend by name
+    :param backend_type: 'explorerhat' or 'simulated'
+    :param event_rate: simulated events per second for each type of input
+    :param input_script: json file name for simulated input events
+    :return: an ExpProBackend
+    """
+    if backend_type == 'explorerhat':
+        return ExplorerHatBackend()
+    elif backend_type == 'simulated':
+        if input_script:
+            input_script = load_input_script(input_script)
+        return SimulatedExpProBackend(event_rate, input_script)
+    else:
+        raise RuntimeError('Unknown backend type: ', backend_type)
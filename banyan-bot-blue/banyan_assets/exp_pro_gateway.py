@@ -20,21 +20,29 @@ exp_pro_gateway.py
 
 """
 import argparse
+import queue
 import signal
 import sys
 import threading
 import time
+from functools import partial
 
-import explorerhat as eh
-from python_banyan.gateway_base import GatewayBase
+from edge_capture import EdgeRing, PulseTimer
+from exp_pro_backends import exp_pro_backend
+from onegpio_core import OneGpioGateway
+from output_scheduler import OutputScheduler
+from zmq_options import READY_TOPIC
 
 
 # noinspection PyMethodMayBeStatic,PyMethodMayBeStatic,SpellCheckingInspection,DuplicatedCode
-class ExpProGateway(GatewayBase):
+class ExpProGateway(OneGpioGateway):
     """
     A OneGPIO type gateway for the Pimoroni Explorer Hat Pro
     """
 
+    # motor speeds are received as -1.0 - 1.0
+    MOTOR_SPEED_SCALE = 100
+
     # noinspection PyDefaultArgument,PyRedundantParentheses
     def __init__(self, *subscriber_list, **kwargs):
         """
@@ -43,6 +51,11 @@ class ExpProGateway(GatewayBase):
 
         see the argparse section at the bottom of this file.
         """
+        # The hardware backend - the real Explorer HAT or a simulation of it
+        self.backend = exp_pro_backend(kwargs['backend'],
+                                       event_rate=kwargs['event_rate'],
+                                       input_script=kwargs['input_script'])
+
         # initialize the parent
         super(ExpProGateway, self).__init__(
             subscriber_list=subscriber_list,
@@ -55,73 +68,117 @@ class ExpProGateway(GatewayBase):
             process_name=kwargs[
                 'process_name'],
             board_type=kwargs['board_type'],
+            report_topic=kwargs['report_topic'],
+            numeric_timestamps=kwargs['numeric_timestamps'],
+            backend_commands=self.backend.COMMANDS,
+            socket_profile=kwargs['socket_profile'],
+            receive_mode=kwargs['receive_mode']
         )
         # get threshold levels for the analog inputs
-        self.threshold = kwargs['threshold']
-
-        # format is different if provided as default values vs.
-        # user entered values. format appropriately.
-        if isinstance(self.threshold, list):
-            # convert string values to floats
-            self.threshold = [float(i) for i in self.threshold]
-        else:
-            self.threshold = [float(i) for i in self.threshold.split(',')]
+        self.threshold = self.channel_settings(kwargs['threshold'], float,
+                                               'thresholds')
 
-        if len(self.threshold) != 4:
-            raise RuntimeError('You must specify 4 thresholds')
+        # maximum reports per second for each analog channel - 0 is unlimited
+        self.analog_rate = self.channel_settings(kwargs['analog_rate'], float,
+                                                 'analog rates')
 
-        self.enable_analog_input = kwargs['enable_analog_input']
-
-        # the explorer analog input code sends data
-        # too fast to process properly, so using
-        # the lock solves this issue.
+        # use every nth analog sample
+        self.decimation = self.channel_settings(kwargs['decimation'], int,
+                                                'decimation values')
 
-        self.the_lock = threading.RLock()
+        # maximum analog reports per second for all channels - 0 is unlimited
+        self.analog_budget = kwargs['analog_budget']
 
-        # get the report topic passed in
-        self.report_topic = (kwargs['report_topic'])
+        # True, False or a list of analog channels to enable
+        self.enable_analog_input = kwargs['enable_analog_input']
+        if self.enable_analog_input is True:
+            self.enable_analog_input = [1, 2, 3, 4]
+        elif not self.enable_analog_input:
+            self.enable_analog_input = []
+
+        # The report interval for each channel is set by its rate.
+        # The budget is shared equally between the enabled channels.
+        self.analog_channels = {}
+        for channel in self.enable_analog_input:
+            interval = 0
+            if self.analog_rate[channel - 1]:
+                interval = 1 / self.analog_rate[channel - 1]
+            if self.analog_budget:
+                interval = max(interval, len(self.enable_analog_input) /
+                               self.analog_budget)
+            self.analog_channels[channel] = AnalogChannel(
+                channel, interval, self.decimation[channel - 1])
+
+        # The explorer hat callbacks run on several threads, and the
+        # analog inputs can call back faster than reports can be
+        # published. Callbacks only queue an event of the form
+        # (report, pin, value, time, monotonic_ns). A single publisher
+        # thread owns publishing and drains the queue in batches.
+        self.report_queue = queue.SimpleQueue()
+
+        # maximum number of events published per batch
+        self.max_report_batch = 64
+
+        # In edge capture mode, every digital input edge is recorded in a
+        # ring buffer and the edges are published in batches every
+        # edge_interval seconds, instead of one report per change.
+        self.edge_capture = kwargs['edge_capture']
+        self.edge_interval = kwargs['edge_interval']
+        self.edge_ring = EdgeRing()
+        self.pulse_timers = {pin: PulseTimer() for pin in range(1, 5)}
+        self.next_edge_report = time.monotonic()
+
+        self.report_publisher = threading.Thread(target=self.publish_reports)
+        self.report_publisher.daemon = True
+        self.report_publisher.start()
 
         # A map of gpio pins to input channel numbers
         self.gpio_input_pins = {23: 1, 22: 2, 24: 3, 25: 4}
 
-        # A map of digital output and led object to gpio pins
-        self.digital_output_pins = {4: eh.light.blue,
-                                    17: eh.light.yellow,
-                                    27: eh.light.red,
-                                    5: eh.light.green,
-                                    6: eh.output.one,
-                                    12: eh.output.two,
-                                    13: eh.output.three,
-                                    16: eh.output.four
-                                    }
-        # analog input objects
-        self.analog_input_objects = [eh.analog.one, eh.analog.two,
-                                     eh.analog.three, eh.analog.four]
+        # gpio pins of the lights and the digital outputs
+        self.digital_output_pins = self.backend.OUTPUT_PINS
+
+        # Writes to the lights and outputs fade to the new level over
+        # fade_time seconds. All of the fades are run by a single thread.
+        self.fade_time = kwargs['fade_time']
+        self.output_scheduler = OutputScheduler(self.backend.output_brightness,
+                                                self.digital_output_pins)
+        self.output_scheduler.start()
+
+        # dc motor command handlers, keyed by command and then motor.
+        # Nested dictionaries avoid building a tuple key for each message.
+        self.motor_dispatch = {}
+        for command in ('dc_motor_forward', 'dc_motor_reverse'):
+            self.motor_dispatch[command] = {
+                motor: partial(self.backend.motor_speed, motor)
+                for motor in (1, 2)}
 
         # enable all of the digital inputs and assign
         # a callback for when the pin goes high
-        eh.input.one.on_high(self.input_callback_high, 60)
-        eh.input.two.on_high(self.input_callback_high, 60)
-        eh.input.three.on_high(self.input_callback_high, 60)
-        eh.input.four.on_high(self.input_callback_high, 60)
-
-        # assign a callback for when a pin goes low
-        eh.input.one.on_low(self.input_callback_low, 60)
-        eh.input.two.on_low(self.input_callback_low, 60)
-        eh.input.three.on_low(self.input_callback_low, 60)
-        eh.input.four.on_low(self.input_callback_low, 60)
+        # and for when a pin goes low
+        for channel in range(1, 5):
+            self.backend.input_on_high(channel, self.input_callback_high,
+                                       kwargs['bouncetime'])
+            self.backend.input_on_low(channel, self.input_callback_low,
+                                      kwargs['bouncetime'])
 
         # enable touch pins with callback
-        eh.touch.pressed(self.touch_pressed)
-        eh.touch.released(self.touch_released)
+        self.backend.touch_pressed(self.touch_pressed)
+        self.backend.touch_released(self.touch_released)
 
         # enable analog inputs if user selected to do so
         # when instantiating ExpProGateway
-        if kwargs['enable_analog_input']:
-            eh.analog.one.changed(self.analog_in1, self.threshold[0])
-            eh.analog.two.changed(self.analog_in2, self.threshold[1])
-            eh.analog.three.changed(self.analog_in3, self.threshold[2])
-            eh.analog.four.changed(self.analog_in4, self.threshold[3])
+        analog_callbacks = [self.analog_in1, self.analog_in2,
+                            self.analog_in3, self.analog_in4]
+        for channel in self.enable_analog_input:
+            self.backend.analog_changed(channel, analog_callbacks[channel - 1],
+                                        self.threshold[channel - 1])
+
+        self.backend.start()
+        self.mark_phase('hardware')
+
+        self.announce_ready(kwargs['process_name'],
+                            report_topic=self.report_topic)
 
         # start the banyan receive loop
         try:
@@ -136,21 +193,136 @@ class ExpProGateway(GatewayBase):
         """
         pass
 
-    def touch_pressed(self, pin, state):
-        timestamp = self.get_time_stamp()
+    def queue_report(self, report, pin, value):
+        """
+        Queue a report for the publisher thread.
+        This is safe to call from any thread and never blocks.
+        :param report: report type
+        :param pin: pin number - None for a report that is not about a pin
+        :param value: pin value, or the complete report if pin is None
+        """
+        self.report_queue.put((report, pin, value, time.time(),
+                               time.monotonic_ns()))
 
-        with self.the_lock:
-            payload = {'report': 'touch', 'pin': pin,
-                       'value': 1, 'timestamp': timestamp}
-            self.publish_payload(payload, self.report_topic)
+    def publish_reports(self):
+        """
+        The publisher thread. Wait for a queued event, then publish it
+        along with any other events that are waiting.
 
-    def touch_released(self, pin, state):
-        timestamp = self.get_time_stamp()
+        Analog samples of rate limited channels are collected into
+        windows, and a window is published when its channel's report
+        interval has passed.
+        """
+        while True:
+            # this thread is the only publisher - an error in one
+            # report must not stop all of the reports that follow
+            try:
+                self.publish_report_batch()
+            except Exception as e:
+                print('Report publisher error: ', repr(e))
+
+    def publish_report_batch(self):
+        """
+        Wait for queued events and publish them, then publish
+        the analog windows and edges that are due.
+        """
+        timeout = self.next_analog_report()
+        if self.edge_capture:
+            edges_due = max(self.next_edge_report - time.monotonic(), 0)
+            if timeout is None or edges_due < timeout:
+                timeout = edges_due
 
-        with self.the_lock:
-            payload = {'report': 'touch', 'pin': pin,
-                       'value': 0, 'timestamp': timestamp}
-            self.publish_payload(payload, self.report_topic)
+        batch = []
+        try:
+            batch.append(self.report_queue.get(timeout=timeout))
+            while len(batch) < self.max_report_batch:
+                batch.append(self.report_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        for report, pin, value, wall_time, monotonic_ns in batch:
+            if report == READY_TOPIC:
+                self.publish_payload(value, READY_TOPIC)
+                continue
+            # reports that are not about a pin are queued complete
+            if pin is None:
+                self.publish_report(value, wall_time, monotonic_ns)
+                continue
+            if report == 'analog_input':
+                channel = self.analog_channels[pin]
+                if not channel.add_sample(value, wall_time, monotonic_ns):
+                    continue
+                if channel.interval:
+                    continue
+                # not rate limited - report the sample
+                value = channel.take_window(time.monotonic())[3]
+            payload = {'report': report, 'pin': pin, 'value': value}
+            self.publish_report(payload, wall_time, monotonic_ns)
+
+        self.publish_analog_windows()
+
+        if self.edge_capture and \
+                time.monotonic() >= self.next_edge_report:
+            self.next_edge_report += self.edge_interval
+            self.publish_edges()
+
+    def publish_edges(self):
+        """
+        Publish the edges recorded since the last batch.
+
+        Report: {'report': 'edge_batch',
+                 'edges': [[pin, level, monotonic_ns], ...],
+                 'pulses': [[pin, width_ns, period_ns, frequency], ...],
+                 'dropped': total edges lost to ring overflow}
+
+        Pulse timing is included for the pins that had edges. Values
+        that are not known yet are None.
+        """
+        edges = self.edge_ring.take()
+        if not edges:
+            return
+
+        for pin, level, monotonic_ns in edges:
+            self.pulse_timers[pin].add_edge(level, monotonic_ns)
+
+        pulses = [[pin] + self.pulse_timers[pin].timing()
+                  for pin in sorted({edge[0] for edge in edges})]
+        payload = {'report': 'edge_batch', 'edges': edges, 'pulses': pulses,
+                   'dropped': self.edge_ring.dropped}
+        self.publish_report(payload)
+
+    def next_analog_report(self):
+        """
+        :return: Seconds until a collected analog window is due,
+                 or None if there are no collected samples.
+        """
+        due = [channel.next_report for channel in
+               self.analog_channels.values() if channel.samples]
+        if not due:
+            return None
+        return max(min(due) - time.monotonic(), 0)
+
+    def publish_analog_windows(self):
+        """
+        Publish the windows of all analog channels that are due.
+        The value reported is the mean of the window.
+        """
+        now = time.monotonic()
+        for pin, channel in self.analog_channels.items():
+            window = channel.take_window(now)
+            if window:
+                samples, minimum, maximum, mean, wall_time, monotonic_ns = \
+                    window
+                payload = {'report': 'analog_input', 'pin': pin,
+                           'value': mean, 'min': minimum, 'max': maximum,
+                           'samples': samples}
+                self.publish_report(payload, wall_time, monotonic_ns)
+
+    def touch_pressed(self, pin, state):
+        self.queue_report('touch', pin, 1)
+
+    def touch_released(self, pin, state):
+        self.queue_report('touch', pin, 0)
 
     def input_callback_high(self, data):
         """
@@ -159,16 +331,16 @@ class ExpProGateway(GatewayBase):
         the change of pin state for the pin.
         :param data: callback data
         """
-        with self.the_lock:
-            timestamp = self.get_time_stamp()
-            # translate pin number
-            if data.pin in self.gpio_input_pins:
-                pin = self.gpio_input_pins[data.pin]
-                payload = {'report': 'digital_input', 'pin': pin,
-                           'value': 1, 'timestamp': timestamp}
-                self.publish_payload(payload, self.report_topic)
+        # translate pin number
+        if data.pin in self.gpio_input_pins:
+            if self.edge_capture:
+                self.edge_ring.put(self.gpio_input_pins[data.pin], 1,
+                                   time.monotonic_ns())
             else:
-                raise RuntimeError('unknown input pin: ', data.pin)
+                self.queue_report('digital_input',
+                                  self.gpio_input_pins[data.pin], 1)
+        else:
+            raise RuntimeError('unknown input pin: ', data.pin)
 
     def input_callback_low(self, data):
         """
@@ -177,195 +349,151 @@ class ExpProGateway(GatewayBase):
         the change of pin state for the pin.
         :param data: callback data
         """
-        with self.the_lock:
-            timestamp = self.get_time_stamp()
-            # translate pin number
-            if data.pin in self.gpio_input_pins:
-                pin = self.gpio_input_pins[data.pin]
-                payload = {'report': 'digital_input', 'pin': pin,
-                           'value': 0, 'timestamp': timestamp}
-                self.publish_payload(payload, self.report_topic)
+        # translate pin number
+        if data.pin in self.gpio_input_pins:
+            if self.edge_capture:
+                self.edge_ring.put(self.gpio_input_pins[data.pin], 0,
+                                   time.monotonic_ns())
             else:
-                raise RuntimeError('unknown input pin: ', data.pin)
+                self.queue_report('digital_input',
+                                  self.gpio_input_pins[data.pin], 0)
+        else:
+            raise RuntimeError('unknown input pin: ', data.pin)
 
     def analog_in1(self, data, value):
-        with self.the_lock:
-            # explorer sometimes sends bogus data - just ignore it
-            if value > 5.1:
-                return
-            else:
-                self.publish_analog_data(1, value)
+        # explorer sometimes sends bogus data - just ignore it
+        if value > 5.1:
+            return
+        else:
+            self.publish_analog_data(1, value)
 
     def analog_in2(self, data, value):
-        with self.the_lock:
-            # explorer sometimes sends bogus data - just ignore it
-            if value > 5.1:
-                return
-            else:
-                self.publish_analog_data(2, value)
+        # explorer sometimes sends bogus data - just ignore it
+        if value > 5.1:
+            return
+        else:
+            self.publish_analog_data(2, value)
 
     def analog_in3(self, data, value):
-        with self.the_lock:
-            # explorer sometimes sends bogus data - just ignore it
-            if value > 5.1:
-                return
-            else:
-                self.publish_analog_data(3, value)
+        # explorer sometimes sends bogus data - just ignore it
+        if value > 5.1:
+            return
+        else:
+            self.publish_analog_data(3, value)
 
     def analog_in4(self, data, value):
-        with self.the_lock:
-            # explorer sometimes sends bogus data - just ignore it
-            if value > 5.1:
-                return
-            else:
-                self.publish_analog_data(4, value)
-
-    def publish_analog_data(self, pin, value):
-        # timestamp = self.get_time_stamp()
-        timestamp = self.get_time_stamp()
-        payload = {'report': 'analog_input', 'pin': pin,
-                   'value': value, 'timestamp': timestamp}
-        self.publish_payload(payload, self.report_topic)
-
-    def additional_banyan_messages(self, topic, payload):
-        """
-        This method will pass any messages not handled by this class to the
-        specific gateway class. Must be overwritten by the hardware gateway
-        class.
-        :param topic: message topic
-        :param payload: message payload
-        """
-
-        # dc motor commands
-        if payload['command'] == 'dc_motor_forward':
-            speed = payload['speed'] * 100
-            if payload['motor'] == 1:
-                eh.motor.one.speed(speed)
-            elif payload['motor'] == 2:
-                eh.motor.two.speed(speed)
-            else:
-                raise RuntimeError('unknown motor number')
-
-        elif payload['command'] == 'dc_motor_reverse':
-            speed = payload['speed'] * 100
-            if payload['motor'] == 1:
-                eh.motor.one.speed(speed)
-            elif payload['motor'] == 2:
-                eh.motor.two.speed(speed)
-            else:
-                raise RuntimeError('unknown motor')
-
+        # explorer sometimes sends bogus data - just ignore it
+        if value > 5.1:
+            return
         else:
-            raise RuntimeError('Unknown motor command')
+            self.publish_analog_data(4, value)
 
-    def analog_write(self, topic, payload):
-        """
+    def publish_analog_data(self, pin, value):
+        self.queue_report('analog_input', pin, value)
 
-        :param topic: message topic
-        :param payload: message payload
+    def publish_error(self, message):
         """
-        raise NotImplementedError
+        Report a command that could not be performed.
 
-    def digital_read(self, pin):
-        """
+        Report: {'report': 'error', 'message': message, 'timestamp': ...}
 
-        :param pin:
+        :param message: error description
         """
-        raise NotImplementedError
+        self.queue_report('error', None, {'report': 'error',
+                                          'message': message})
 
-    def digital_write(self, topic, payload):
+    def query_modes(self, topic, payload):
         """
-        Set a signal, specified by its pin number in the payload,
-        to the value specified in the payload.
+        Publish the pin modes from the publisher thread.
 
-        Typical message: to_hardware {'command': 'digital_write', 'value': 0, 'pin': 0}
+        Typical message: to_hardware {'command': 'query_modes'}
 
         :param topic: message topic
         :param payload: message payload
         """
-        # we will use the fade function
-        pin = payload['pin']
-        value = payload['value']
-        if pin in self.digital_output_pins:
-            output_object = self.digital_output_pins[pin]
-            output_object.fade(0, value, .0001)
-        else:
-            raise RuntimeError('illegal digital output pin: ', pin)
+        self.queue_report('pin_modes', None, {'report': 'pin_modes',
+                                              'modes': self.get_pin_modes()})
 
-    def disable_analog_reporting(self, topic, payload):
+    def publish_ready(self):
         """
-
-
-        :param topic: message topic
-        :param payload: message payload
+        Publish the readiness announcement from the publisher thread.
         """
-        raise NotImplementedError
+        self.queue_report(READY_TOPIC, None, self.ready_payload)
 
-    def disable_digital_reporting(self, topic, payload):
-        """
-        :param topic: message topic
-        :param payload: message payload
+    def query_queue_depths(self, topic, payload):
         """
-        raise NotImplementedError
+        Publish the queue statistics from the publisher thread.
 
-    def enable_analog_reporting(self, topic, payload):
-        """
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
+        Typical message: to_hardware {'command': 'query_queue_depths'}
 
-    def enable_digital_reporting(self, topic, payload):
-        """
         :param topic: message topic
         :param payload: message payload
         """
-        raise NotImplementedError
+        report = {'report': 'queue_depths'}
+        report.update(self.get_queue_depths())
+        self.queue_report('queue_depths', None, report)
 
-    def i2c_read(self, topic, payload):
+    def get_queue_depths(self):
         """
-        :param topic: message topic
-        :param payload: message payload
+        Add the report queue to the queue statistics.
+        :return: A dictionary of queue statistics
         """
-        raise NotImplementedError
+        depths = super(ExpProGateway, self).get_queue_depths()
+        depths['report_queue'] = self.report_queue.qsize()
+        return depths
 
-    def i2c_write(self, topic, payload):
-        """
-        :param topic: message topic
-        :param payload: message payload
+    def dc_motor_forward(self, topic, payload):
         """
-        raise NotImplementedError
+        Set the speed of a single motor. The direction is set by the
+        sign of the speed.
+
+        Typical message: to_hardware {'command': 'dc_motor_forward', 'motor': 1, 'speed': 0.8}
 
-    def play_tone(self, topic, payload):
-        """
         :param topic: message topic
         :param payload: message payload
         """
-        raise NotImplementedError
+        handler = self.motor_dispatch[payload['command']].get(payload['motor'])
+        if handler:
+            handler(payload['speed'] * self.MOTOR_SPEED_SCALE)
+        else:
+            self.publish_error('Unknown motor: %s' % payload['motor'])
+
+    # the direction is set by the sign of the speed
+    dc_motor_reverse = dc_motor_forward
 
-    def pwm_write(self, topic, payload):
+    def dc_motors_set(self, topic, payload):
         """
-        Set the specified drive pin to the specified pwm level
+        Set the speed of both motors with a single message.
 
-        Typical message:
-        to_hardware {'pin': 0, 'command': 'pwm_write', 'value': 0.41}
+        Typical message: to_hardware {'command': 'dc_motors_set', 'speeds': [0.8, 0.6]}
 
         :param topic: message topic
         :param payload: message payload
         """
-        raise NotImplementedError
+        speeds = payload['speeds']
+        if len(speeds) != 2:
+            self.publish_error('dc_motors_set requires 2 speeds')
+            return
+        self.backend.motors_speed(speeds[0] * self.MOTOR_SPEED_SCALE,
+                                  speeds[1] * self.MOTOR_SPEED_SCALE)
 
-    def servo_position(self, topic, payload):
+    def digital_write(self, topic, payload):
         """
-        Set servo angle for the specified servo
+        Set a signal, specified by its pin number in the payload,
+        to the value specified in the payload.
 
-        Typical message:
-        to_hardware {'command': 'servo_position', 'position': 114, 'pin': 1}
+        Typical message: to_hardware {'command': 'digital_write', 'value': 0, 'pin': 0}
 
         :param topic: message topic
         :param payload: message payload
         """
-        raise NotImplementedError
+        # the output scheduler performs the fade
+        pin = payload['pin']
+        value = payload['value']
+        if pin not in self.digital_output_pins:
+            self.publish_error('Illegal digital output pin: %s' % pin)
+            return
+        self.output_scheduler.set_target(pin, value, self.fade_time)
 
     def set_mode_analog_input(self, topic, payload):
         """
@@ -400,21 +528,6 @@ class ExpProGateway(GatewayBase):
         # self.pi.set_mode(payload['pin'], pigpio.OUTPUT)
         pass
 
-    def set_mode_pwm(self, topic, payload):
-        """
-         This method sets a GPIO pin capable of PWM for PWM operation.
-         :param topic: message topic
-         :param payload: {"command": "set_mode_pwm", "pin": “PIN”, "tag":”TAG” }
-         """
-        raise NotImplementedError
-
-    def set_mode_i2c(self, topic, payload):
-        """
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
-
     def set_mode_servo(self, topic, payload):
         """
         {'command': 'set_mode_servo', 'pin': 1}
@@ -424,62 +537,154 @@ class ExpProGateway(GatewayBase):
         """
         pass
 
-    def set_mode_sonar(self, topic, payload):
+    def get_pin_modes(self):
         """
-        :param topic: message topic
-        :param payload: message payload
-        """
-        raise NotImplementedError
+        The Explorer HAT pin modes are fixed, and the set_mode commands
+        are accepted without any effect. The digital inputs and the
+        enabled analog inputs are numbered by channel and the outputs
+        by gpio pin.
 
-    def set_mode_stepper(self, topic, payload):
+        :return: A list of [pin, mode name]
         """
-         - mode does not need to set - the stepper objects
-        are used directly.
-        :param topic: message topic
-        :param payload: message payload
+        modes = [[channel, 'digital_input'] for channel in
+                 sorted(self.gpio_input_pins.values())]
+        modes += [[channel, 'analog_input'] for channel in
+                  self.enable_analog_input]
+        modes += [[pin, 'digital_output'] for pin in self.digital_output_pins]
+        return modes
+
+    def channel_settings(self, settings, convert, name):
         """
-        raise NotImplementedError
+        Convert a per channel command line setting to a list.
 
-    def set_mode_tone(self, topic, payload):
+        The format is different if provided as default values vs.
+        user entered values.
+
+        :param settings: a list of strings or a comma delimited string
+        :param convert: conversion function for each value
+        :param name: setting name for error messages
+        :return: a list of 4 values
         """
+        if not isinstance(settings, list):
+            settings = settings.split(',')
+        settings = [convert(i) for i in settings]
 
-        :param topic: message topic
-        :param payload: message payload
+        if len(settings) != 4:
+            raise RuntimeError('You must specify 4 ' + name)
+        return settings
+
+
+class AnalogChannel(object):
+    """
+    Decimation and windowing for an analog input channel.
+    """
+
+    def __init__(self, pin, interval, decimation):
+        """
+        :param pin: analog input channel
+        :param interval: minimum seconds between reports - 0 is unlimited
+        :param decimation: use every nth sample
         """
-        raise NotImplementedError
+        self.pin = pin
+        self.interval = interval
+        self.decimation = max(decimation, 1)
 
-    def stepper_write(self, topic, payload):
+        # number of samples received, used for decimation
+        self.received = 0
+
+        # current window
+        self.samples = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.wall_time = None
+        self.monotonic_ns = None
+
+        # monotonic time when the next window may be reported
+        self.next_report = 0
+
+    def add_sample(self, value, wall_time, monotonic_ns):
         """
-         - stepper objects are handled directly
-        :param topic: message topic
-        :param payload: message payload
+        Add a sample to the current window.
+
+        :param value: analog value
+        :param wall_time: time of the sample
+        :param monotonic_ns: monotonic time of the sample
+        :return: False if the sample was dropped by decimation
         """
-        raise NotImplementedError
+        self.received += 1
+        if (self.received - 1) % self.decimation:
+            return False
+
+        if self.samples:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+        else:
+            self.minimum = self.maximum = value
+        self.samples += 1
+        self.total += value
+        self.wall_time = wall_time
+        self.monotonic_ns = monotonic_ns
+        return True
 
-    def get_time_stamp(self):
+    def take_window(self, now):
         """
-        Get the time of the pin change occurence
-        :return: Time stamp
+        Close the current window if its report is due.
+
+        :param now: monotonic time in seconds
+        :return: (samples, min, max, mean, time, monotonic_ns) of the last
+                 sample, or None if no report is due
         """
-        t = time.time()
-        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+        if not self.samples or now < self.next_report:
+            return None
+
+        window = (self.samples, self.minimum, self.maximum,
+                  self.total / self.samples, self.wall_time, self.monotonic_ns)
+        self.samples = 0
+        self.total = 0.0
+        self.next_report = now + self.interval
+        return window
 
 
 def exp_pro_gateway():
     parser = argparse.ArgumentParser()
     parser.add_argument("-a", dest="enable_analog_input", default="false",
-                        help="Set to True to enable analog input")
+                        help="Set to True to enable analog input, or a comma "
+                             "delimited list of analog channels to enable")
     parser.add_argument("-b", dest="back_plane_ip_address", default="None",
                         help="None or IP address used by Back Plane")
+    parser.add_argument("-c", dest="edge_capture", default="false",
+                        help="Publish every digital input edge in batches, "
+                             "with pulse timing: true or false")
     parser.add_argument("-d", dest="board_type", default="None",
                         help="This parameter identifies the target GPIO "
                              "device")
+    parser.add_argument("-e", dest="numeric_timestamps", default="false",
+                        help="Report time stamps as epoch seconds plus "
+                             "monotonic nanoseconds: true or false")
+    parser.add_argument("-f", dest="analog_rate", default="0, 0, 0, 0",
+                        nargs="+", help="A space delimited list of the maximum analog reports per second "
+                                        "for each channel. Must contain 4 values - 0 is unlimited")
+    parser.add_argument("-g", dest="decimation", default="1, 1, 1, 1",
+                        nargs="+", help="A space delimited list of analog decimation values. Must contain 4 "
+                                        "values - every nth sample is used")
+    parser.add_argument("-i", dest="event_rate", default="100.0",
+                        help="Simulated events per second for each "
+                             "type of input")
+    parser.add_argument("-j", dest="input_script", default="None",
+                        help="Simulated input script json file")
+    parser.add_argument("-k", dest="backend", default="explorerhat",
+                        help="Hardware backend: explorerhat or simulated")
     parser.add_argument("-l", dest="subscriber_list",
                         default="to_hardware", nargs='+',
                         help="Banyan topics space delimited: topic1 topic2 "
                              "topic3")
+    parser.add_argument("-m", dest="bouncetime", default="60",
+                        help="Digital input debounce time in milliseconds")
     parser.add_argument("-n", dest="process_name", default="ExpProGateway",
                         help="Set process name in banner")
+    parser.add_argument("-o", dest="fade_time", default="0.0",
+                        help="Seconds to fade a light or output to a new level")
     parser.add_argument("-p", dest="publisher_port", default='43124',
                         help="Publisher IP port")
     parser.add_argument("-r", dest="report_topic", default='report_from_hardware',
@@ -489,17 +694,35 @@ def exp_pro_gateway():
     parser.add_argument("-t", dest="threshold", default="0.3, 0.3, 0.3, 0.3",
                         nargs="+", help="A space delimited list of analog input sensitivities. Must contain 4 values "
                                         "between 0.0 and 5.0")
+    parser.add_argument("-u", dest="analog_budget", default="0",
+                        help="Maximum analog reports per second for all "
+                             "channels - 0 is unlimited")
+    parser.add_argument("-x", dest="edge_interval", default=".05",
+                        help="Seconds between edge batches in edge "
+                             "capture mode")
+    parser.add_argument("-y", dest="receive_mode", default="sleep",
+                        help="Receive loop: sleep for loop_time when idle "
+                             "or poll - block until a message arrives")
+    parser.add_argument("-z", dest="socket_profile", default="default",
+                        help="zmq socket profile: default, low_latency "
+                             "or throughput")
 
     args = parser.parse_args()
     if args.back_plane_ip_address == 'None':
         args.back_plane_ip_address = None
     if args.board_type == 'None':
-        args.back_plane_ip_address = None
+        args.board_type = None
     args.enable_analog_input = args.enable_analog_input.lower()
     if args.enable_analog_input == 'true':
         args.enable_analog_input = True
+    elif args.enable_analog_input[0].isdigit():
+        args.enable_analog_input = [int(i) for i in
+                                    args.enable_analog_input.split(',')]
     else:
         args.enable_analog_input = False
+    args.numeric_timestamps = args.numeric_timestamps.lower() == 'true'
+    if args.input_script == 'None':
+        args.input_script = None
     kw_options = {
         'enable_analog_input': args.enable_analog_input,
         'back_plane_ip_address': args.back_plane_ip_address,
@@ -509,7 +732,20 @@ def exp_pro_gateway():
         # 'loop_time': float(args.loop_time),
         'report_topic': args.report_topic,
         'board_type': args.board_type,
-        'threshold': args.threshold}
+        'threshold': args.threshold,
+        'analog_rate': args.analog_rate,
+        'decimation': args.decimation,
+        'analog_budget': float(args.analog_budget),
+        'numeric_timestamps': args.numeric_timestamps,
+        'backend': args.backend,
+        'event_rate': float(args.event_rate),
+        'input_script': args.input_script,
+        'fade_time': float(args.fade_time),
+        'edge_capture': args.edge_capture.lower() == 'true',
+        'edge_interval': float(args.edge_interval),
+        'bouncetime': int(args.bouncetime),
+        'socket_profile': args.socket_profile,
+        'receive_mode': args.receive_mode}
 
     try:
         app = ExpProGateway(args.subscriber_list, **kw_options)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+i2c_scheduler.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import itertools
+import queue
+import threading
+import time
+
+
+class I2cRequest(object):
+    """
+    A bus operation waiting to be performed by the I2cBusScheduler
+    """
+
+    def __init__(self, function, args):
+        """
+        :param function: function that performs the bus operation
+        :param args: arguments for the function
+        """
+        self.function = function
+        self.args = args
+        self.done = threading.Event()
+        self.value = None
+        self.exception = None
+
+    def result(self):
+        """
+        Wait for the operation to be performed.
+        :return: The value returned by the operation
+        """
+        self.done.wait()
+        if self.exception:
+            raise self.exception
+        return self.value
+
+
+class I2cBusScheduler(threading.Thread):
+    """
+    A single worker thread that owns the I2C bus.
+
+    Operations are queued with a priority and performed in priority
+    order. Operations of equal priority are performed in the order
+    they were submitted.
+
+    All operations that are waiting when the worker wakes up are
+    performed as one batch. If several operations in a batch were
+    submitted with the same key, only the most recently submitted
+    one is performed.
+
+    The time each operation waited in the queue is kept in a log2
+    histogram for each priority.
+    """
+
+    # priorities
+    SAFETY = 0
+    COMMAND = 1
+    POLL = 2
+
+    PRIORITY_NAMES = ['safety', 'command', 'poll']
+
+    # histogram bucket n counts waits of 2**(n-1) up to 2**n microseconds
+    HISTOGRAM_BUCKETS = 24
+
+    def __init__(self, max_batch=64):
+        """
+        :param max_batch: maximum number of operations performed per batch
+        """
+        self.max_batch = max_batch
+
+        # entries are (priority, sequence number, key, submit time, request)
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+
+        self.histograms = [[0] * self.HISTOGRAM_BUCKETS
+                           for _ in self.PRIORITY_NAMES]
+        self.superseded = 0
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def submit(self, priority, function, *args, key=None):
+        """
+        Queue a bus operation.
+
+        :param priority: SAFETY, COMMAND or POLL
+        :param function: function that performs the bus operation
+        :param args: arguments for the function
+        :param key: operations with the same key replace one another
+                    within a batch
+        :return: an I2cRequest
+        """
+        request = I2cRequest(function, args)
+        self.queue.put((priority, next(self.sequence), key,
+                        time.perf_counter(), request))
+        return request
+
+    def call(self, priority, function, *args):
+        """
+        Perform a bus operation and wait for its result.
+
+        :param priority: SAFETY, COMMAND or POLL
+        :param function: function that performs the bus operation
+        :param args: arguments for the function
+        :return: The value returned by function
+        """
+        return self.submit(priority, function, *args).result()
+
+    def run(self):
+        """
+        The bus worker thread.
+        """
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # sequence numbers are unique, so the requests are never compared
+            batch.sort()
+
+            # find the latest submission for each key
+            latest = {}
+            for entry in batch:
+                if entry[2] is not None:
+                    latest[entry[2]] = max(latest.get(entry[2], -1), entry[1])
+
+            for priority, sequence, key, submitted, request in batch:
+                if key is not None and latest[key] != sequence:
+                    self.superseded += 1
+                    request.done.set()
+                    continue
+
+                self.record_latency(priority, time.perf_counter() - submitted)
+
+                try:
+                    request.value = request.function(*request.args)
+                except Exception as e:
+                    request.exception = e
+                    print('I2C operation failed: ', request.function.__name__,
+                          request.args, e)
+                request.done.set()
+
+    def record_latency(self, priority, wait):
+        """
+        Add a queue wait time to the histogram for its priority
+        :param priority: SAFETY, COMMAND or POLL
+        :param wait: wait time in seconds
+        """
+        bucket = min(int(wait * 1000000).bit_length(),
+                     self.HISTOGRAM_BUCKETS - 1)
+        self.histograms[priority][bucket] += 1
+
+    def get_latency_histograms(self):
+        """
+        :return: A dictionary of histograms, keyed by priority name
+        """
+        return {name: list(histogram) for name, histogram in
+                zip(self.PRIORITY_NAMES, self.histograms)}
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+latency_histogram.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+
+class LatencyHistogram(object):
+    """
+    A constant memory latency histogram in the style of HdrHistogram.
+
+    Values are integers, normally nanoseconds. Values below
+    SUB_BUCKETS are counted exactly. Above that, each power of two is
+    split into SUB_BUCKETS / 2 linear buckets, so a reported value is
+    within 1 / (SUB_BUCKETS / 2) of the recorded one - better than
+    2 percent with the default of 128. Values above the largest
+    trackable value are counted in the last bucket.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF_BUCKETS = SUB_BUCKETS >> 1
+
+    def __init__(self, highest_value=60000000000):
+        """
+        :param highest_value: largest value tracked - 60 seconds in ns
+        """
+        self.highest_shift = max(
+            highest_value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        self.counts = [0] * (self.SUB_BUCKETS +
+                             self.highest_shift * self.HALF_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        """
+        :param value: a recorded value
+        :return: index of the bucket that counts it
+        """
+        if value < self.SUB_BUCKETS:
+            return max(value, 0)
+        shift = min(value.bit_length() - self.SUB_BUCKET_BITS,
+                    self.highest_shift)
+        sub_bucket = min(value >> shift, self.SUB_BUCKETS - 1)
+        return self.SUB_BUCKETS + (shift - 1) * self.HALF_BUCKETS + \
+            sub_bucket - self.HALF_BUCKETS
+
+    def bucket_value(self, index):
+        """
+        :param index: a bucket index
+        :return: the middle of the range of values the bucket counts
+        """
+        if index < self.SUB_BUCKETS:
+            return index
+        shift, sub_bucket = divmod(index - self.SUB_BUCKETS,
+                                   self.HALF_BUCKETS)
+        shift += 1
+        return ((sub_bucket + self.HALF_BUCKETS) << shift) + \
+            (1 << (shift - 1))
+
+    def record(self, value):
+        """
+        :param value: latency to record
+        """
+        value = int(value)
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percentile):
+        """
+        :param percentile: 0 - 100
+        :return: the value at the percentile, or None when empty
+        """
+        if not self.count:
+            return None
+        if percentile >= 100:
+            return self.max
+        target = max(int(self.count * percentile / 100 + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        """
+        :return: the mean value, or None when empty
+        """
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def report(self, percentiles=(50, 90, 99, 99.9, 100)):
+        """
+        :param percentiles: percentiles to include
+        :return: the statistics as a dictionary
+        """
+        return {'count': self.count, 'min': self.min, 'mean': self.mean(),
+                'percentiles': [[percentile, self.percentile(percentile)]
+                                for percentile in percentiles]}
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+"""
+onegpio_core.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import time
+
+from python_banyan.gateway_base import GatewayBase
+
+from zmq_options import SocketOptions
+
+
+class OneGpioGateway(SocketOptions, GatewayBase):
+    """
+    The common core of the OneGPIO gateways in this project.
+
+    The hardware backend declares the commands it supports in its
+    COMMANDS attribute. A gateway may add gateway level commands, such
+    as statistics queries, in its own COMMANDS attribute. Each command
+    is handled by the gateway method of the same name, called with
+    (topic, payload).
+
+    The command dictionary is built from these declarations once, at
+    startup. A command that is not in it is answered with an error
+    report instead of raising an exception in the receive loop.
+
+    The core also provides time stamping and publishing of reports,
+    and answers query_modes with a snapshot of the pin modes, so that
+    clients may cache the modes and send only the set_mode commands
+    that are needed, and query_queue_depths with the queue statistics.
+    """
+
+    # commands handled by the core for every gateway
+    CORE_COMMANDS = ('query_modes', 'query_queue_depths')
+
+    # gateway level commands
+    COMMANDS = ()
+
+    # pin mode names as used in the set_mode commands
+    MODE_NAMES = {GatewayBase.DIGITAL_INPUT_MODE: 'digital_input',
+                  GatewayBase.DIGITAL_OUTPUT_MODE: 'digital_output',
+                  GatewayBase.PWM_OUTPUT_MODE: 'pwm',
+                  GatewayBase.ANALOG_INPUT_MODE: 'analog_input',
+                  GatewayBase.DIGITAL_INPUT_PULLUP_MODE: 'digital_input_pullup',
+                  GatewayBase.SERVO_MODE: 'servo'}
+
+    def __init__(self, subscriber_list=None, back_plane_ip_address=None,
+                 subscriber_port='43125', publisher_port='43124',
+                 process_name='', board_type=None,
+                 report_topic='report_from_hardware',
+                 numeric_timestamps=False, backend_commands=(),
+                 socket_profile='default', receive_mode='sleep'):
+        """
+        :param subscriber_list: a tuple or list of topics to be subscribed to
+        :param back_plane_ip_address: ip address for backplane
+        :param subscriber_port: backplane subscriber port
+        :param publisher_port: backplane publisher port
+        :param process_name: component identifier
+        :param board_type: micro-controller type ID
+        :param report_topic: topic for reports from the hardware
+        :param numeric_timestamps: report time stamps as numbers
+        :param backend_commands: commands supported by the hardware backend
+        :param socket_profile: zmq socket option profile
+        :param receive_mode: sleep or poll
+        """
+        # get the report topic passed in
+        self.report_topic = report_topic
+
+        # report time stamps as numbers instead of formatted strings
+        self.numeric_timestamps = numeric_timestamps
+
+        # (second, formatted time stamp) for the last time stamp.
+        # Reports are built on more than one thread, so the pair is
+        # always read and replaced as a whole.
+        self.time_stamp = (None, None)
+
+        super(OneGpioGateway, self).__init__(
+            subscriber_list=subscriber_list,
+            back_plane_ip_address=back_plane_ip_address,
+            subscriber_port=subscriber_port,
+            publisher_port=publisher_port,
+            process_name=process_name,
+            board_type=board_type)
+
+        self.apply_socket_profile(socket_profile, receive_mode)
+
+        # replace the dictionary of all OneGPIO commands with
+        # the commands this gateway supports
+        self.command_dictionary = {}
+        for command in tuple(backend_commands) + self.CORE_COMMANDS + \
+                self.COMMANDS:
+            handler = getattr(self, command, None)
+            if handler is None:
+                raise RuntimeError('No handler for command: ', command)
+            self.command_dictionary[command] = handler
+
+    def incoming_message_processing(self, topic, payload):
+        """
+        Messages are sent here from the receive_loop
+        :param topic: Message Topic string
+        :param payload: Message Data
+        """
+        command = payload.get('command')
+        handler = self.command_dictionary.get(command)
+        if handler is None:
+            self.publish_error('Unsupported command: %s' % command)
+            return
+
+        # if a tag is provided and the tag is in the dictionary, fetch
+        # the associated pin number
+        tag = payload.get('tag')
+        if tag:
+            if tag in self.tags_dictionary:
+                # the pin is optional if using tag, so add it to the payload
+                payload['pin'] = self.tags_dictionary[tag]
+            else:
+                self.tags_dictionary[tag] = payload['pin']
+
+        handler(topic, payload)
+
+    def additional_banyan_messages(self, topic, payload):
+        """
+        All supported commands are in the command dictionary.
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.publish_error('Unsupported command: %s' % payload.get('command'))
+
+    def query_modes(self, topic, payload):
+        """
+        Publish the modes of all of the pins that have a mode.
+
+        Each entry is the pin number used in the set_mode command and
+        the mode name - the set_mode command without the set_mode_ prefix.
+        A pin number may appear more than once, for example a signal and
+        a drive with the same number.
+
+        Typical message: to_hardware {'command': 'query_modes'}
+        Typical report: {'report': 'pin_modes',
+                         'modes': [[0, 'digital_input_pullup'], [1, 'pwm']]}
+
+        :param topic: message topic
+        :param payload: message payload
+        """
+        self.publish_report({'report': 'pin_modes',
+                             'modes': self.get_pin_modes()})
+
+    def get_pin_modes(self):
+        """
+        This is handled within the class for each hardware type
+        :return: A list of [pin, mode name]
+        """
+        raise NotImplementedError
+
+    def query_queue_depths(self, topic, payload):
+        """
+        Publish the queue statistics.
+
+        Typical message: to_hardware {'command': 'query_queue_depths'}
+        Typical report: {'report': 'queue_depths', 'profile': 'default',
+                         'subscriber': {'bursts': 10, 'messages': 42,
+                                        'max_depth': 12, 'histogram': [...]}}
+
+        :param topic: message topic
+        :param payload: message payload
+        """
+        report = {'report': 'queue_depths'}
+        report.update(self.get_queue_depths())
+        self.publish_report(report)
+
+    def get_queue_depths(self):
+        """
+        Gateways add the depths of their own queues.
+        :return: A dictionary of queue statistics
+        """
+        return {'profile': self.socket_profile,
+                'subscriber': self.queue_depths.report()}
+
+    def publish_report(self, payload, wall_time=None, monotonic_ns=None):
+        """
+        Time stamp and publish a report.
+        :param payload: report payload
+        :param wall_time: time of the change - defaults to now
+        :param monotonic_ns: monotonic time of the change - defaults to now
+        """
+        self.publish_payload(self.time_stamp_report(payload, wall_time,
+                                                    monotonic_ns),
+                             self.report_topic)
+
+    def publish_error(self, message):
+        """
+        Report a command that could not be performed.
+
+        Report: {'report': 'error', 'message': message, 'timestamp': ...}
+
+        :param message: error description
+        """
+        self.publish_report({'report': 'error', 'message': message})
+
+    def get_time_stamp(self, wall_time=None):
+        """
+        Get the time of the pin change occurence.
+        The formatted string is only rebuilt when the second changes.
+        :param wall_time: time of the change - defaults to now
+        :return: Time stamp
+        """
+        if wall_time is None:
+            wall_time = time.time()
+        t = int(wall_time)
+        second, string = self.time_stamp
+        if t != second:
+            string = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+            self.time_stamp = (t, string)
+        return string
+
+    def time_stamp_report(self, payload, wall_time=None, monotonic_ns=None):
+        """
+        Add the time of the pin change occurence to a report.
+
+        By default, this is a formatted string with a resolution of
+        one second. If numeric time stamps are enabled, the time stamp
+        is the wall clock time as epoch seconds, and the value of the
+        monotonic clock in nanoseconds is added for latency calculations.
+        Formatting is left to the consumer of the report.
+
+        :param payload: report payload
+        :param wall_time: time of the change - defaults to now
+        :param monotonic_ns: monotonic time of the change - defaults to now
+        :return: the payload
+        """
+        if wall_time is None:
+            wall_time = time.time()
+        if self.numeric_timestamps:
+            if monotonic_ns is None:
+                monotonic_ns = time.monotonic_ns()
+            payload['timestamp'] = wall_time
+            payload['monotonic_ns'] = monotonic_ns
+        else:
+            payload['timestamp'] = self.get_time_stamp(wall_time)
+        return payload
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""
+output_scheduler.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import threading
+import time
+
+
+class OutputFade(object):
+    """
+    The fade state of a single output
+    """
+
+    def __init__(self):
+        self.level = 0
+        # the last level written to the output
+        self.written = None
+        self.start_level = 0
+        self.target = 0
+        self.start_time = 0
+        self.duration = 0
+        self.active = False
+
+    def level_at(self, now):
+        """
+        :param now: monotonic time in seconds
+        :return: the level of the fade at time now
+        """
+        if not self.active:
+            return self.level
+        if self.duration <= 0 or now >= self.start_time + self.duration:
+            return self.target
+        return self.start_level + (self.target - self.start_level) * \
+            (now - self.start_time) / self.duration
+
+
+class OutputScheduler(threading.Thread):
+    """
+    A single worker thread that fades the outputs.
+
+    Each output keeps one fade state. A new target for an output that
+    is still fading retargets the fade from its current level, rather
+    than starting another fade.
+
+    While any output is fading, the levels of all of the fading outputs
+    are updated together, once per tick.
+    """
+
+    def __init__(self, set_level, pins, tick=.01):
+        """
+        :param set_level: function called with (pin, level) to set an output
+        :param pins: the output pins
+        :param tick: seconds between level updates
+        """
+        self.set_level = set_level
+        self.tick = tick
+        self.fades = {pin: OutputFade() for pin in pins}
+
+        # number of fades retargeted while in flight
+        self.retargeted = 0
+
+        self.condition = threading.Condition()
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def set_target(self, pin, target, duration):
+        """
+        Fade an output to a new level.
+
+        :param pin: output pin
+        :param target: new level
+        :param duration: fade time in seconds
+        """
+        with self.condition:
+            fade = self.fades[pin]
+            now = time.monotonic()
+            if fade.active:
+                self.retargeted += 1
+            fade.start_level = fade.level_at(now)
+            fade.target = target
+            fade.start_time = now
+            fade.duration = duration
+            fade.active = True
+            self.condition.notify()
+
+    def run(self):
+        """
+        The output worker thread.
+        """
+        next_tick = time.monotonic()
+        while True:
+            with self.condition:
+                while not any(fade.active for fade in self.fades.values()):
+                    self.condition.wait()
+                    next_tick = time.monotonic()
+
+                now = time.monotonic()
+                updates = []
+                for pin, fade in self.fades.items():
+                    if not fade.active:
+                        continue
+                    level = fade.level_at(now)
+                    if level == fade.target:
+                        fade.active = False
+                    if level != fade.written:
+                        updates.append((pin, level))
+                        fade.written = level
+                    fade.level = level
+
+            for pin, level in updates:
+                self.set_level(pin, level)
+
+            next_tick += self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+report_batch.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+
+def unpack_input_batch(payload):
+    """
+    Expand an input_batch report into individual input reports.
+
+    A gateway running in batch mode publishes all of the input changes
+    found in one poll cycle as a single report:
+
+    {'report': 'input_batch', 'inputs': [[pin, value, timestamp], ...],
+     'analog': [pins reported as analog_input]}
+
+    If the gateway uses numeric time stamps, the batch also contains
+    'monotonic_ns', which is copied to each report.
+
+    :param payload: input_batch report
+    :return: A list of digital_input and analog_input reports
+    """
+    analog = payload.get('analog', [])
+    reports = []
+    for pin, value, timestamp in payload['inputs']:
+        if pin in analog:
+            report = {'report': 'analog_input', 'pin': pin, 'value': value,
+                      'timestamp': timestamp}
+        else:
+            report = {'report': 'digital_input', 'pin': pin, 'value': value,
+                      'timestamp': timestamp}
+        if 'monotonic_ns' in payload:
+            report['monotonic_ns'] = payload['monotonic_ns']
+        reports.append(report)
+    return reports
+
+
+def unpack_edge_batch(payload):
+    """
+    Reduce an edge_batch report to digital input reports.
+
+    A gateway in edge capture mode publishes the input edges recorded
+    during an interval as a single report:
+
+    {'report': 'edge_batch', 'edges': [[pin, level, monotonic_ns], ...],
+     'pulses': [[pin, width_ns, period_ns, frequency], ...],
+     'dropped': count, 'timestamp': ...}
+
+    Subscribers that only need input levels can use this to get a
+    digital_input report with the final level of each pin in the batch.
+
+    :param payload: edge_batch report
+    :return: A list of digital_input reports
+    """
+    levels = {}
+    for pin, level, monotonic_ns in payload['edges']:
+        levels[pin] = level, monotonic_ns
+    return [{'report': 'digital_input', 'pin': pin, 'value': level,
+             'timestamp': payload['timestamp'], 'monotonic_ns': monotonic_ns}
+            for pin, (level, monotonic_ns) in levels.items()]
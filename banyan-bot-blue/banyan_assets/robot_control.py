@@ -26,10 +26,12 @@ import signal
 import time
 import sys
 from python_banyan.banyan_base import BanyanBase
+from report_batch import unpack_edge_batch, unpack_input_batch
+from zmq_options import READY_TOPIC, SocketOptions
 
 
 # noinspection PyMethodMayBeStatic
-class RobotControl(BanyanBase):
+class RobotControl(SocketOptions, BanyanBase):
     """
     This class accepts robot commands and translates them
     to motor control messages.
@@ -43,7 +45,8 @@ class RobotControl(BanyanBase):
                  publish_to_ui_topic=None,
                  publish_to_hardware_topic=None, subscribe_from_ui_topic=None,
                  subscribe_from_hardware_topic=None, additional_subscriber_list=None,
-                 forward_speed=80, turn_speed=60, speed_scale_factor=100):
+                 forward_speed=80, turn_speed=60, speed_scale_factor=100,
+                 socket_profile='default', receive_mode='sleep'):
         """
 
         :param back_plane_ip_address: ip address for backplane
@@ -59,6 +62,8 @@ class RobotControl(BanyanBase):
         :param forward_speed: motor speed to go forward or reverse
         :param turn_speed: turning motor speed
         :param speed_scale_factor: speed scaling
+        :param socket_profile: zmq socket option profile
+        :param receive_mode: sleep or poll
 
         """
         # save input parameters as instance variables
@@ -79,6 +84,8 @@ class RobotControl(BanyanBase):
                                            publisher_port=self.publisher_port,
                                            loop_time=self.loop_time)
 
+        self.apply_socket_profile(socket_profile, receive_mode)
+
         # set subscription topics
         self.subscribe_from_ui_topic = subscribe_from_ui_topic
         self.set_subscriber_topic(self.subscribe_from_ui_topic)
@@ -86,6 +93,10 @@ class RobotControl(BanyanBase):
         self.subscribe_from_hardware_topic = subscribe_from_hardware_topic
         self.set_subscriber_topic(self.subscribe_from_hardware_topic)
 
+        # a gateway that starts, or restarts, after robot control
+        # announces itself here, and is then asked for its modes
+        self.set_subscriber_topic(READY_TOPIC)
+
         # if caller specified a list of additional subscription topics, subscribe to those
         if self.additional_subscriber_list is not None:
             for topic in self.additional_subscriber_list:
@@ -174,11 +185,16 @@ class RobotControl(BanyanBase):
             }
 
         ]
+        # the bumper switch inputs as [pin, mode] entries of a pin_modes report
+        self.bumper_modes = {(0, 'digital_input_pullup'),
+                             (1, 'digital_input_pullup')}
+
         # set bumper switch inputs
-        payload = {'command': 'set_mode_digital_input_pullup', 'pin': 0}
-        self.publish_payload(payload, self.publish_to_hardware_topic)
-        payload = {'command': 'set_mode_digital_input_pullup', 'pin': 1}
-        self.publish_payload(payload, self.publish_to_hardware_topic)
+        for pin, mode in sorted(self.bumper_modes):
+            payload = {'command': 'set_mode_' + mode, 'pin': pin}
+            self.publish_payload(payload, self.publish_to_hardware_topic)
+
+        self.announce_ready(self.process_name)
 
         # start up the Banyan receive_loop
         self.receive_loop()
@@ -198,10 +214,48 @@ class RobotControl(BanyanBase):
                 self.motion_control(payload)
         # Handle messages from the hardware
         elif topic == self.subscribe_from_hardware_topic:
-            self.avoidance_control(payload)
+            # a gateway in batch mode reports several inputs at once
+            if payload['report'] == 'input_batch':
+                for report in unpack_input_batch(payload):
+                    if report['report'] == 'digital_input':
+                        self.avoidance_control(report)
+            elif payload['report'] == 'edge_batch':
+                for report in unpack_edge_batch(payload):
+                    self.avoidance_control(report)
+            elif payload['report'] == 'digital_input':
+                self.avoidance_control(payload)
+            elif payload['report'] == 'pin_modes':
+                self.set_bumper_modes(payload['modes'])
+            elif payload['report'] == 'error':
+                print('Gateway error: ', payload['message'])
+            # other reports, such as statistics, are not used here
+        elif topic == READY_TOPIC:
+            if payload.get('report_topic') == \
+                    self.subscribe_from_hardware_topic:
+                self.query_modes()
         else:
             raise RuntimeError('Unknown topic received: ', topic)
 
+    def query_modes(self):
+        """
+        Ask the gateway for its pin modes.
+        """
+        payload = {'command': 'query_modes'}
+        self.publish_payload(payload, self.publish_to_hardware_topic)
+
+    def set_bumper_modes(self, modes):
+        """
+        Set the modes of the bumper switch inputs that the gateway
+        does not have yet. This is used when a gateway announces that
+        it is ready, so that the modes are not sent again to a gateway
+        that already has them.
+        :param modes: list of [pin, mode name] from a pin_modes report
+        """
+        current_modes = {tuple(mode) for mode in modes}
+        for pin, mode in sorted(self.bumper_modes - current_modes):
+            payload = {'command': 'set_mode_' + mode, 'pin': pin}
+            self.publish_payload(payload, self.publish_to_hardware_topic)
+
     def motion_control(self, payload):
         """
         Motor control
@@ -295,6 +349,12 @@ def robot_control():
                         help="Topic From User Interface")
     parser.add_argument("-v", dest="subscribe_from_hardware_topic", default="report_from_hardware",
                         help="Topic From Hardware")
+    parser.add_argument("-y", dest="receive_mode", default="sleep",
+                        help="Receive loop: sleep for loop_time when idle "
+                             "or poll - block until a message arrives")
+    parser.add_argument("-z", dest="socket_profile", default="default",
+                        help="zmq socket profile: default, low_latency "
+                             "or throughput")
 
     args = parser.parse_args()
     if args.back_plane_ip_address == 'None':
@@ -319,7 +379,9 @@ def robot_control():
         'subscribe_from_hardware_topic': args.subscribe_from_hardware_topic,
         'forward_speed': int(args.forward_speed),
         'turn_speed': int(args.turn_speed),
-        'speed_scale_factor': float(args.speed_scale_factor)
+        'speed_scale_factor': float(args.speed_scale_factor),
+        'socket_profile': args.socket_profile,
+        'receive_mode': args.receive_mode
     }
 
     try:
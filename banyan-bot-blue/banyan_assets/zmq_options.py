@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+"""
+zmq_options.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import os
+import time
+
+import msgpack
+import zmq
+
+# Socket option profiles, applied to both the publisher and the
+# subscriber socket of a component.
+#
+# ZMQ_CONFLATE is not used. It does not support multipart messages,
+# and every Banyan message is a topic and a payload part. Gateways that
+# only need the latest value, such as the Crickit setpoints, coalesce
+# in the receive loop instead.
+SOCKET_PROFILES = {
+    # the zmq defaults
+    'default': {},
+
+    # Control traffic. Short queues, so that a backlog of commands is
+    # dropped instead of being performed late, no queueing to a backplane
+    # that is not connected yet, no waiting for unsent messages on exit,
+    # and a backplane that disappears is detected by tcp keepalive.
+    'low_latency': {zmq.SNDHWM: 100,
+                    zmq.RCVHWM: 100,
+                    zmq.LINGER: 0,
+                    zmq.IMMEDIATE: 1,
+                    zmq.TCP_KEEPALIVE: 1,
+                    zmq.TCP_KEEPALIVE_IDLE: 10,
+                    zmq.TCP_KEEPALIVE_INTVL: 5,
+                    zmq.TCP_KEEPALIVE_CNT: 3},
+
+    # Telemetry. Deep queues and large kernel buffers, so that bursts
+    # of reports are absorbed instead of dropped, and a second on exit
+    # to send what is still queued.
+    'throughput': {zmq.SNDHWM: 100000,
+                   zmq.RCVHWM: 100000,
+                   zmq.LINGER: 1000,
+                   zmq.SNDBUF: 1048576,
+                   zmq.RCVBUF: 1048576,
+                   zmq.TCP_KEEPALIVE: 1,
+                   zmq.TCP_KEEPALIVE_IDLE: 10,
+                   zmq.TCP_KEEPALIVE_INTVL: 5,
+                   zmq.TCP_KEEPALIVE_CNT: 3},
+}
+
+
+# How the receive loop waits for messages.
+#
+# sleep - check the subscriber without blocking and sleep for loop_time
+#         when it is empty. Latency is up to loop_time, and an idle
+#         component wakes up 1 / loop_time times per second.
+# poll  - block in a zmq.Poller on the subscriber and any hardware file
+#         descriptors. An idle component does not wake up at all.
+RECEIVE_MODES = ('sleep', 'poll')
+
+# A pass of the receive loop processes at most this many messages, so
+# that receive_idle runs even while messages arrive continuously.
+MAX_PASS_MESSAGES = 1000
+
+# A component announces on READY_TOPIC once its sockets and hardware
+# are up, and announces again whenever a message is published on
+# QUERY_READY_TOPIC, so that a launcher that missed the first
+# announcement can ask for it.
+READY_TOPIC = 'component_ready'
+QUERY_READY_TOPIC = 'query_ready'
+QUERY_READY_BYTES = QUERY_READY_TOPIC.encode()
+
+
+def process_start_time():
+    """
+    Find when this process was started, so that boot phases include
+    the interpreter start up and the imports.
+
+    :return: the time.monotonic() of the process start, or of now
+             where /proc is not available
+    """
+    try:
+        with open('/proc/self/stat') as stat:
+            # the fields that follow the command name - starttime is 22nd
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - \
+            start_ticks / os.sysconf('SC_CLK_TCK')
+        return time.monotonic() - age
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic()
+
+
+# boot phases are reported in seconds from the process start
+PROCESS_START = process_start_time()
+IMPORTED = time.monotonic()
+
+
+class QueueDepthMonitor(object):
+    """
+    Counts the messages that were waiting in the subscriber socket
+    each time the receive loop found messages to process.
+
+    The counts are kept in a log2 histogram. Bucket n counts bursts
+    of 2**(n-1) up to 2**n - 1 messages.
+    """
+
+    HISTOGRAM_BUCKETS = 16
+
+    def __init__(self):
+        self.histogram = [0] * self.HISTOGRAM_BUCKETS
+        self.bursts = 0
+        self.messages = 0
+        self.max_depth = 0
+
+    def record(self, depth):
+        """
+        :param depth: number of messages processed in one pass
+        """
+        self.bursts += 1
+        self.messages += depth
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.histogram[min(depth.bit_length(),
+                           self.HISTOGRAM_BUCKETS - 1)] += 1
+
+    def report(self):
+        """
+        :return: the statistics as a dictionary
+        """
+        return {'bursts': self.bursts, 'messages': self.messages,
+                'max_depth': self.max_depth,
+                'histogram': list(self.histogram)}
+
+
+class SocketOptions(object):
+    """
+    A mixin for Banyan components that applies a socket option profile,
+    provides the sleep and poll receive loops, observes the subscriber
+    queue depth and announces when the component is ready.
+
+    List it before BanyanBase or GatewayBase in the base classes, and
+    call apply_socket_profile after the parent is initialized. Call
+    announce_ready once the hardware is up, before the receive loop.
+    """
+
+    def apply_socket_profile(self, profile, receive_mode='sleep'):
+        """
+        Apply a socket option profile to the publisher and subscriber.
+
+        BanyanBase connects the sockets when it is initialized, and
+        most options only take effect for new connections, so the
+        sockets are reconnected to the backplane. Subscriptions are kept.
+
+        :param profile: a key of SOCKET_PROFILES
+        :param receive_mode: one of RECEIVE_MODES
+        """
+        if profile not in SOCKET_PROFILES:
+            raise RuntimeError('Unknown socket profile: ', profile)
+        if receive_mode not in RECEIVE_MODES:
+            raise RuntimeError('Unknown receive mode: ', receive_mode)
+
+        self.socket_profile = profile
+        self.receive_mode = receive_mode
+        self.queue_depths = QueueDepthMonitor()
+
+        # [phase, seconds from the process start] for each boot phase
+        self.boot_phases = [['imports', IMPORTED - PROCESS_START]]
+
+        # the readiness announcement, once the component is ready
+        self.ready_payload = None
+
+        # hardware file descriptors watched by the poll receive loop,
+        # and the functions that handle them
+        self.poll_handlers = {}
+        self.receive_poller = None
+
+        options = SOCKET_PROFILES[profile]
+        if not options:
+            self.mark_phase('sockets')
+            return
+
+        for sock, port in ((self.subscriber, self.subscriber_port),
+                           (self.publisher, self.publisher_port)):
+            for option, value in options.items():
+                sock.setsockopt(option, value)
+            connect_string = 'tcp://' + self.back_plane_ip_address + ':' + port
+            sock.disconnect(connect_string)
+            sock.connect(connect_string)
+
+        # allow the reconnection to the backplane to complete
+        time.sleep(self.connect_time)
+        self.mark_phase('sockets')
+
+    def create_publisher(self):
+        """
+        Create an additional publisher socket with the socket profile
+        options, for a thread that publishes while another thread owns
+        self.publisher. zmq sockets must not be shared between threads.
+
+        :return: the connected publisher socket
+        """
+        publisher = self.my_context.socket(zmq.PUB)
+        for option, value in SOCKET_PROFILES[self.socket_profile].items():
+            publisher.setsockopt(option, value)
+        publisher.connect('tcp://' + self.back_plane_ip_address + ':' +
+                          self.publisher_port)
+        # allow the connection to the backplane to complete
+        time.sleep(self.connect_time)
+        return publisher
+
+    def mark_phase(self, phase):
+        """
+        Record the end of a boot phase.
+        :param phase: phase name
+        """
+        self.boot_phases.append([phase, time.monotonic() - PROCESS_START])
+
+    def announce_ready(self, component, **details):
+        """
+        Announce that the component is ready, and answer
+        readiness queries from now on.
+
+        Typical message: component_ready {'component': 'CrickitGateway',
+            'pid': 1234, 'phases': [['imports', 1.9], ['sockets', 2.3],
+            ['hardware', 2.6], ['ready', 2.6]],
+            'report_topic': 'report_from_hardware'}
+
+        :param component: process name, as given with -n
+        :param details: other items of the announcement
+        """
+        self.mark_phase('ready')
+        self.ready_payload = {'component': component, 'pid': os.getpid(),
+                              'phases': self.boot_phases}
+        self.ready_payload.update(details)
+        self.set_subscriber_topic(QUERY_READY_TOPIC)
+        self.publish_ready()
+
+    def publish_ready(self):
+        """
+        Publish the readiness announcement. A component whose
+        publisher is owned by another thread overrides this.
+        """
+        self.publish_payload(self.ready_payload, READY_TOPIC)
+
+    def receive_messages(self):
+        """
+        Process the messages waiting in the subscriber socket, up to
+        MAX_PASS_MESSAGES. The number processed is recorded in the
+        queue depth monitor.
+
+        :return: the number of messages processed
+        """
+        depth = 0
+        while depth < MAX_PASS_MESSAGES:
+            try:
+                data = self.subscriber.recv_multipart(zmq.NOBLOCK)
+            # if no messages are available, zmq throws this exception
+            except zmq.error.Again:
+                break
+            depth += 1
+            # readiness queries are answered here, not by the component
+            if data[0] == QUERY_READY_BYTES:
+                if self.ready_payload is not None:
+                    self.publish_ready()
+                continue
+            self.incoming_message_processing(data[0].decode(),
+                                             msgpack.unpackb(data[1],
+                                                             raw=False))
+
+        if depth:
+            self.queue_depths.record(depth)
+        return depth
+
+    def add_poll_handler(self, fd, handler):
+        """
+        Have the poll receive loop call a handler when a hardware file
+        descriptor is readable.
+
+        :param fd: file descriptor, or an object with a fileno method
+        :param handler: function called without arguments
+        """
+        self.poll_handlers[fd] = handler
+
+    def remove_poll_handler(self, fd):
+        """
+        Stop watching a hardware file descriptor, for example
+        when its connection has closed.
+
+        :param fd: file descriptor given to add_poll_handler
+        """
+        if self.poll_handlers.pop(fd, None) and self.receive_poller:
+            self.receive_poller.unregister(fd)
+
+    def receive_idle(self):
+        """
+        Called after each pass of the receive loop over the
+        waiting messages.
+        """
+        pass
+
+    def receive_loop(self):
+        """
+        This is the receive loop for Banyan messages.
+        The queue depth statistics are printed on exit.
+        """
+        try:
+            if self.receive_mode == 'poll':
+                self.poll_receive_loop()
+            else:
+                self.sleep_receive_loop()
+        except KeyboardInterrupt:
+            self.print_queue_depths()
+            self.clean_up()
+            raise KeyboardInterrupt
+
+    def sleep_receive_loop(self):
+        """
+        Sleep for loop_time whenever the subscriber is empty.
+        """
+        while True:
+            received = self.receive_messages()
+            self.receive_idle()
+            if not received:
+                time.sleep(self.loop_time)
+
+    def poll_receive_loop(self):
+        """
+        Block until the subscriber or a hardware file descriptor
+        is readable.
+        """
+        self.receive_poller = zmq.Poller()
+        self.receive_poller.register(self.subscriber, zmq.POLLIN)
+        for fd in self.poll_handlers:
+            self.receive_poller.register(fd, zmq.POLLIN)
+
+        while True:
+            for source, event in self.receive_poller.poll():
+                if source is self.subscriber:
+                    self.receive_messages()
+                    self.receive_idle()
+                elif source in self.poll_handlers:
+                    # a handler may have been removed in this pass
+                    self.poll_handlers[source]()
+
+    def print_queue_depths(self):
+        """
+        Print the subscriber queue depth statistics.
+        """
+        print('Socket profile: ', self.socket_profile)
+        print('Subscriber queue depths: ', self.queue_depths.report())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+"""
+crickit_gateway_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+import msgpack
+
+# the gateway and its backends live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from crickit_gateway import CrickitGateway
+# noinspection PyUnresolvedReferences
+from i2c_scheduler import I2cBusScheduler
+
+
+class CrickitGatewayBenchmark(CrickitGateway):
+    """
+    This class measures the message dispatch throughput of the
+    CrickitGateway using the simulated Crickit backend.
+
+    No backplane is needed. Instead of receiving messages from the
+    backplane, the receive loop is replaced with a loop that feeds
+    prepared messages through the gateway as fast as possible.
+
+    usage: crickit_gateway_benchmark.py [-h] [-b BACK_PLANE_IP_ADDRESS]
+                                    [-c COALESCE] [-i I2C_LATENCY]
+                                    [-m NUMBER_OF_MESSAGES] [-u BURST_SIZE]
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        self.number_of_messages = kwargs['number_of_messages']
+        self.burst_size = kwargs['burst_size']
+
+        super(CrickitGatewayBenchmark, self).__init__('to_hardware', **kwargs)
+
+    def build_messages(self):
+        """
+        Build a set of packed messages that resemble slider drags
+        on the drives, servos and dc motors pages of the crickit gui.
+
+        :return: a list of (topic, packed payload)
+        """
+        messages = []
+        for count in range(self.number_of_messages):
+            step = count % 100
+            kind = count % 3
+            if kind == 0:
+                payload = {'command': 'pwm_write', 'pin': count % 4,
+                           'value': step / 100}
+            elif kind == 1:
+                payload = {'command': 'servo_position', 'pin': count % 4,
+                           'position': step}
+            else:
+                payload = {'command': 'dc_motor_forward', 'motor': count % 2 + 1,
+                           'speed': step / 100}
+            messages.append((b'to_hardware', msgpack.packb(payload,
+                                                           use_bin_type=True)))
+        return messages
+
+    def receive_loop(self):
+        """
+        Feed the prepared messages through the gateway in bursts
+        and report the dispatch throughput.
+        """
+        messages = self.build_messages()
+        transactions = self.backend.transactions
+
+        start = time.perf_counter()
+        for index, data in enumerate(messages):
+            self.incoming_message_processing(data[0].decode(),
+                                             msgpack.unpackb(data[1],
+                                                             raw=False))
+            # an empty queue ends a burst
+            if (index + 1) % self.burst_size == 0:
+                self.flush_setpoints()
+        self.flush_setpoints()
+
+        # wait for the bus worker to perform all of the queued writes
+        end = self.bus.call(I2cBusScheduler.POLL, time.perf_counter)
+        elapsed = end - start
+
+        transactions = self.backend.transactions - transactions
+        print('Messages dispatched : ', len(messages))
+        print('Coalescing          : ', self.coalesce)
+        print('Burst size          : ', self.burst_size)
+        print('I2C transactions    : ', transactions)
+        print('Superseded writes   : ', self.bus.superseded)
+        print('Elapsed seconds     :  %.4f' % elapsed)
+        print('Messages per second :  %.1f' % (len(messages) / elapsed))
+        for rate in self.get_write_rates():
+            print('Pin %2d writes: %6d skipped: %6d' % (rate[0], rate[1],
+                                                          rate[2]))
+        for name, histogram in self.bus.get_latency_histograms().items():
+            print('Queue latency (log2 usec) %-7s: ' % name, histogram)
+
+
+def crickit_gateway_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address used by Back Plane - "
+                             "a running backplane is not required")
+    parser.add_argument("-c", dest="coalesce", default="true",
+                        help="Write only the latest setpoints: true or false")
+    parser.add_argument("-i", dest="i2c_latency", default="0.0",
+                        help="Simulated I2C transaction time in seconds")
+    parser.add_argument("-m", dest="number_of_messages", default="100000",
+                        help="Number of messages to dispatch")
+    parser.add_argument("-u", dest="burst_size", default="10",
+                        help="Number of messages received before "
+                             "the queue is empty")
+
+    args = parser.parse_args()
+
+    kw_options = {
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': '43124',
+        'subscriber_port': '43125',
+        'process_name': 'CrickitGatewayBenchmark',
+        'loop_time': .1,
+        'report_topic': 'report_from_hardware',
+        'board_type': None,
+        'coalesce': args.coalesce.lower() == 'true',
+        'backend': 'simulated',
+        'i2c_latency': float(args.i2c_latency),
+        'input_script': None,
+        'numeric_timestamps': False,
+        'batch_reports': False,
+        'socket_profile': 'default',
+        'receive_mode': 'sleep',
+        'number_of_messages': int(args.number_of_messages),
+        'burst_size': int(args.burst_size)}
+
+    app = CrickitGatewayBenchmark(**kw_options)
+    app.clean_up()
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    crickit_gateway_benchmark()
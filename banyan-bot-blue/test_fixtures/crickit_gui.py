@@ -22,6 +22,7 @@
 """
 
 import argparse
+import os
 import signal
 import sys
 from functools import partial
@@ -33,10 +34,18 @@ from tkinter import ttk
 # noinspection PyCompatibility
 from tkinter.ttk import Notebook, Frame, Label, Combobox, Button
 
-import msgpack
-import zmq
 from python_banyan.banyan_base import BanyanBase
 
+from gui_receiver import GuiReceiver
+from publish_throttle import PublishThrottle
+
+# the report helpers live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from report_batch import unpack_input_batch
+
 
 # noinspection PyCompatibility
 
@@ -56,7 +65,7 @@ class Spinbox(ttk.Entry):
 
 
 # noinspection PyPep8
-class CrickitGui(BanyanBase):
+class CrickitGui(GuiReceiver, BanyanBase):
     """
     The Crickit For Raspberry Pi Demo Station GUI
     """
@@ -75,7 +84,16 @@ class CrickitGui(BanyanBase):
 
         self.set_subscriber_topic('report_from_hardware')
 
+        # the [pin, mode] entries the gateway is known to have, so that
+        # a set_mode command is only sent when the mode is not set yet
+        self.pin_modes = set()
+        self.publish_payload({'command': 'query_modes'}, 'to_hardware')
+
         self.main = Tk()
+
+        # slider drags publish through throttles
+        self.throttle_interval = kwargs['throttle_interval']
+        self.throttles = []
         self.main.title('Demo Station For Raspberry Pi Crickit')
 
         # gives weight to the cells in the grid
@@ -138,7 +156,7 @@ class CrickitGui(BanyanBase):
         l.config(font="Helvetica 8 ")
         l.grid(row=48, column=0, padx=[505, 0])
 
-        self.main.after(5, self.get_message)
+        self.start_receiving(kwargs['receive_mode'])
 
         try:
             self.main.mainloop()
@@ -149,34 +167,6 @@ class CrickitGui(BanyanBase):
         print(self.nb.tab(self.nb.select(), "text"))
         print(self.nb.index(self.nb.select()))
 
-    def get_message(self):
-        """
-        This method is called from the tkevent loop "after" method.
-        It will poll for new zeromq messages within the tkinter event loop.
-        """
-        try:
-            data = self.subscriber.recv_multipart(zmq.NOBLOCK)
-            self.incoming_message_processing(data[0].decode(),
-                                             msgpack.unpackb(data[1],
-                                                             raw=False))
-            self.main.after(1, self.get_message)
-
-        except zmq.error.Again:
-            try:
-                self.main.after(1, self.get_message)
-            except KeyboardInterrupt:
-                self.main.destroy()
-                self.publisher.close()
-                self.subscriber.close()
-                self.context.term()
-                sys.exit(0)
-        except KeyboardInterrupt:
-            self.main.destroy()
-            self.publisher.close()
-            self.subscriber.close()
-            self.context.term()
-            sys.exit(0)
-
     def incoming_message_processing(self, topic, payload):
         """
         This method processes the incoming pin state change
@@ -188,10 +178,38 @@ class CrickitGui(BanyanBase):
         Typical report: {'report': 'digital_input', 'pin': pin,
                        'value': level, 'timestamp': time.time()}
         """
-        # if the pin currently input active, process the state change
-        pin = payload['pin']
-        value = payload['value']
-        timestamp = payload['timestamp']
+        # a gateway in batch mode reports several inputs at once
+        if payload['report'] == 'input_batch':
+            for report in unpack_input_batch(payload):
+                self.incoming_message_processing(topic, report)
+            return
+
+        if payload['report'] == 'pin_modes':
+            self.pin_modes = {tuple(mode) for mode in payload['modes']}
+            return
+
+        # a rejected set_mode leaves the cached modes out of date,
+        # so get them again
+        if payload['report'] == 'error':
+            print('Gateway error: ', payload['message'])
+            self.publish_payload({'command': 'query_modes'}, 'to_hardware')
+            return
+
+        if 'pin' not in payload:
+            return
+
+        # the widgets show the latest value, updated once per tick
+        self.queue_input(payload['pin'], payload['value'],
+                         payload['timestamp'])
+
+    def display_input(self, key, value, timestamp):
+        """
+        Show the state of an input pin.
+        :param key: pin number
+        :param value: input value
+        :param timestamp: formatted time stamp
+        """
+        pin = key
         if 0 <= pin < 8:
             self.signal_inputs.set_input_value(pin, value)
             self.signal_inputs.set_time_stamp_value(pin, timestamp)
@@ -200,10 +218,43 @@ class CrickitGui(BanyanBase):
             self.touch_inputs.set_input_value(pin - 8, value)
             self.touch_inputs.set_time_stamp_value(pin - 8, timestamp)
 
+    def set_pin_mode(self, pin, mode):
+        """
+        Send a set_mode command unless the gateway already has the mode.
+        :param pin: pin number used in the set_mode command
+        :param mode: mode name - the command without the set_mode_ prefix
+        """
+        if (pin, mode) in self.pin_modes:
+            return
+        self.pin_modes.add((pin, mode))
+        payload = {'command': 'set_mode_' + mode, 'pin': pin}
+        self.publish_payload(payload, 'to_hardware')
+
+    def add_throttle(self, function):
+        """
+        Create a throttle for a control
+        :param function: function that publishes the control's value
+        :return: a PublishThrottle to use as the control's command
+        """
+        throttle = PublishThrottle(self.main, self.throttle_interval, function)
+        self.throttles.append(throttle)
+        return throttle
+
+    def print_throttle_counts(self):
+        """
+        Print how many control changes were published and suppressed.
+        """
+        published = sum(throttle.published for throttle in self.throttles)
+        suppressed = sum(throttle.suppressed for throttle in self.throttles)
+        print('Control changes published: %d  suppressed: %d' %
+              (published, suppressed))
+
     def on_closing(self):
         """
         Destroy the window
         """
+        self.stop_receiving()
+        self.print_throttle_counts()
         self.clean_up()
         self.main.destroy()
 
@@ -300,7 +351,7 @@ class SignalInputs:
 
             # create a read only entry field for each time stamp
             time_stamp = Entry(self.signal_inputs_frame, state='readonly',
-                               width=20)
+                               width=24)
             time_stamp.configure({'readonlybackground': 'white'})
             self.time_stamps.append(time_stamp)
 
@@ -313,7 +364,6 @@ class SignalInputs:
                                           columnspan=49, padx=25, pady=[10, 0])
 
     def mode_selection(self, event):
-        payload = {}
         # control_index = selection_index = None
         if event.widget in self.modes_controls:
             if event.widget.get() in self.selections:
@@ -322,15 +372,12 @@ class SignalInputs:
                 # 'Select Mode'
                 selection_index = self.selections.index(event.widget.get()) - 1
                 if selection_index == self.DIGITAL_INPUT:
-                    payload = {'command': 'set_mode_digital_input', 'pin': pin}
+                    mode = 'digital_input'
                 elif selection_index == self.DIGITAL_PULL_UP:
-                    payload = {'command': 'set_mode_digital_input_pullup',
-                               'pin': pin}
+                    mode = 'digital_input_pullup'
                 else:
-                    payload = {'command': 'set_mode_analog_input', 'pin': pin}
-
-            topic = 'to_hardware'
-            self.caller.publish_payload(payload, topic)
+                    mode = 'analog_input'
+                self.caller.set_pin_mode(pin, mode)
 
     def set_input_value(self, channel, value):
         """
@@ -427,9 +474,7 @@ class SignalOutputs:
                 # need to decrease by 1
                 value = self.selections.index(event.widget.get()) - 1
                 topic = 'to_hardware'
-                payload = {'command': 'set_mode_digital_output',
-                           'pin': pin}
-                self.caller.publish_payload(payload, topic)
+                self.caller.set_pin_mode(pin, 'digital_output')
                 payload = {'command': 'digital_write', 'pin': pin, 'value': value}
                 self.caller.publish_payload(payload, topic)
 
@@ -500,7 +545,7 @@ class TouchInputs:
 
             # create a read only entry field for each time stamp
             time_stamp = Entry(self.touch_inputs_frame, state='readonly',
-                               width=20)
+                               width=24)
             time_stamp.configure({'readonlybackground': 'white'})
             self.time_stamps.append(time_stamp)
 
@@ -549,10 +594,8 @@ class TouchInputs:
         Enable digital input for virtual pins 8 through 11
         :return:
         """
-        topic = 'to_hardware'
         for pin in range(8, 12):
-            payload = {'command': 'set_mode_digital_input', 'pin': pin}
-            self.caller.publish_payload(payload, topic)
+            self.caller.set_pin_mode(pin, 'digital_input')
 
 
 class DriveOutputs:
@@ -593,10 +636,12 @@ class DriveOutputs:
 
             self.drive_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.set_drive_value, x))
             drive_scale = Scale(self.drive_outputs_frame,
                                 variable=self.drive_values[x],
                                 orient='horizontal', troughcolor='white',
-                                resolution=0.01, from_=0.00, to=1.00)
+                                resolution=0.01, from_=0.00, to=1.00,
+                                command=throttle)
             self.drive_scales.append(drive_scale)
 
             drive_scale.grid(row=x, column=1)
@@ -617,8 +662,7 @@ class DriveOutputs:
         value = self.drive_scales[index].get()
         topic = 'to_hardware'
 
-        payload = {'command': 'set_mode_pwm', 'pin': pin}
-        self.caller.publish_payload(payload, topic)
+        self.caller.set_pin_mode(pin, 'pwm')
 
         payload = {'command': 'pwm_write', 'pin': pin, 'value': value}
         self.caller.publish_payload(payload, topic)
@@ -649,7 +693,9 @@ class DcMotors:
         # an array of the values for the scale widgets
         self.motor_values = []
 
-        self.directions = []
+        # the direction of each motor, set by its buttons, so that
+        # dragging the speed slider of a running motor changes its speed
+        self.directions = [None, None]
 
         for x in range(0, 2):
             # set the mode label with an associated signal channel number
@@ -659,10 +705,12 @@ class DcMotors:
 
             self.motor_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.change_speed, x))
             motor_scale = Scale(self.motors_frame,
                                 variable=self.motor_values[x],
                                 orient='horizontal', troughcolor='white',
-                                resolution=0.01, from_=0.00, to=1.00)
+                                resolution=0.01, from_=0.00, to=1.00,
+                                command=throttle)
             self.motor_scales.append(motor_scale)
 
             motor_scale.grid(row=x, column=1)
@@ -683,7 +731,14 @@ class DcMotors:
                                columnspan=49, padx=125,
                                pady=[50, 0])
 
+    def change_speed(self, index):
+        if self.directions[index] == 'forward':
+            self.move_forward(index)
+        elif self.directions[index] == 'reverse':
+            self.move_reverse(index)
+
     def move_forward(self, index):
+        self.directions[index] = 'forward'
         speed = self.motor_scales[index].get()
         topic = 'to_hardware'
 
@@ -692,6 +747,7 @@ class DcMotors:
         self.caller.publish_payload(payload, topic)
 
     def move_reverse(self, index):
+        self.directions[index] = 'reverse'
         speed = self.motor_scales[index].get()
         topic = 'to_hardware'
 
@@ -731,10 +787,11 @@ class Servos:
 
             self.servo_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.set_servo_value, x))
             servo_scale = Scale(self.servos_frame,
                                 variable=self.servo_values[x],
                                 orient='horizontal', troughcolor='white',
-                                from_=0, to=180)
+                                from_=0, to=180, command=throttle)
             self.servo_scales.append(servo_scale)
 
             servo_scale.grid(row=x, column=1)
@@ -754,8 +811,7 @@ class Servos:
 
         value = self.servo_scales[index].get()
         topic = 'to_hardware'
-        payload = {'command': 'set_mode_servo', 'pin': index}
-        self.caller.publish_payload(payload, topic)
+        self.caller.set_pin_mode(index, 'servo')
 
         payload = {'command': 'servo_position', "pin": index, 'position': value}
         self.caller.publish_payload(payload, topic)
@@ -1038,6 +1094,12 @@ def crickit_demo():
                         help="Publisher IP port")
     parser.add_argument("-s", dest="subscriber_port", default='43125',
                         help="Subscriber IP port")
+    parser.add_argument("-t", dest="throttle_interval", default="50",
+                        help="Minimum milliseconds between messages "
+                             "while a slider is dragged")
+    parser.add_argument("-y", dest="receive_mode", default="poll",
+                        help="Receive messages: poll - wake when a message "
+                             "arrives or sleep - check every frame")
 
     args = parser.parse_args()
 
@@ -1046,7 +1108,9 @@ def crickit_demo():
     kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
                   'publisher_port': args.publisher_port,
                   'subscriber_port': args.subscriber_port,
-                  'process_name': args.process_name, }
+                  'process_name': args.process_name,
+                  'receive_mode': args.receive_mode,
+                  'throttle_interval': int(args.throttle_interval)}
 
     # replace with the name of your class
     app = CrickitGui(**kw_options)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+exp_pro_command_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from functools import partial
+
+from python_banyan.gateway_base import GatewayBase
+
+# the gateway and its backends live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from exp_pro_gateway import ExpProGateway
+
+
+class ExpProCommandBenchmark(ExpProGateway):
+    """
+    This class compares the per message cost of the ExpProGateway
+    dc motor command handling, using the simulated Explorer HAT backend:
+
+    legacy  - additional_banyan_messages with the chained string compares
+              used before the dispatch table
+    table   - dc_motor_forward and dc_motor_reverse through the dispatch table
+    combined - one dc_motors_set message for both motors
+
+    No backplane is needed. The receive loop is replaced with a loop that
+    feeds prepared messages through the gateway.
+
+    usage: exp_pro_command_benchmark.py [-h] [-b BACK_PLANE_IP_ADDRESS]
+                                    [-m NUMBER_OF_MESSAGES]
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        self.number_of_messages = kwargs['number_of_messages']
+
+        super(ExpProCommandBenchmark, self).__init__('to_hardware', **kwargs)
+
+    def legacy_motor_command(self, topic, payload):
+        """
+        The dc motor handling as it was before the dispatch table.
+        :param topic: message topic
+        :param payload: message payload
+        """
+        if payload['command'] == 'dc_motor_forward':
+            speed = payload['speed'] * 100
+            if payload['motor'] == 1:
+                self.backend.motor_speed(1, speed)
+            elif payload['motor'] == 2:
+                self.backend.motor_speed(2, speed)
+            else:
+                raise RuntimeError('unknown motor number')
+
+        elif payload['command'] == 'dc_motor_reverse':
+            speed = payload['speed'] * 100
+            if payload['motor'] == 1:
+                self.backend.motor_speed(1, speed)
+            elif payload['motor'] == 2:
+                self.backend.motor_speed(2, speed)
+            else:
+                raise RuntimeError('unknown motor')
+
+        else:
+            raise RuntimeError('Unknown motor command')
+
+    def build_messages(self):
+        """
+        Build motor commands that resemble robot control traffic.
+
+        :return: a list of single motor messages and a list of
+                 combined messages that set the same speeds
+        """
+        single = []
+        combined = []
+        for count in range(0, self.number_of_messages, 2):
+            speed = (count % 200 - 100) / 100
+            if speed < 0:
+                command = 'dc_motor_reverse'
+            else:
+                command = 'dc_motor_forward'
+            single.append({'command': command, 'motor': 1, 'speed': speed})
+            single.append({'command': command, 'motor': 2, 'speed': speed})
+            combined.append({'command': 'dc_motors_set',
+                             'speeds': [speed, speed]})
+        return single, combined
+
+    def time_messages(self, handler, messages, repeat=5):
+        """
+        :param handler: function called with (topic, payload)
+        :param messages: list of payloads
+        :param repeat: number of times the messages are timed
+        :return: best elapsed seconds
+        """
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for payload in messages:
+                handler('to_hardware', payload)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
+
+    def receive_loop(self):
+        """
+        Time each command path and report the cost per motor update.
+        """
+        single, combined = self.build_messages()
+        updates = len(single)
+
+        # all paths are timed from incoming_message_processing, so that
+        # the cost of reaching the handler is included. The legacy path
+        # uses the GatewayBase dispatch, which passes unknown commands
+        # to additional_banyan_messages.
+        table_handlers = {}
+        for command in ('dc_motor_forward', 'dc_motor_reverse'):
+            table_handlers[command] = self.command_dictionary.pop(command)
+        additional_banyan_messages = self.additional_banyan_messages
+        self.additional_banyan_messages = self.legacy_motor_command
+        legacy = self.time_messages(
+            partial(GatewayBase.incoming_message_processing, self), single)
+
+        self.command_dictionary.update(table_handlers)
+        self.additional_banyan_messages = additional_banyan_messages
+        table = self.time_messages(self.incoming_message_processing, single)
+
+        combined_time = self.time_messages(self.incoming_message_processing,
+                                           combined)
+
+        print('Motor updates : ', updates)
+        for name, elapsed, messages in (('legacy', legacy, len(single)),
+                                        ('table', table, len(single)),
+                                        ('combined', combined_time,
+                                         len(combined))):
+            print('%-8s: %8d messages  %6.3f usec per motor update' %
+                  (name, messages, elapsed / updates * 1000000))
+
+
+def exp_pro_command_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address used by Back Plane - "
+                             "a running backplane is not required")
+    parser.add_argument("-m", dest="number_of_messages", default="100000",
+                        help="Number of motor updates for each path")
+
+    args = parser.parse_args()
+
+    kw_options = {
+        'enable_analog_input': False,
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': '43124',
+        'subscriber_port': '43125',
+        'process_name': 'ExpProCommandBenchmark',
+        'report_topic': 'report_from_hardware',
+        'board_type': None,
+        'threshold': '0.3, 0.3, 0.3, 0.3',
+        'analog_rate': '0, 0, 0, 0',
+        'decimation': '1, 1, 1, 1',
+        'analog_budget': 0.0,
+        'numeric_timestamps': False,
+        'backend': 'simulated',
+        'event_rate': 1.0,
+        'input_script': None,
+        'fade_time': 0.0,
+        'edge_capture': False,
+        'edge_interval': .05,
+        'bouncetime': 60,
+        'socket_profile': 'default',
+        'receive_mode': 'sleep',
+        'number_of_messages': int(args.number_of_messages)}
+
+    app = ExpProCommandBenchmark(**kw_options)
+    app.clean_up()
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    exp_pro_command_benchmark()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+exp_pro_gateway_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+# the gateway and its backends live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from exp_pro_gateway import ExpProGateway
+
+
+class ExpProGatewayBenchmark(ExpProGateway):
+    """
+    This class measures the event throughput of the ExpProGateway and
+    the latency from a hardware callback to the publication of its
+    report, using the simulated Explorer HAT backend.
+
+    No backplane is needed. Reports are counted instead of being
+    published, and the receive loop is replaced with a timed wait.
+
+    usage: exp_pro_gateway_benchmark.py [-h] [-a ENABLE_ANALOG_INPUT]
+                                    [-b BACK_PLANE_IP_ADDRESS] [-i EVENT_RATE]
+                                    [-w DURATION]
+    """
+
+    # histogram bucket n counts latencies of 2**(n-1) up to 2**n microseconds
+    HISTOGRAM_BUCKETS = 24
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        self.duration = kwargs['duration']
+
+        self.reports = 0
+        self.latencies = []
+        self.report_lock = threading.Lock()
+
+        super(ExpProGatewayBenchmark, self).__init__('to_hardware', **kwargs)
+
+    def publish_payload(self, payload, topic=''):
+        """
+        Record the report latency instead of publishing.
+        Messages on other topics, such as the readiness
+        announcement, are published.
+        :param payload: report payload
+        :param topic: report topic
+        """
+        if topic != self.report_topic:
+            super(ExpProGatewayBenchmark, self).publish_payload(payload, topic)
+            return
+        latency = time.monotonic_ns() - payload['monotonic_ns']
+        with self.report_lock:
+            self.reports += 1
+            self.latencies.append(latency)
+
+    def receive_loop(self):
+        """
+        Let the simulated backend generate events for the benchmark
+        duration and report the results.
+        """
+        events = self.backend.events
+        start = time.perf_counter()
+        time.sleep(self.duration)
+        elapsed = time.perf_counter() - start
+
+        events = self.backend.events - events
+        with self.report_lock:
+            reports = self.reports
+            latencies = sorted(self.latencies)
+
+        histogram = [0] * self.HISTOGRAM_BUCKETS
+        for latency in latencies:
+            histogram[min((latency // 1000).bit_length(),
+                          self.HISTOGRAM_BUCKETS - 1)] += 1
+
+        print('Callbacks            : ', events)
+        print('Reports published    : ', reports)
+        print('Elapsed seconds      :  %.4f' % elapsed)
+        print('Callbacks per second :  %.1f' % (events / elapsed))
+        print('Reports per second   :  %.1f' % (reports / elapsed))
+        if latencies:
+            for percentile in (50, 90, 99, 100):
+                index = min(len(latencies) * percentile // 100,
+                            len(latencies) - 1)
+                print('Latency p%-3d (usec)  :  %.1f' %
+                      (percentile, latencies[index] / 1000))
+        print('Latency (log2 usec)  : ', histogram)
+
+
+def exp_pro_gateway_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="enable_analog_input", default="true",
+                        help="Set to True to enable analog input")
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address used by Back Plane - "
+                             "a running backplane is not required")
+    parser.add_argument("-i", dest="event_rate", default="1000.0",
+                        help="Simulated events per second for each "
+                             "type of input")
+    parser.add_argument("-w", dest="duration", default="5.0",
+                        help="Benchmark duration in seconds")
+
+    args = parser.parse_args()
+
+    kw_options = {
+        'enable_analog_input': args.enable_analog_input.lower() == 'true',
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': '43124',
+        'subscriber_port': '43125',
+        'process_name': 'ExpProGatewayBenchmark',
+        'report_topic': 'report_from_hardware',
+        'board_type': None,
+        'threshold': '0.3, 0.3, 0.3, 0.3',
+        'analog_rate': '0, 0, 0, 0',
+        'decimation': '1, 1, 1, 1',
+        'analog_budget': 0.0,
+        'numeric_timestamps': True,
+        'backend': 'simulated',
+        'event_rate': float(args.event_rate),
+        'input_script': None,
+        'fade_time': 0.0,
+        'edge_capture': False,
+        'edge_interval': .05,
+        'bouncetime': 60,
+        'socket_profile': 'default',
+        'receive_mode': 'sleep',
+        'duration': float(args.duration)}
+
+    app = ExpProGatewayBenchmark(**kw_options)
+    app.clean_up()
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    exp_pro_gateway_benchmark()
@@ -22,6 +22,7 @@
 """
 
 import argparse
+import os
 import signal
 import sys
 from functools import partial
@@ -33,11 +34,18 @@ from tkinter import ttk
 # noinspection PyCompatibility
 from tkinter.ttk import Notebook, Frame, Label, Combobox, Button
 
-import msgpack
-import zmq
-
 from python_banyan.banyan_base import BanyanBase
 
+from gui_receiver import GuiReceiver
+from publish_throttle import PublishThrottle
+
+# the report helpers live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from report_batch import unpack_edge_batch, unpack_input_batch
+
 
 # noinspection PyCompatibility
 
@@ -57,7 +65,7 @@ class Spinbox(ttk.Entry):
 
 
 # noinspection PyPep8
-class ExplorerProGui(BanyanBase):
+class ExplorerProGui(GuiReceiver, BanyanBase):
     """
     The Pimoroni Explorer-Pro For Raspberry Pi Demo Station GUI
     """
@@ -77,6 +85,10 @@ class ExplorerProGui(BanyanBase):
         self.set_subscriber_topic('report_from_hardware')
 
         self.main = Tk()
+
+        # slider drags publish through throttles
+        self.throttle_interval = kwargs['throttle_interval']
+        self.throttles = []
         self.main.title('Demo Station For Explorer-Pro HAT')
 
         # gives weight to the cells in the grid
@@ -142,7 +154,7 @@ class ExplorerProGui(BanyanBase):
         l.config(font="Helvetica 8 ")
         l.grid(row=48, column=0, padx=[505, 0])
 
-        self.main.after(5, self.get_message)
+        self.start_receiving(kwargs['receive_mode'])
 
         try:
             self.main.mainloop()
@@ -153,35 +165,6 @@ class ExplorerProGui(BanyanBase):
         print(self.nb.tab(self.nb.select(), "text"))
         print(self.nb.index(self.nb.select()))
 
-    # noinspection DuplicatedCode
-    def get_message(self):
-        """
-        This method is called from the tkevent loop "after" method.
-        It will poll for new zeromq messages within the tkinter event loop.
-        """
-        try:
-            data = self.subscriber.recv_multipart(zmq.NOBLOCK)
-            self.incoming_message_processing(data[0].decode(),
-                                             msgpack.unpackb(data[1],
-                                                             raw=False))
-            self.main.after(1, self.get_message)
-
-        except zmq.error.Again:
-            try:
-                self.main.after(1, self.get_message)
-            except KeyboardInterrupt:
-                self.main.destroy()
-                self.publisher.close()
-                self.subscriber.close()
-                self.context.term()
-                sys.exit(0)
-        except KeyboardInterrupt:
-            self.main.destroy()
-            self.publisher.close()
-            self.subscriber.close()
-            self.context.term()
-            sys.exit(0)
-
     def incoming_message_processing(self, topic, payload):
         """
         This method processes the incoming pin state change
@@ -193,11 +176,39 @@ class ExplorerProGui(BanyanBase):
         Typical report: {'report': 'digital_input', 'pin': pin,
                        'value': level, 'timestamp': time.time()}
         """
-        # if the pin currently input active, process the state change
-        pin = payload['pin'] - 1
-        value = payload['value']
-        timestamp = payload['timestamp']
-        report_type = payload['report']
+        if payload['report'] == 'error':
+            print('Gateway error: ', payload['message'])
+            return
+
+        # this gui does not set pin modes
+        if payload['report'] == 'pin_modes':
+            return
+
+        # a gateway in batch mode reports several inputs at once
+        if payload['report'] == 'input_batch':
+            for report in unpack_input_batch(payload):
+                self.incoming_message_processing(topic, report)
+            return
+
+        # a gateway in edge capture mode reports the edges of an interval
+        if payload['report'] == 'edge_batch':
+            for report in unpack_edge_batch(payload):
+                self.incoming_message_processing(topic, report)
+            return
+
+        # the widgets show the latest value, updated once per tick
+        self.queue_input((payload['report'], payload['pin']),
+                         payload['value'], payload['timestamp'])
+
+    def display_input(self, key, value, timestamp):
+        """
+        Show the state of an input pin.
+        :param key: [report type, pin number]
+        :param value: input value
+        :param timestamp: formatted time stamp
+        """
+        report_type, pin = key
+        pin -= 1
         if report_type == 'analog_input':
             if 0 <= pin <= 3:
                 self.analog_inputs.set_input_value(pin, value)
@@ -217,12 +228,33 @@ class ExplorerProGui(BanyanBase):
             else:
                 raise RuntimeError('touch pin out of range')
         else:
-            raise RuntimeError('Unknown report type: ', payload['report'])
+            raise RuntimeError('Unknown report type: ', report_type)
+
+    def add_throttle(self, function):
+        """
+        Create a throttle for a control
+        :param function: function that publishes the control's value
+        :return: a PublishThrottle to use as the control's command
+        """
+        throttle = PublishThrottle(self.main, self.throttle_interval, function)
+        self.throttles.append(throttle)
+        return throttle
+
+    def print_throttle_counts(self):
+        """
+        Print how many control changes were published and suppressed.
+        """
+        published = sum(throttle.published for throttle in self.throttles)
+        suppressed = sum(throttle.suppressed for throttle in self.throttles)
+        print('Control changes published: %d  suppressed: %d' %
+              (published, suppressed))
 
     def on_closing(self):
         """
         Destroy the window
         """
+        self.stop_receiving()
+        self.print_throttle_counts()
         self.clean_up()
         self.main.destroy()
 
@@ -285,7 +317,7 @@ class AnalogInputs:
 
             # create a read only entry field for each time stamp
             time_stamp = Entry(self.analog_inputs_frame, state='readonly',
-                               width=20)
+                               width=24)
             time_stamp.configure({'readonlybackground': 'white'})
             self.time_stamps.append(time_stamp)
 
@@ -380,7 +412,7 @@ class DigitalInputs:
 
             # create a read only entry field for each time stamp
             time_stamp = Entry(self.digital_inputs_frame, state='readonly',
-                               width=20)
+                               width=24)
             time_stamp.configure({'readonlybackground': 'white'})
             self.time_stamps.append(time_stamp)
 
@@ -473,7 +505,7 @@ class TouchInputs:
 
             # create a read only entry field for each time stamp
             time_stamp = Entry(self.touch_inputs_frame, state='readonly',
-                               width=20)
+                               width=24)
             time_stamp.configure({'readonlybackground': 'white'})
             self.time_stamps.append(time_stamp)
 
@@ -705,10 +737,12 @@ class PwmOutputs:
 
             self.drive_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.set_drive_value, x))
             drive_scale = Scale(self.pwm_output_frame,
                                 variable=self.drive_values[x],
                                 orient='horizontal', troughcolor='white',
-                                resolution=0.01, from_=0, to=100)
+                                resolution=0.01, from_=0, to=100,
+                                command=throttle)
             self.drive_scales.append(drive_scale)
 
             drive_scale.grid(row=x, column=1)
@@ -773,10 +807,12 @@ class LedPwmOutputs:
 
             self.drive_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.set_drive_value, x))
             drive_scale = Scale(self.led_pwm_output_frame,
                                 variable=self.drive_values[x],
                                 orient='horizontal', troughcolor='white',
-                                resolution=0.01, from_=0, to=100)
+                                resolution=0.01, from_=0, to=100,
+                                command=throttle)
             self.drive_scales.append(drive_scale)
 
             drive_scale.grid(row=x, column=1)
@@ -829,7 +865,9 @@ class DcMotors:
         # an array of the values for the scale widgets
         self.motor_values = []
 
-        self.directions = []
+        # the direction of each motor, set by its buttons, so that
+        # dragging the speed slider of a running motor changes its speed
+        self.directions = [None, None]
 
         for x in range(0, 2):
             # set the mode label with an associated signal channel number
@@ -839,10 +877,12 @@ class DcMotors:
 
             self.motor_values.append(DoubleVar())
 
+            throttle = caller.add_throttle(partial(self.change_speed, x))
             motor_scale = Scale(self.motors_frame,
                                 variable=self.motor_values[x],
                                 orient='horizontal', troughcolor='white',
-                                resolution=0.01, from_=0.00, to=1.00)
+                                resolution=0.01, from_=0.00, to=1.00,
+                                command=throttle)
             self.motor_scales.append(motor_scale)
 
             motor_scale.grid(row=x, column=1)
@@ -863,7 +903,14 @@ class DcMotors:
                                columnspan=49, padx=125,
                                pady=[50, 0])
 
+    def change_speed(self, index):
+        if self.directions[index] == 'forward':
+            self.move_forward(index)
+        elif self.directions[index] == 'reverse':
+            self.move_reverse(index)
+
     def move_forward(self, index):
+        self.directions[index] = 'forward'
         speed = self.motor_scales[index].get()
         topic = 'to_hardware'
 
@@ -872,6 +919,7 @@ class DcMotors:
         self.caller.publish_payload(payload, topic)
 
     def move_reverse(self, index):
+        self.directions[index] = 'reverse'
         speed = self.motor_scales[index].get()
         topic = 'to_hardware'
 
@@ -896,6 +944,12 @@ def explorer_pro_demo():
                         help="Publisher IP port")
     parser.add_argument("-s", dest="subscriber_port", default='43125',
                         help="Subscriber IP port")
+    parser.add_argument("-t", dest="throttle_interval", default="50",
+                        help="Minimum milliseconds between messages "
+                             "while a slider is dragged")
+    parser.add_argument("-y", dest="receive_mode", default="poll",
+                        help="Receive messages: poll - wake when a message "
+                             "arrives or sleep - check every frame")
 
     args = parser.parse_args()
 
@@ -904,7 +958,9 @@ def explorer_pro_demo():
     kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
                   'publisher_port': args.publisher_port,
                   'subscriber_port': args.subscriber_port,
-                  'process_name': args.process_name, }
+                  'process_name': args.process_name,
+                  'receive_mode': args.receive_mode,
+                  'throttle_interval': int(args.throttle_interval)}
 
     # replace with the name of your class
     app = ExplorerProGui(**kw_options)
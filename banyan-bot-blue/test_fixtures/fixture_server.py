@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+
+"""
+fixture_server.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+
+
+class FrameDecoder(object):
+    """
+    Splits a byte stream into frames. A read may hold part of a frame
+    or several frames, so data is buffered until a frame is complete.
+
+    Framing:
+    json    - concatenated json objects or arrays, as sent by
+              bluetooth_gateway.py. Frames are decoded to objects.
+    newline - lines of text. Frames are strings.
+    length  - a 4 byte big endian length followed by that many bytes.
+              Frames are bytes.
+    """
+
+    FRAMINGS = ('json', 'newline', 'length')
+
+    # frames longer than this are discarded as errors
+    MAX_FRAME = 1048576
+
+    def __init__(self, framing):
+        """
+        :param framing: one of FRAMINGS
+        """
+        if framing not in self.FRAMINGS:
+            raise RuntimeError('Unknown framing: ', framing)
+        self.framing = framing
+        self.errors = 0
+
+        if framing == 'json':
+            # a multi byte character may be split between reads
+            self.text_decoder = codecs.getincrementaldecoder('utf-8')(
+                errors='replace')
+            self.buffer = ''
+            # scanner state for the frame at the start of the buffer
+            self.depth = 0
+            self.in_string = False
+            self.escape = False
+            self.scanned = 0
+            # inside a run of characters that are not json
+            self.junk = False
+        else:
+            self.buffer = b''
+
+    def feed(self, data):
+        """
+        :param data: bytes read from the socket
+        :return: a list of the frames completed by the data
+        """
+        if self.framing == 'json':
+            self.buffer += self.text_decoder.decode(data)
+            return self.json_frames()
+
+        self.buffer += data
+        if self.framing == 'newline':
+            return self.newline_frames()
+        return self.length_frames()
+
+    def json_frames(self):
+        """
+        Find complete top level objects by counting brackets outside
+        of strings, then decode them.
+        """
+        frames = []
+        buffer = self.buffer
+        start = 0
+        index = self.scanned
+
+        while index < len(buffer):
+            character = buffer[index]
+            index += 1
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif character == '\\':
+                    self.escape = True
+                elif character == '"':
+                    self.in_string = False
+            elif character == '"':
+                self.in_string = True
+            elif character in '{[':
+                if not self.depth:
+                    start = index - 1
+                    self.junk = False
+                self.depth += 1
+            elif character in '}]':
+                if not self.depth:
+                    self.errors += 1
+                    start = index
+                    continue
+                self.depth -= 1
+                if not self.depth:
+                    try:
+                        frames.append(json.loads(buffer[start:index]))
+                    except ValueError:
+                        self.errors += 1
+                    start = index
+            elif not self.depth:
+                # a run of anything other than white space between
+                # frames is counted as one error
+                if character.isspace():
+                    self.junk = False
+                elif not self.junk:
+                    self.junk = True
+                    self.errors += 1
+                start = index
+
+        if self.depth and index - start > self.MAX_FRAME:
+            self.errors += 1
+            self.depth = 0
+            self.in_string = self.escape = False
+            start = index
+
+        self.buffer = buffer[start:]
+        self.scanned = len(self.buffer)
+        return frames
+
+    def newline_frames(self):
+        """
+        Split complete lines from the buffer.
+        """
+        frames = []
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            frames.append(line.rstrip(b'\r').decode('utf-8', 'replace'))
+        if len(self.buffer) > self.MAX_FRAME:
+            self.errors += 1
+            self.buffer = b''
+        return frames
+
+    def length_frames(self):
+        """
+        Split complete length prefixed frames from the buffer.
+        """
+        frames = []
+        while len(self.buffer) >= 4:
+            length = struct.unpack('>I', self.buffer[:4])[0]
+            if length > self.MAX_FRAME:
+                # the stream can not be resynchronized
+                self.errors += 1
+                self.buffer = b''
+                break
+            if len(self.buffer) < length + 4:
+                break
+            frames.append(self.buffer[4:length + 4])
+            self.buffer = self.buffer[length + 4:]
+        return frames
+
+
+def encode_frame(frame, framing):
+    """
+    :param frame: a decoded frame, or a payload from a script
+    :param framing: one of FrameDecoder.FRAMINGS
+    :return: the frame as bytes to send
+    """
+    if isinstance(frame, bytes):
+        data = frame
+    elif isinstance(frame, str) and framing != 'json':
+        data = frame.encode('utf-8')
+    else:
+        data = json.dumps(frame).encode('utf-8')
+
+    if framing == 'newline':
+        return data + b'\n'
+    if framing == 'length':
+        return struct.pack('>I', len(data)) + data
+    return data
+
+
+class Counters(object):
+    """
+    Frame and byte counts in each direction.
+    """
+
+    def __init__(self):
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.errors = 0
+
+    def copy(self):
+        counters = Counters()
+        counters.__dict__.update(self.__dict__)
+        return counters
+
+
+class FixtureServer(object):
+    """
+    A server that stands in for the remote end of bluetooth_gateway.py.
+
+    Any number of clients may connect. Received frames are counted and
+    may be echoed back or answered from a script. A summary of the
+    traffic is printed every summary_interval seconds instead of
+    printing each frame.
+
+    A script is a json file containing a list of entries:
+
+    {"delay": 0.5, "send": {"command": "f"}}
+        sent to each client, delay seconds after the previous
+        timed entry, starting at connection.
+
+    {"match": {"command": "ping"}, "send": {"report": "pong"}}
+        sent whenever a dictionary frame containing all of the
+        match items is received.
+
+    usage: fixture_server.py [-h] [-a ADDRESS] [-f FRAMING] [-i SUMMARY_INTERVAL]
+                             [-k TRANSPORT] [-o TCP_PORT] [-r REPLY]
+                             [-s SCRIPT] [-u UUID] [-v PRINT_FRAMES]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -a ADDRESS            Address to listen on for the tcp transport
+          -f FRAMING            Frame format: json, newline or length
+          -i SUMMARY_INTERVAL   Seconds between summaries - 0 is only on exit
+          -k TRANSPORT          tcp, or rfcomm for Bluetooth
+          -o TCP_PORT           TCP port for the tcp transport
+          -r REPLY              none or echo
+          -s SCRIPT             json file of scripted sends and replies
+          -u UUID               Bluetooth UUID for the rfcomm transport
+          -v PRINT_FRAMES       true to print every received frame
+
+    """
+
+    def __init__(self, address='0.0.0.0', tcp_port=43130, framing='json',
+                 reply='echo', script=None, summary_interval=5.0,
+                 print_frames=False, transport='tcp',
+                 uuid='e35d6386-1802-414f-b2b9-375c92fa23e0'):
+        """
+        :param address: address to listen on for the tcp transport
+        :param tcp_port: port for the tcp transport
+        :param framing: json, newline or length
+        :param reply: none or echo
+        :param script: json file of scripted sends and replies or None
+        :param summary_interval: seconds between summaries
+        :param print_frames: print every received frame
+        :param transport: tcp or rfcomm
+        :param uuid: service uuid advertised for the rfcomm transport
+        """
+        if framing not in FrameDecoder.FRAMINGS:
+            raise RuntimeError('Unknown framing: ', framing)
+        if reply not in ('none', 'echo'):
+            raise RuntimeError('Unknown reply: ', reply)
+        if transport not in ('tcp', 'rfcomm'):
+            raise RuntimeError('Unknown transport: ', transport)
+
+        self.address = address
+        self.tcp_port = tcp_port
+        self.framing = framing
+        self.echo = reply == 'echo'
+        self.summary_interval = summary_interval
+        self.print_frames = print_frames
+        self.transport = transport
+        self.uuid = uuid
+
+        self.timed_entries = []
+        self.match_entries = []
+        if script:
+            with open(script) as script_file:
+                for entry in json.load(script_file):
+                    if 'match' in entry:
+                        self.match_entries.append(entry)
+                    else:
+                        self.timed_entries.append(entry)
+
+        self.counters = Counters()
+        self.clients = 0
+        self.total_clients = 0
+        self.start_time = time.monotonic()
+
+    async def serve(self):
+        """
+        Listen for clients and print summaries until interrupted.
+        """
+        if self.transport == 'rfcomm':
+            server = await asyncio.start_server(self.handle_client,
+                                                sock=self.rfcomm_socket())
+        else:
+            server = await asyncio.start_server(self.handle_client,
+                                                self.address, self.tcp_port)
+            print('Listening on TCP port %d' % self.tcp_port)
+
+        async with server:
+            if self.summary_interval:
+                previous = self.counters.copy()
+                while True:
+                    await asyncio.sleep(self.summary_interval)
+                    print(self.summary(previous, self.summary_interval))
+                    previous = self.counters.copy()
+            else:
+                await server.serve_forever()
+
+    def rfcomm_socket(self):
+        """
+        Create and advertise an RFCOMM server socket.
+        :return: a listening socket that asyncio can use
+        """
+        # import here so that the tcp transport may be used on
+        # machines without pybluez
+        import bluetooth
+
+        self.server_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        self.server_sock.bind(("", bluetooth.PORT_ANY))
+        self.server_sock.listen(5)
+        port = self.server_sock.getsockname()[1]
+
+        bluetooth.advertise_service(
+            self.server_sock, "SampleServer", service_id=self.uuid,
+            service_classes=[self.uuid, bluetooth.SERIAL_PORT_CLASS],
+            profiles=[bluetooth.SERIAL_PORT_PROFILE])
+
+        print("Waiting for connection on RFCOMM channel %d" % port)
+
+        # asyncio needs a standard socket - share the file descriptor
+        sock = socket.socket(fileno=os.dup(self.server_sock.fileno()))
+        sock.setblocking(False)
+        return sock
+
+    async def handle_client(self, reader, writer):
+        """
+        Receive frames from a client until it disconnects.
+        """
+        peer = writer.get_extra_info('peername')
+        print('Accepted connection from ', peer)
+        self.clients += 1
+        self.total_clients += 1
+
+        decoder = FrameDecoder(self.framing)
+        script = None
+        if self.timed_entries:
+            script = asyncio.ensure_future(self.play_script(writer))
+
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                self.counters.bytes_in += len(data)
+
+                errors = decoder.errors
+                for frame in decoder.feed(data):
+                    self.counters.frames_in += 1
+                    if self.print_frames:
+                        print(peer, frame)
+                    if self.echo:
+                        self.send(writer, frame)
+                    for entry in self.match_entries:
+                        if self.matches(frame, entry['match']):
+                            self.send(writer, entry['send'])
+                self.counters.errors += decoder.errors - errors
+
+                # wait if the client is not keeping up with replies
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if script:
+                script.cancel()
+            self.clients -= 1
+            writer.close()
+            print('Disconnected ', peer)
+
+    async def play_script(self, writer):
+        """
+        Send the timed script entries to a client.
+        """
+        for entry in self.timed_entries:
+            await asyncio.sleep(entry.get('delay', 0))
+            self.send(writer, entry['send'])
+            await writer.drain()
+
+    def send(self, writer, frame):
+        """
+        Queue a frame to be sent to a client.
+        """
+        data = encode_frame(frame, self.framing)
+        writer.write(data)
+        self.counters.frames_out += 1
+        self.counters.bytes_out += len(data)
+
+    # noinspection PyMethodMayBeStatic
+    def matches(self, frame, match):
+        """
+        :return: True if the frame is a dictionary containing the match items
+        """
+        if not isinstance(frame, dict):
+            return False
+        for key, value in match.items():
+            if frame.get(key) != value:
+                return False
+        return True
+
+    def summary(self, previous, elapsed):
+        """
+        :param previous: Counters at the start of the period
+        :param elapsed: seconds in the period
+        :return: a line describing the traffic in the period
+        """
+        counters = self.counters
+        return ('Clients %d (%d total)  in %.1f frames/s %.1f KB/s  '
+                'out %.1f frames/s %.1f KB/s  errors %d' %
+                (self.clients, self.total_clients,
+                 (counters.frames_in - previous.frames_in) / elapsed,
+                 (counters.bytes_in - previous.bytes_in) / elapsed / 1024,
+                 (counters.frames_out - previous.frames_out) / elapsed,
+                 (counters.bytes_out - previous.bytes_out) / elapsed / 1024,
+                 counters.errors))
+
+    def print_totals(self):
+        """
+        Print the traffic since the server started.
+        """
+        counters = self.counters
+        print('Total in %.1f s: in %d frames %d bytes  out %d frames %d bytes'
+              '  errors %d  clients %d' %
+              (time.monotonic() - self.start_time, counters.frames_in,
+               counters.bytes_in, counters.frames_out, counters.bytes_out,
+               counters.errors, self.total_clients))
+
+
+def fixture_server():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="address", default="0.0.0.0",
+                        help="Address to listen on for the tcp transport")
+    parser.add_argument("-f", dest="framing", default="json",
+                        help="Frame format: json, newline or length")
+    parser.add_argument("-i", dest="summary_interval", default="5",
+                        help="Seconds between summaries - 0 is only on exit")
+    parser.add_argument("-k", dest="transport", default="tcp",
+                        help="tcp, or rfcomm for Bluetooth")
+    parser.add_argument("-o", dest="tcp_port", default="43130",
+                        help="TCP port for the tcp transport")
+    parser.add_argument("-r", dest="reply", default="echo",
+                        help="none or echo")
+    parser.add_argument("-s", dest="script", default="None",
+                        help="json file of scripted sends and replies")
+    parser.add_argument("-u", dest="uuid",
+                        default="e35d6386-1802-414f-b2b9-375c92fa23e0",
+                        help="Bluetooth UUID for the rfcomm transport")
+    parser.add_argument("-v", dest="print_frames", default="false",
+                        help="true to print every received frame")
+
+    args = parser.parse_args()
+
+    if args.script == 'None':
+        args.script = None
+    args.print_frames = args.print_frames.lower() == 'true'
+
+    kw_options = {'address': args.address,
+                  'tcp_port': int(args.tcp_port),
+                  'framing': args.framing,
+                  'reply': args.reply,
+                  'script': args.script,
+                  'summary_interval': float(args.summary_interval),
+                  'print_frames': args.print_frames,
+                  'transport': args.transport,
+                  'uuid': args.uuid}
+
+    server = FixtureServer(**kw_options)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(server.serve())
+    except KeyboardInterrupt:
+        server.print_totals()
+        sys.exit(0)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+
+if __name__ == '__main__':
+    fixture_server()
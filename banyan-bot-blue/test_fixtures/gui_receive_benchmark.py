@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+gui_receive_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import signal
+import subprocess
+import sys
+import threading
+import time
+import tkinter
+
+import msgpack
+import zmq
+from python_banyan.banyan_base import BanyanBase
+
+from gui_receiver import GuiReceiver
+from receive_loop_benchmark import start_backplane
+
+
+class ReceiverGui(GuiReceiver, BanyanBase):
+    """
+    The receive side of the demo station GUIs without the widgets.
+    A Tcl interpreter stands in for the Tk window, so that no display
+    is needed. It counts the ticks and the inputs displayed.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        super(ReceiverGui, self).__init__(
+            back_plane_ip_address=kwargs['back_plane_ip_address'],
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name='ReceiverGui')
+
+        self.set_subscriber_topic('report_from_hardware')
+
+        self.FRAME_INTERVAL = kwargs['frame_interval']
+        self.ticks = 0
+        self.received = 0
+        self.displayed = 0
+        self.last_receive = None
+
+        self.main = tkinter.Tcl()
+        self.start_receiving(kwargs['receive_mode'])
+
+    def get_message(self):
+        self.ticks += 1
+        super(ReceiverGui, self).get_message()
+
+    def incoming_message_processing(self, topic, payload):
+        self.received += 1
+        self.last_receive = time.perf_counter()
+        self.queue_input(payload['pin'], payload['value'],
+                         payload['timestamp'])
+
+    def display_input(self, key, value, timestamp):
+        self.displayed += 1
+
+
+def measure(**kwargs):
+    """
+    Measure the idle ticks and cpu, and the time to drain a burst,
+    of one receive mode.
+    """
+    start_backplane(kwargs['back_plane_ip_address'], kwargs['publisher_port'],
+                    kwargs['subscriber_port'])
+
+    gui = ReceiverGui(**kwargs)
+
+    context = zmq.Context.instance()
+    publisher = context.socket(zmq.PUB)
+    publisher.connect('tcp://%s:%s' % (kwargs['back_plane_ip_address'],
+                                       kwargs['publisher_port']))
+    time.sleep(.5)
+
+    results = {}
+
+    def idle():
+        # run in the Tk event loop once it has started
+        results['ticks'] = gui.ticks
+        results['cpu'] = time.process_time()
+        gui.main.after(int(kwargs['idle_time'] * 1000), burst)
+
+    def burst():
+        idle_time = kwargs['idle_time']
+        results['idle_ticks'] = (gui.ticks - results['ticks']) / idle_time
+        results['idle_cpu'] = (time.process_time() - results['cpu']) / idle_time
+        results['ticks'] = gui.ticks
+        threading.Thread(target=send_burst, daemon=True).start()
+        gui.main.after(10, drained)
+
+    def send_burst():
+        results['start'] = time.perf_counter()
+        for count in range(kwargs['number_of_messages']):
+            payload = {'report': 'digital_input', 'pin': count % 8,
+                       'value': count, 'timestamp': time.time()}
+            publisher.send_multipart([b'report_from_hardware',
+                                      msgpack.packb(payload,
+                                                    use_bin_type=True)])
+
+    def drained():
+        # messages beyond the high water marks are dropped, so the
+        # burst is over when all arrived or none arrived for a second
+        if gui.received < kwargs['number_of_messages'] and \
+                time.perf_counter() - (gui.last_receive or
+                                       results['start']) < 1:
+            gui.main.after(10, drained)
+            return
+        results['drain_time'] = (gui.last_receive or
+                                 time.perf_counter()) - results['start']
+        results['burst_ticks'] = gui.ticks - results['ticks']
+
+    # mainloop returns at once without a Tk window,
+    # so run the event loop here
+    gui.main.after(500, idle)
+    while 'burst_ticks' not in results:
+        gui.main.dooneevent()
+
+    gui.stop_receiving()
+    gui.clean_up()
+
+    print('Receive mode            : ', gui.receive_mode)
+    if gui.receive_mode == 'sleep':
+        print('Frame interval (msec)   :  %d' % gui.FRAME_INTERVAL)
+    print('Idle ticks / second     :  %.1f' % results['idle_ticks'])
+    print('Idle cpu seconds / sec  :  %.4f' % results['idle_cpu'])
+    print('Burst messages received :  %d of %d' %
+          (gui.received, kwargs['number_of_messages']))
+    print('Burst drain time (sec)  :  %.3f' % results['drain_time'])
+    print('Burst ticks             :  %d' % results['burst_ticks'])
+    print('Inputs displayed        :  %d' % gui.displayed)
+
+
+def gui_receive_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address for the benchmark's own backplane")
+    parser.add_argument("-f", dest="frame_interval", default="1",
+                        help="Milliseconds between sleep mode ticks - "
+                             "1 was the interval before the file handler")
+    parser.add_argument("-i", dest="idle_time", default="2.0",
+                        help="Seconds measured without messages")
+    parser.add_argument("-m", dest="number_of_messages", default="20000",
+                        help="Number of messages in the burst")
+    parser.add_argument("-p", dest="publisher_port", default='43144',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43145',
+                        help="Subscriber IP port")
+    parser.add_argument("-y", dest="receive_mode", default="both",
+                        help="Receive messages: sleep, poll or both")
+
+    args = parser.parse_args()
+
+    # each mode is measured in a process of its own
+    if args.receive_mode == 'both':
+        for mode in ('sleep', 'poll'):
+            command = [sys.executable] + sys.argv + ['-y', mode]
+            subprocess.run(command, check=True)
+        return
+
+    kw_options = {
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': args.publisher_port,
+        'subscriber_port': args.subscriber_port,
+        'frame_interval': int(args.frame_interval),
+        'receive_mode': args.receive_mode,
+        'idle_time': float(args.idle_time),
+        'number_of_messages': int(args.number_of_messages)}
+
+    measure(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    gui_receive_benchmark()
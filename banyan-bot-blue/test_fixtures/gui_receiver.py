@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""
+gui_receiver.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import sys
+import time
+import tkinter
+
+import msgpack
+import zmq
+
+
+class GuiReceiver(object):
+    """
+    A mixin for the demo station GUIs that receives Banyan messages
+    within the tkinter event loop.
+
+    Each tick drains every waiting message, up to DRAIN_BUDGET seconds,
+    instead of a single message, so that a burst of reports does not
+    leave the GUI behind. Input reports are collected with queue_input,
+    keeping only the latest value for each input, and the widgets are
+    updated once at the end of the tick.
+
+    Receive modes:
+    poll  - ticks are run by a Tk file handler on the subscriber's
+            ZMQ_FD, so an idle GUI does not wake up at all.
+    sleep - ticks are run every FRAME_INTERVAL milliseconds.
+            This is used where Tk has no file handlers (Windows).
+
+    ZMQ_FD only signals that the socket state may have changed, and is
+    not signalled again for messages that are already waiting. So each
+    tick drains until ZMQ_EVENTS no longer shows POLLIN, and a tick
+    that runs out of time schedules the next one itself.
+
+    List it before BanyanBase in the base classes, implement
+    display_input, call start_receiving once self.main is created
+    and stop_receiving before the subscriber is closed.
+    """
+
+    # the longest time in seconds spent draining messages in one tick
+    DRAIN_BUDGET = .02
+
+    # milliseconds between ticks when no messages are waiting -
+    # about one frame
+    FRAME_INTERVAL = 16
+
+    def start_receiving(self, receive_mode='poll'):
+        """
+        Register the file handler or schedule the first tick.
+        :param receive_mode: poll or sleep
+        """
+        if receive_mode not in ('poll', 'sleep'):
+            raise RuntimeError('Unknown receive mode: ', receive_mode)
+
+        # the latest [value, time stamp] of each input since the last update
+        self.pending_inputs = {}
+
+        self.subscriber_fd = None
+        if receive_mode == 'poll':
+            try:
+                fd = self.subscriber.getsockopt(zmq.FD)
+                self.main.createfilehandler(fd, tkinter.READABLE,
+                                            self.subscriber_readable)
+                self.subscriber_fd = fd
+            # Tk on Windows has no file handlers
+            except (AttributeError, tkinter.TclError):
+                print('Tk file handlers not available - using sleep mode')
+        self.receive_mode = 'poll' if self.subscriber_fd is not None \
+            else 'sleep'
+
+        # messages that arrived before the handler was registered
+        # do not signal the file descriptor
+        self.main.after(5, self.get_message)
+
+    def stop_receiving(self):
+        """
+        Remove the file handler.
+        """
+        if self.subscriber_fd is not None:
+            self.main.deletefilehandler(self.subscriber_fd)
+            self.subscriber_fd = None
+
+    # noinspection PyUnusedLocal
+    def subscriber_readable(self, fd, mask):
+        """
+        Called by Tk when ZMQ_FD is signalled.
+        """
+        self.get_message()
+
+    def get_message(self):
+        """
+        This method is called from the tkevent loop "after" method.
+        It will poll for new zeromq messages within the tkinter event loop.
+        """
+        deadline = time.monotonic() + self.DRAIN_BUDGET
+        backlog = False
+        try:
+            # reading ZMQ_EVENTS also rearms ZMQ_FD
+            while self.subscriber.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                try:
+                    data = self.subscriber.recv_multipart(zmq.NOBLOCK)
+                # if no messages are available, zmq throws this exception
+                except zmq.error.Again:
+                    break
+                self.incoming_message_processing(data[0].decode(),
+                                                 msgpack.unpackb(data[1],
+                                                                 raw=False))
+                if time.monotonic() >= deadline:
+                    backlog = True
+                    break
+
+            self.update_inputs()
+
+            # come straight back if messages were left waiting
+            if backlog:
+                self.main.after(1, self.get_message)
+            elif self.receive_mode == 'sleep':
+                self.main.after(self.FRAME_INTERVAL, self.get_message)
+        except KeyboardInterrupt:
+            self.on_closing()
+            sys.exit(0)
+
+    def queue_input(self, key, value, timestamp):
+        """
+        Save an input report for the next widget update.
+        An earlier report for the same input is replaced.
+        :param key: identifies the input - passed to display_input
+        :param value: input value
+        :param timestamp: report time stamp
+        """
+        self.pending_inputs[key] = (value, timestamp)
+
+    def update_inputs(self):
+        """
+        Display the inputs that changed since the last update.
+        """
+        pending, self.pending_inputs = self.pending_inputs, {}
+        for key, (value, timestamp) in pending.items():
+            self.display_input(key, value, self.format_time_stamp(timestamp))
+
+    def display_input(self, key, value, timestamp):
+        """
+        Update the widgets for an input
+        :param key: key passed to queue_input
+        :param value: input value
+        :param timestamp: formatted time stamp
+        """
+        raise NotImplementedError
+
+    # noinspection PyMethodMayBeStatic
+    def format_time_stamp(self, timestamp):
+        """
+        Format a report time stamp for display.
+        Gateways report either a formatted string or, when numeric
+        time stamps are enabled, epoch seconds.
+        :param timestamp: report time stamp
+        :return: formatted time stamp
+        """
+        if isinstance(timestamp, str):
+            return timestamp
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) + \
+            '.%03d' % int((timestamp % 1) * 1000)
@@ -20,28 +20,227 @@ traffic_generator.py
 
 """
 import argparse
+import os
+import random
 import signal
 import sys
+import threading
 import time
 
 import msgpack
-import msgpack_numpy as m
 import zmq
 from python_banyan.banyan_base import BanyanBase
 
+# the socket options live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
 
-class MessageInjector(BanyanBase):
+# noinspection PyUnresolvedReferences
+from latency_histogram import LatencyHistogram
+# noinspection PyUnresolvedReferences
+from zmq_options import SOCKET_PROFILES, SocketOptions
+
+
+def build_payload(msg_type, thread_number, sequence, payload_size, sent_ns):
+    """
+    Build a test message.
+
+    Every message carries the thread number, the sequence number and
+    the monotonic send time, so that an echoed copy can be matched
+    with the send. A string message carries them as
+    thread:sequence:sent_ns followed by the padding.
+
+    :param msg_type: s=string d=dictionary m=motor command i=input report
+    :param thread_number: number of the publisher thread
+    :param sequence: message number within the thread
+    :param payload_size: number of padding bytes added to the message
+    :param sent_ns: time.monotonic_ns() when the message is sent
+    :return: the payload
+    """
+    if msg_type == 's':
+        return '%d:%d:%d' % (thread_number, sequence, sent_ns) + \
+            'x' * payload_size
+
+    if msg_type == 'm':
+        # robot control traffic
+        payload = {'command': 'dc_motor_forward', 'motor': sequence % 2 + 1,
+                   'speed': (sequence % 100) / 100}
+    elif msg_type == 'i':
+        # gateway input reports
+        payload = {'report': 'digital_input', 'pin': sequence % 8,
+                   'value': sequence % 2}
+    else:
+        payload = {'report': sequence}
+
+    payload['thread'] = thread_number
+    payload['sequence'] = sequence
+    payload['sent_ns'] = sent_ns
+    if payload_size:
+        payload['pad'] = 'x' * payload_size
+    return payload
+
+
+class PublisherThread(threading.Thread):
+    """
+    Publishes test messages at a target rate on a socket of its own.
+
+    Sends are paced against monotonic deadlines, so that time spent
+    sending does not lower the rate, and the lateness of each send
+    is recorded.
+
+    Patterns:
+    constant - evenly spaced messages
+    poisson  - exponentially distributed gaps with the same mean
+    burst    - burst_size messages back to back, with the bursts
+               spaced to give the same mean rate
+    """
+
+    PATTERNS = ('constant', 'poisson', 'burst')
+
+    def __init__(self, injector, thread_number, rate, pattern, burst_size,
+                 number_of_messages, duration):
+        """
+        :param injector: the MessageInjector
+        :param thread_number: number of this thread
+        :param rate: target messages per second
+        :param pattern: constant, poisson or burst
+        :param burst_size: messages per burst for the burst pattern
+        :param number_of_messages: messages to send - 0 is unlimited
+        :param duration: seconds to send for - 0 is unlimited
+        """
+        if pattern not in self.PATTERNS:
+            raise RuntimeError('Unknown pattern: ', pattern)
+
+        self.injector = injector
+        self.thread_number = thread_number
+        self.rate = rate
+        self.pattern = pattern
+        self.burst_size = burst_size
+        self.number_of_messages = number_of_messages
+        self.duration = duration
+
+        # a socket of its own - zmq sockets may not be shared by threads
+        self.publisher = injector.my_context.socket(zmq.PUB)
+        for option, value in SOCKET_PROFILES[injector.socket_profile].items():
+            self.publisher.setsockopt(option, value)
+        self.publisher.connect('tcp://' + injector.back_plane_ip_address +
+                               ':' + injector.publisher_port)
+        self.topic = injector.publisher_topic.encode()
+
+        # (sequence, wall time, monotonic ns) of each send
+        self.send_times = []
+
+        # how late each send was, in nanoseconds
+        self.lateness = []
+
+        self.sent = 0
+        self.start_time = None
+        self.end_time = None
+        self.random = random.Random(thread_number)
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def intervals(self):
+        """
+        A generator of the gaps between deadlines, in nanoseconds
+        """
+        interval = 1000000000 / self.rate
+        while True:
+            if self.pattern == 'poisson':
+                yield self.random.expovariate(1.0) * interval
+            elif self.pattern == 'burst':
+                yield interval * self.burst_size
+                for _ in range(self.burst_size - 1):
+                    yield 0
+            else:
+                yield interval
+
+    def run(self):
+        """
+        Publish until the message count or duration is reached,
+        or the injector is stopped.
+        """
+        stop = self.injector.stop_publishing
+        msg_type = self.injector.msg_type
+        payload_size = self.injector.payload_size
+
+        self.start_time = time.monotonic_ns()
+        if self.duration:
+            end = self.start_time + int(self.duration * 1000000000)
+        else:
+            end = None
+        deadline = self.start_time
+        intervals = self.intervals()
+
+        try:
+            while not stop.is_set():
+                if self.number_of_messages and \
+                        self.sent >= self.number_of_messages:
+                    break
+
+                now = time.monotonic_ns()
+                if deadline > now:
+                    if stop.wait((deadline - now) / 1000000000):
+                        break
+                    now = time.monotonic_ns()
+                if end and now >= end:
+                    break
+
+                payload = build_payload(msg_type, self.thread_number,
+                                        self.sent, payload_size, now)
+                self.publisher.send_multipart(
+                    [self.topic, msgpack.packb(payload, use_bin_type=True)])
+
+                self.lateness.append(now - deadline)
+                self.send_times.append((self.sent, time.time(), now))
+                self.sent += 1
+                deadline += int(next(intervals))
+        finally:
+            self.end_time = time.monotonic_ns()
+            self.publisher.close()
+
+    def summary(self):
+        """
+        :return: a line describing the achieved rate and pacing
+        """
+        elapsed = ((self.end_time or time.monotonic_ns()) -
+                   (self.start_time or time.monotonic_ns())) / 1000000000
+        achieved = self.sent / elapsed if elapsed else 0.0
+        lateness = sorted(self.lateness) or [0]
+        return ('Thread %d: sent %d in %.3f s  target %.1f/s  '
+                'achieved %.1f/s  late p50 %.1f usec  p99 %.1f usec' %
+                (self.thread_number, self.sent, elapsed, self.rate, achieved,
+                 lateness[len(lateness) // 2] / 1000,
+                 lateness[min(len(lateness) * 99 // 100,
+                              len(lateness) - 1)] / 1000))
+
+
+class MessageInjector(SocketOptions, BanyanBase):
     """
     This class will generate Banyan test messages and subscribe
-    to receive test messages. If set to continuous mode, a message
-    will be sent at a rate of 1 per second.
+    to receive test messages.
+
+    In continuous mode, each publisher thread sends messages at the
+    target rate until the duration or message count is reached. In
+    single shot mode, one message is sent.
+
+    Messages received on the subscription topics that carry a thread,
+    sequence number and send time are matched with the send to measure
+    the round trip time, loss and reordering. A summary is printed
+    every summary_interval seconds, and a final one on exit.
 
     usage: message_injector.py [-h]
                            [-a SUBSCRIPTION_TOPICS [SUBSCRIPTION_TOPICS ...]]
                            [-b BACK_PLANE_IP_ADDRESS] [-c PUBLISH_TOPIC]
-                           [-f MESSAGE_FREQUENCY] [-m MSG_TYPE]
-                           [-n PROCESS_NAME] [-p PUBLISHER_PORT]
+                           [-d DURATION] [-e PAYLOAD_SIZE]
+                           [-f MESSAGE_FREQUENCY] [-g PATTERN]
+                           [-i BURST_SIZE] [-j THREADS] [-k NUMBER_OF_MESSAGES]
+                           [-m MSG_TYPE] [-n PROCESS_NAME] [-o SEND_LOG]
+                           [-p PUBLISHER_PORT] [-r RATE]
                            [-s SUBSCRIBER_PORT] [-t LOOP_TIME]
+                           [-u SUMMARY_INTERVAL] [-v PRINT_MESSAGES]
+                           [-y RECEIVE_MODE] [-z SOCKET_PROFILE]
 
         optional arguments:
           -h, --help            show this help message and exit
@@ -50,12 +249,26 @@ class MessageInjector(BanyanBase):
           -b BACK_PLANE_IP_ADDRESS
                                 None or IP address used by Back Plane
           -c PUBLISH_TOPIC      Publishing Topic
+          -d DURATION           Seconds to publish for - 0 is until Control-C
+          -e PAYLOAD_SIZE       Padding bytes added to each message
           -f MESSAGE_FREQUENCY  Message Output Frequency: c=continuous s=single shot
+          -g PATTERN            Send pattern: constant, poisson or burst
+          -i BURST_SIZE         Messages per burst for the burst pattern
+          -j THREADS            Number of publisher threads
+          -k NUMBER_OF_MESSAGES Messages per thread - 0 is unlimited
           -m MSG_TYPE           Message Injection Type: s=string d=dictionary
+                                m=motor command i=input report
           -n PROCESS_NAME       Set process name in banner
+          -o SEND_LOG           csv file for the send time of each message
           -p PUBLISHER_PORT     Publisher IP port
+          -r RATE               Messages per second for each thread
           -s SUBSCRIBER_PORT    Subscriber IP port
           -t LOOP_TIME          Event Loop Timer in seconds
+          -u SUMMARY_INTERVAL   Seconds between summaries - 0 is only on exit
+          -v PRINT_MESSAGES     true to print every received message
+          -y RECEIVE_MODE       Receive loop: sleep or poll
+          -z SOCKET_PROFILE     zmq socket profile: default, low_latency or
+                                throughput
 
 
     """
@@ -73,11 +286,22 @@ class MessageInjector(BanyanBase):
         :param publisher_port: banyan_base back plane publisher port.
                                This must match that of the
                                banyan_base backplane.
-        :param number_of_messages: number of message to transmit
+        :param number_of_messages: number of messages for each thread
         :param process_name: Component identifier
         :param loop_time: receive loop sleep time
-        :param msg_type: single character or python dictionary
+        :param msg_type: string, dictionary, motor command or input report
         :param message_frequency: single message or continuous transmission
+        :param rate: messages per second for each thread
+        :param pattern: constant, poisson or burst
+        :param burst_size: messages per burst
+        :param threads: number of publisher threads
+        :param duration: seconds to publish for
+        :param payload_size: padding bytes added to each message
+        :param send_log: csv file for send times or None
+        :param summary_interval: seconds between summaries - 0 is only on exit
+        :param print_messages: print every received message
+        :param socket_profile: zmq socket option profile
+        :param receive_mode: sleep or poll
         """
 
         # initialize the parent
@@ -89,6 +313,9 @@ class MessageInjector(BanyanBase):
             loop_time=kwargs['loop_time'],
         )
 
+        self.apply_socket_profile(kwargs['socket_profile'],
+                                  kwargs['receive_mode'])
+
         # set the process name for the banner
         self.process_name = kwargs['process_name'],
 
@@ -106,12 +333,53 @@ class MessageInjector(BanyanBase):
 
         # save the message type - default is dictionary
         self.msg_type = kwargs['msg_type']
-
-        # save how often to publish - default is continuous
-        self.message_frequency = kwargs['message_frequency']
-
-        # a count used as in the message payload as data
-        self.count = 0
+        self.payload_size = kwargs['payload_size']
+        self.send_log = kwargs['send_log']
+
+        # a single shot is one message from one thread
+        if kwargs['message_frequency'] == 's':
+            threads = 1
+            number_of_messages = 1
+        else:
+            threads = kwargs['threads']
+            number_of_messages = kwargs['number_of_messages']
+
+        self.print_messages = kwargs['print_messages']
+
+        self.stop_publishing = threading.Event()
+        self.cleaned_up = False
+
+        # round trip times since the last summary and since the start
+        self.interval_rtt = LatencyHistogram()
+        self.total_rtt = LatencyHistogram()
+
+        # replies matched with each thread, and the highest sequence seen
+        self.received = [0] * threads
+        self.highest_sequence = [-1] * threads
+        self.reordered = 0
+        self.unmatched = 0
+
+        self.publishers = [PublisherThread(self, thread_number,
+                                           kwargs['rate'], kwargs['pattern'],
+                                           kwargs['burst_size'],
+                                           number_of_messages,
+                                           kwargs['duration'])
+                           for thread_number in range(threads)]
+
+        # allow the publisher sockets to connect to the backplane
+        time.sleep(self.connect_time)
+
+        for publisher in self.publishers:
+            publisher.start()
+
+        # when the publishers are limited, exit once they are done
+        if kwargs['duration'] or number_of_messages:
+            threading.Thread(target=self.finish, daemon=True).start()
+
+        if kwargs['summary_interval']:
+            threading.Thread(target=self.summarize,
+                             args=(kwargs['summary_interval'],),
+                             daemon=True).start()
 
         # start the receive loop
         try:
@@ -120,70 +388,127 @@ class MessageInjector(BanyanBase):
             self.clean_up()
             sys.exit(0)
 
-    def receive_loop(self):
+    def finish(self):
         """
-        This is the receive loop for Banyan messages.
+        Wait for the publishers to finish, allow a second for replies,
+        then stop the receive loop the same way Control-C does.
+        """
+        for publisher in self.publishers:
+            publisher.join()
+        time.sleep(1)
+        os.kill(os.getpid(), signal.SIGINT)
 
-        Messages will be published when there are no
-        messages available to process, so we need
-        to overwrite the base class method to do this.
+    def summarize(self, interval):
         """
-        while True:
-            try:
-                data = self.subscriber.recv_multipart(zmq.NOBLOCK)
-                if self.numpy:
-                    payload2 = {}
-                    payload = msgpack.unpackb(data[1], object_hook=m.decode)
-                    # convert keys to strings
-                    # this compensates for the breaking change in
-                    # msgpack-numpy 0.4.1 to 0.4.2
-                    for key, value in payload.items():
-                        if not type(key) == str:
-                            key = key.decode('utf-8')
-                            payload2[key] = value
-
-                    if payload2:
-                        payload = payload2
-                    self.incoming_message_processing(data[0].decode(), payload)
-                else:
-                    self.incoming_message_processing(data[0].decode(),
-                                                     msgpack.unpackb(data[1],
-                                                                     raw=False))
-            # if no messages are available, zmq throws this exception
-            except zmq.error.Again:
-                # single shot
-                if self.message_frequency == 's':
-                    # just send a single message
-                    if self.count > 0:
-                        pass
-                try:
-                    # if message type is dictionary
-                    if self.msg_type == 'd':
-                        payload = {'report': self.count}
-                    # else send as a string
-                    else:
-                        payload = str(self.count)
-
-                    # bump the count for the next potential message
-                    self.count += 1
-
-                    # publish the message
-                    self.publish_payload(payload, self.publisher_topic)
-
-                    # sleep for a second
-                    time.sleep(1)
-                except KeyboardInterrupt:
-                    self.clean_up()
-                    raise KeyboardInterrupt
+        Print a summary of the replies every interval seconds.
+        Printing each message limits the rate that can be tested,
+        so this is the normal output.
+
+        :param interval: seconds between summaries
+        """
+        while not self.stop_publishing.wait(interval):
+            # start a new interval - a reply recorded during the swap
+            # is counted in either one
+            rtt, self.interval_rtt = self.interval_rtt, LatencyHistogram()
+            print(self.rtt_summary(rtt, interval))
+
+    def rtt_summary(self, rtt, elapsed):
+        """
+        :param rtt: a LatencyHistogram
+        :param elapsed: seconds covered by the histogram
+        :return: a line describing the replies and round trip times
+        """
+        sent = sum(publisher.sent for publisher in self.publishers)
+        received = sum(self.received)
+        line = 'Replies: %d (%.1f/s)  sent %d  outstanding %d  ' \
+               'reordered %d  unmatched %d' % \
+               (rtt.count, rtt.count / elapsed if elapsed else 0.0, sent,
+                max(sent - received, 0), self.reordered, self.unmatched)
+        if rtt.count:
+            line += '  rtt usec: min %.1f  mean %.1f' % \
+                    (rtt.min / 1000, rtt.mean() / 1000)
+            for percentile, value in rtt.report()['percentiles']:
+                line += '  p%g %.1f' % (percentile, value / 1000)
+        return line
 
     def incoming_message_processing(self, topic, payload):
         """
         Messages are sent here from the receive_loop
+
+        A reply is matched with its send by the thread and sequence
+        number, and its round trip time is taken from the send time
+        it carries, so nothing is stored for messages in flight.
+
         :param topic: Message Topic string
         :param payload: Message Data
         """
-        # just print the message
-        print(topic, payload)
+        now = time.monotonic_ns()
+        if self.print_messages:
+            print(topic, payload)
+
+        try:
+            if isinstance(payload, str):
+                thread_number, sequence, sent_ns = \
+                    payload.split('x', 1)[0].split(':')
+                thread_number = int(thread_number)
+                sequence = int(sequence)
+                sent_ns = int(sent_ns)
+            else:
+                thread_number = payload['thread']
+                sequence = payload['sequence']
+                sent_ns = payload['sent_ns']
+            if not 0 <= thread_number < len(self.received):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            self.unmatched += 1
+            return
+
+        self.interval_rtt.record(now - sent_ns)
+        self.total_rtt.record(now - sent_ns)
+
+        self.received[thread_number] += 1
+        if sequence < self.highest_sequence[thread_number]:
+            self.reordered += 1
+        else:
+            self.highest_sequence[thread_number] = sequence
+
+    def write_send_log(self):
+        """
+        Write the send time of every message to a csv file:
+        thread, sequence, wall time, monotonic ns
+        """
+        with open(self.send_log, 'w') as log:
+            log.write('thread,sequence,wall_time,monotonic_ns\n')
+            for publisher in self.publishers:
+                for sequence, wall_time, monotonic_ns in publisher.send_times:
+                    log.write('%d,%d,%.6f,%d\n' % (publisher.thread_number,
+                                                   sequence, wall_time,
+                                                   monotonic_ns))
+
+    def clean_up(self):
+        """
+        Stop the publishers and report what they achieved.
+        """
+        if self.cleaned_up:
+            return
+        self.cleaned_up = True
+
+        self.stop_publishing.set()
+        elapsed = 0.0
+        for publisher in self.publishers:
+            publisher.join()
+            print(publisher.summary())
+            if publisher.start_time and publisher.end_time:
+                elapsed = max(elapsed, (publisher.end_time -
+                                        publisher.start_time) / 1000000000)
+
+        # replies still outstanding after the drain time are lost
+        print('Total ' + self.rtt_summary(self.total_rtt, elapsed))
+
+        if self.send_log:
+            self.write_send_log()
+
+        super(MessageInjector, self).clean_up()
 
 
 def message_injector():
@@ -201,24 +526,54 @@ def message_injector():
     parser.add_argument("-c", dest="publish_topic",
                         default="to_bt_gateway",
                         help="Publishing Topic"),
+    parser.add_argument("-d", dest="duration", default="0",
+                        help="Seconds to publish for - 0 is until Control-C")
+    parser.add_argument("-e", dest="payload_size", default="0",
+                        help="Padding bytes added to each message")
     parser.add_argument("-f", dest="message_frequency", default="c",
                         help="Message Output Frequency: c=continuous  s=single shot")
+    parser.add_argument("-g", dest="pattern", default="constant",
+                        help="Send pattern: constant, poisson or burst")
+    parser.add_argument("-i", dest="burst_size", default="10",
+                        help="Messages per burst for the burst pattern")
+    parser.add_argument("-j", dest="threads", default="1",
+                        help="Number of publisher threads")
+    parser.add_argument("-k", dest="number_of_messages", default="0",
+                        help="Messages per thread - 0 is unlimited")
     parser.add_argument("-m", dest="msg_type", default="d",
-                        help="Message Injection Type: s=string  d=dictionary")
+                        help="Message Injection Type: s=string  d=dictionary  "
+                             "m=motor command  i=input report")
     parser.add_argument("-n", dest="process_name",
                         default="MessageInjector",
                         help="Set process name in banner")
+    parser.add_argument("-o", dest="send_log", default="None",
+                        help="csv file for the send time of each message")
     parser.add_argument("-p", dest="publisher_port", default='43124',
                         help="Publisher IP port")
+    parser.add_argument("-r", dest="rate", default="1.0",
+                        help="Messages per second for each thread")
     parser.add_argument("-s", dest="subscriber_port", default='43125',
                         help="Subscriber IP port")
     parser.add_argument("-t", dest="loop_time", default=".1",
                         help="Event Loop Timer in seconds")
+    parser.add_argument("-u", dest="summary_interval", default="5",
+                        help="Seconds between summaries - 0 is only on exit")
+    parser.add_argument("-v", dest="print_messages", default="false",
+                        help="true to print every received message")
+    parser.add_argument("-y", dest="receive_mode", default="sleep",
+                        help="Receive loop: sleep for loop_time when idle "
+                             "or poll - block until a message arrives")
+    parser.add_argument("-z", dest="socket_profile", default="default",
+                        help="zmq socket profile: default, low_latency "
+                             "or throughput")
 
     args = parser.parse_args()
 
     if args.back_plane_ip_address == 'None':
         args.back_plane_ip_address = None
+    if args.send_log == 'None':
+        args.send_log = None
+    args.print_messages = args.print_messages.lower() == 'true'
     kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
                   'publisher_port': args.publisher_port,
                   'subscriber_port': args.subscriber_port,
@@ -227,7 +582,19 @@ def message_injector():
                   'subscription_topics': args.subscription_topics,
                   'publish_topic': args.publish_topic,
                   'msg_type': args.msg_type,
-                  'message_frequency': args.message_frequency}
+                  'message_frequency': args.message_frequency,
+                  'rate': float(args.rate),
+                  'pattern': args.pattern,
+                  'burst_size': int(args.burst_size),
+                  'threads': int(args.threads),
+                  'number_of_messages': int(args.number_of_messages),
+                  'duration': float(args.duration),
+                  'payload_size': int(args.payload_size),
+                  'send_log': args.send_log,
+                  'summary_interval': float(args.summary_interval),
+                  'print_messages': args.print_messages,
+                  'socket_profile': args.socket_profile,
+                  'receive_mode': args.receive_mode}
 
     MessageInjector(**kw_options)
 
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+publish_throttle.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import time
+
+
+class PublishThrottle(object):
+    """
+    Limits the rate at which a GUI control publishes.
+
+    A Scale calls its command for every step of a drag. Wrap the
+    function that publishes the control's value in a throttle, and
+    use the throttle as the command. The first call publishes at once.
+    Calls within interval milliseconds of the last publish are held,
+    and only the latest is published when the interval ends, so the
+    final position of a drag is always sent.
+
+    The function reads the control when it is called, so the value
+    published is the latest one. Held calls that are replaced by a
+    later one are counted as suppressed.
+    """
+
+    def __init__(self, widget, interval, function):
+        """
+        :param widget: any tkinter widget - used to schedule the publish
+        :param interval: minimum milliseconds between publishes
+        :param function: function that publishes, called without arguments
+        """
+        self.widget = widget
+        self.interval = interval
+        self.function = function
+
+        self.last_publish = None
+        self.timer = None
+        self.held = False
+
+        self.published = 0
+        self.suppressed = 0
+
+    # noinspection PyUnusedLocal
+    def __call__(self, *args):
+        """
+        The control's command. Arguments, such as the value a Scale
+        passes, are ignored.
+        """
+        if self.timer is not None:
+            # a publish is already scheduled and will read the
+            # latest value
+            if self.held:
+                self.suppressed += 1
+            self.held = True
+            return
+
+        now = time.monotonic()
+        if self.last_publish is None or \
+                (now - self.last_publish) * 1000 >= self.interval:
+            self.publish()
+        else:
+            self.held = True
+            delay = self.interval - int((now - self.last_publish) * 1000)
+            self.timer = self.widget.after(max(delay, 1), self.flush)
+
+    def flush(self):
+        """
+        Publish the held call at the end of the interval.
+        """
+        self.timer = None
+        if self.held:
+            self.publish()
+
+    def publish(self):
+        """
+        Call the function and note the time.
+        """
+        self.held = False
+        self.last_publish = time.monotonic()
+        self.published += 1
+        self.function()
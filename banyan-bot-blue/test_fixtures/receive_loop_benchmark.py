@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+receive_loop_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import msgpack
+import zmq
+from python_banyan.banyan_base import BanyanBase
+
+# the socket options live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from zmq_options import RECEIVE_MODES, SocketOptions
+
+
+class EchoComponent(SocketOptions, BanyanBase):
+    """
+    A component that publishes every message it receives back on
+    the pong topic, and counts the wakeups of its receive loop.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        # number of times the receive loop checked the subscriber
+        self.wakeups = 0
+
+        super(EchoComponent, self).__init__(
+            back_plane_ip_address=kwargs['back_plane_ip_address'],
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name='EchoComponent',
+            loop_time=kwargs['loop_time'])
+
+        self.apply_socket_profile('default', kwargs['receive_mode'])
+        self.set_subscriber_topic('ping')
+
+    def receive_messages(self):
+        self.wakeups += 1
+        return super(EchoComponent, self).receive_messages()
+
+    def incoming_message_processing(self, topic, payload):
+        self.publish_payload(payload, 'pong')
+
+
+def start_backplane(ip_address, publisher_port, subscriber_port):
+    """
+    Run a backplane in a thread of this process, so that a separately
+    started backplane is not needed.
+    """
+    context = zmq.Context.instance()
+    frontend = context.socket(zmq.XSUB)
+    frontend.bind('tcp://%s:%s' % (ip_address, publisher_port))
+    backend = context.socket(zmq.XPUB)
+    backend.bind('tcp://%s:%s' % (ip_address, subscriber_port))
+    threading.Thread(target=zmq.proxy, args=(frontend, backend),
+                     daemon=True).start()
+
+
+def measure(**kwargs):
+    """
+    Measure the idle wakeups and the round trip latency of one
+    receive mode.
+    """
+    start_backplane(kwargs['back_plane_ip_address'], kwargs['publisher_port'],
+                    kwargs['subscriber_port'])
+
+    component = EchoComponent(**kwargs)
+    threading.Thread(target=component.receive_loop, daemon=True).start()
+
+    context = zmq.Context.instance()
+    publisher = context.socket(zmq.PUB)
+    publisher.connect('tcp://%s:%s' % (kwargs['back_plane_ip_address'],
+                                       kwargs['publisher_port']))
+    subscriber = context.socket(zmq.SUB)
+    subscriber.connect('tcp://%s:%s' % (kwargs['back_plane_ip_address'],
+                                        kwargs['subscriber_port']))
+    subscriber.setsockopt(zmq.SUBSCRIBE, b'pong')
+    time.sleep(.5)
+
+    # idle - no messages at all
+    wakeups = component.wakeups
+    cpu = time.process_time()
+    time.sleep(kwargs['idle_time'])
+    idle_wakeups = (component.wakeups - wakeups) / kwargs['idle_time']
+    idle_cpu = (time.process_time() - cpu) / kwargs['idle_time']
+
+    # round trips, spaced so that the component is idle before each ping
+    latencies = []
+    for count in range(kwargs['number_of_messages']):
+        sent = time.perf_counter_ns()
+        publisher.send_multipart([b'ping', msgpack.packb({'count': count})])
+        subscriber.recv_multipart()
+        latencies.append(time.perf_counter_ns() - sent)
+        time.sleep(kwargs['interval'])
+
+    latencies.sort()
+    print('Receive mode          : ', kwargs['receive_mode'])
+    print('Loop time             :  %.4f' % kwargs['loop_time'])
+    print('Idle wakeups / second :  %.1f' % idle_wakeups)
+    print('Idle cpu seconds / sec:  %.4f' % idle_cpu)
+    for percentile in (50, 90, 99, 100):
+        index = min(len(latencies) * percentile // 100, len(latencies) - 1)
+        print('Round trip p%-3d (usec):  %.1f' %
+              (percentile, latencies[index] / 1000))
+
+
+def receive_loop_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address for the benchmark's own backplane")
+    parser.add_argument("-i", dest="idle_time", default="2.0",
+                        help="Seconds measured without messages")
+    parser.add_argument("-m", dest="number_of_messages", default="500",
+                        help="Number of round trips")
+    parser.add_argument("-p", dest="publisher_port", default='43144',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43145',
+                        help="Subscriber IP port")
+    parser.add_argument("-t", dest="loop_time", default=".001",
+                        help="Event Loop Timer in seconds")
+    parser.add_argument("-v", dest="interval", default=".005",
+                        help="Seconds between round trips")
+    parser.add_argument("-y", dest="receive_mode", default="both",
+                        help="Receive loop: sleep, poll or both")
+
+    args = parser.parse_args()
+
+    # each mode is measured in a process of its own,
+    # so that one receive loop does not disturb the other
+    if args.receive_mode == 'both':
+        for mode in RECEIVE_MODES:
+            command = [sys.executable] + sys.argv + ['-y', mode]
+            subprocess.run(command, check=True)
+        return
+
+    kw_options = {
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': args.publisher_port,
+        'subscriber_port': args.subscriber_port,
+        'loop_time': float(args.loop_time),
+        'receive_mode': args.receive_mode,
+        'idle_time': float(args.idle_time),
+        'number_of_messages': int(args.number_of_messages),
+        'interval': float(args.interval)}
+
+    measure(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    receive_loop_benchmark()
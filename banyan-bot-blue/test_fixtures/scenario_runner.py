@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+
+"""
+scenario_runner.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import collections
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import msgpack
+import zmq
+from python_banyan.banyan_base import BanyanBase
+
+from receive_loop_benchmark import start_backplane
+
+# the latency histogram lives with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from latency_histogram import LatencyHistogram
+# noinspection PyUnresolvedReferences
+from zmq_options import READY_TOPIC
+
+# the launcher specs and the scenarios are kept in tests/
+TESTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'tests')
+
+
+class ScenarioProbe(BanyanBase):
+    """
+    The runner's connection to the backplane. It publishes the
+    messages of each step and receives every message on the backplane.
+    """
+
+    def __init__(self, back_plane_ip_address, subscriber_port,
+                 publisher_port):
+        """
+        :param back_plane_ip_address: backplane IP address
+        :param subscriber_port: backplane subscriber port
+        :param publisher_port: backplane publisher port
+        """
+        super(ScenarioProbe, self).__init__(
+            back_plane_ip_address=back_plane_ip_address,
+            subscriber_port=subscriber_port,
+            publisher_port=publisher_port,
+            process_name='ScenarioProbe')
+        self.set_subscriber_topic('')
+        self.poller = zmq.Poller()
+        self.poller.register(self.subscriber, zmq.POLLIN)
+
+        # messages received while waiting for a component to be ready
+        self.backlog = collections.deque()
+
+    def receive(self, timeout):
+        """
+        :param timeout: seconds to wait for a message
+        :return: topic, payload and time.monotonic_ns() when received,
+                 or None. The time is None for a message kept while
+                 the components were starting.
+        """
+        if self.backlog:
+            return self.backlog.popleft()
+        if not self.poller.poll(max(timeout, 0) * 1000):
+            return None
+        topic, payload = self.subscriber.recv_multipart()
+        return (topic.decode(), msgpack.unpackb(payload, raw=False),
+                time.monotonic_ns())
+
+    def wait_ready(self, component, process, timeout):
+        """
+        Wait for the readiness announcement of a component. Other
+        messages are kept for the first step, without their time.
+        :param component: process name of the component
+        :param process: the component's subprocess.Popen
+        :param timeout: seconds to wait
+        :return: True if the component announced that it is ready
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and process.poll() is None:
+            if not self.poller.poll(100):
+                continue
+            topic, payload = self.subscriber.recv_multipart()
+            message = (topic.decode(), msgpack.unpackb(payload, raw=False),
+                       None)
+            if message[0] == READY_TOPIC and \
+                    message[1].get('component') == component:
+                return True
+            self.backlog.append(message)
+        return False
+
+
+def matches(expectation, topic, payload):
+    """
+    :param expectation: {'topic': topic, 'match': {key: value, ...}}
+    :param topic: message topic
+    :param payload: message payload
+    :return: True if the message has the topic, and the payload
+             has every key and value of the match
+    """
+    if topic != expectation['topic']:
+        return False
+    match = expectation.get('match', {})
+    if not match:
+        return True
+    if not isinstance(payload, dict):
+        return False
+    return all(key in payload and payload[key] == value
+               for key, value in match.items())
+
+
+def latency_summary(histogram):
+    """
+    :param histogram: a LatencyHistogram of ns
+    :return: the summary in milliseconds, or None when empty
+    """
+    if not histogram.count:
+        return None
+    summary = {'min': histogram.min / 1000000,
+               'mean': histogram.mean() / 1000000}
+    for percentile, value in histogram.report((50, 90, 99, 100))[
+            'percentiles']:
+        summary['p%g' % percentile] = value / 1000000
+    return summary
+
+
+class Scenario(object):
+    """
+    A headless version of a launcher spec in tests/.
+
+    The components are started without monitor, against simulated
+    hardware and local transports, on the runner's own backplane.
+    Each step publishes messages and waits for the expected messages
+    to arrive in order. Other messages are ignored, unless they match
+    a rejected pattern, which fails the step.
+
+    A scenario is a .scenario.json file next to the launcher specs:
+
+    {"name": "cr1",
+     "components": [{"script": "../../banyan_assets/crickit_gateway.py",
+                     "args": ["-k", "simulated"],
+                     "ready": "CrickitGateway", "wait": 10}],
+     "steps": [{"name": "query modes",
+                "publish": [{"topic": "to_hardware",
+                             "payload": {"command": "query_modes"}}],
+                "expect": [{"topic": "report_from_hardware",
+                            "match": {"report": "pin_modes"}}],
+                "reject": [{"topic": "report_from_hardware",
+                            "match": {"report": "error"}}],
+                "repeat": 1, "rate": 0, "timeout": 2}]}
+
+    Scripts are relative to the scenario file, and run from its
+    directory. The backplane address and ports are added to the
+    arguments of a component, unless its "banyan" is false. The next
+    component is started when the component announces that it is
+    ready, as the process name given by "ready", or after "wait"
+    seconds for a component that does not announce.
+
+    A step publishes its messages repeat times, rate times a second
+    or as fast as possible when the rate is 0, and expects its
+    expected messages after each repeat. The latency of an expected
+    message is from the publish of its repeat, or from the start of
+    the step when nothing is published. A step fails if the expected
+    messages have not all arrived timeout seconds after the last publish.
+
+    Messages published while the components were starting, such as the
+    set_mode commands of robot_control.py, may only match the first
+    step. They have no latency, and are counted as from_startup.
+    """
+
+    def __init__(self, path, runner):
+        """
+        :param path: scenario json file
+        :param runner: the ScenarioRunner
+        """
+        self.path = os.path.abspath(path)
+        self.directory = os.path.dirname(self.path)
+        self.runner = runner
+        with open(self.path) as scenario_file:
+            self.scenario = json.load(scenario_file)
+        self.name = self.scenario.get('name', os.path.basename(path))
+        self.processes = []
+
+    def start_components(self):
+        """
+        Start the components in order, waiting for each to start up.
+        :return: None, or an error message
+        """
+        # messages kept from the start up of an earlier scenario
+        self.runner.probe.backlog.clear()
+
+        for component in self.scenario.get('components', []):
+            script = component['script']
+            if self.runner.coverage:
+                command = [sys.executable, '-m', 'coverage', 'run',
+                           '--branch', '--append', script]
+            else:
+                command = [sys.executable, script]
+            command += component.get('args', [])
+            if component.get('banyan', True):
+                command += ['-b', self.runner.back_plane_ip_address,
+                            '-p', self.runner.publisher_port,
+                            '-s', self.runner.subscriber_port]
+
+            log_name = os.path.join(self.runner.log_directory, '%s.%s.log' % (
+                self.name, os.path.splitext(os.path.basename(script))[0]))
+            log = open(log_name, 'w')
+            process = subprocess.Popen(command, cwd=self.directory,
+                                       stdout=log, stderr=subprocess.STDOUT)
+            log.close()
+            self.processes.append((script, process))
+
+            if 'ready' in component:
+                ready = self.runner.probe.wait_ready(component['ready'],
+                                                    process,
+                                                    component.get('wait', 10))
+            else:
+                time.sleep(component.get('wait', 1))
+                ready = True
+            if process.poll() is not None:
+                return '%s exited with %d - see %s' % (
+                    script, process.returncode, log_name)
+            if not ready:
+                return '%s not ready - see %s' % (script, log_name)
+        return None
+
+    def stop_components(self):
+        """
+        Stop the components the same way Control-C does,
+        last started first.
+        :return: the exit code of each component
+        """
+        exit_codes = {}
+        for script, process in reversed(self.processes):
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+                try:
+                    process.wait(5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            exit_codes[script] = process.returncode
+        self.processes = []
+        return exit_codes
+
+    def run_step(self, step):
+        """
+        :param step: a step of the scenario
+        :return: the step result
+        """
+        probe = self.runner.probe
+        publish = step.get('publish', [])
+        repeat = step.get('repeat', 1) if publish else 0
+        interval = 1 / step['rate'] if step.get('rate') else 0
+        timeout = step.get('timeout', 2)
+        expect = step.get('expect', [])
+        expected = expect * max(repeat, 1)
+        reject = step.get('reject', [])
+
+        latency = LatencyHistogram()
+        rejected = []
+        sent_ns = []
+        matched = 0
+        from_startup = 0
+        first_match_ns = None
+
+        start_ns = time.monotonic_ns()
+        next_publish = time.monotonic()
+        deadline = None if repeat else next_publish + timeout
+
+        while matched < len(expected):
+            now = time.monotonic()
+            if len(sent_ns) < repeat:
+                if now >= next_publish:
+                    sent_ns.append(time.monotonic_ns())
+                    for message in publish:
+                        probe.publish_payload(message['payload'],
+                                              message['topic'])
+                    next_publish += interval
+                    if len(sent_ns) == repeat:
+                        deadline = time.monotonic() + timeout
+                    continue
+                wait = next_publish - now
+            else:
+                wait = deadline - now
+                if wait <= 0:
+                    break
+
+            message = probe.receive(wait)
+            if message is None:
+                continue
+            topic, payload, receive_ns = message
+
+            for pattern in reject:
+                if matches(pattern, topic, payload):
+                    rejected.append([topic, payload])
+
+            if matches(expected[matched], topic, payload):
+                matched += 1
+                if receive_ns is None:
+                    from_startup += 1
+                    continue
+                repetition = (matched - 1) // len(expect)
+                if repetition < len(sent_ns):
+                    latency.record(receive_ns - sent_ns[repetition])
+                else:
+                    latency.record(receive_ns - start_ns)
+                if first_match_ns is None:
+                    first_match_ns = receive_ns
+                last_match_ns = receive_ns
+
+        elapsed = (time.monotonic_ns() - start_ns) / 1000000000
+        result = {'name': step.get('name', ''),
+                  'passed': matched == len(expected) and not rejected,
+                  'published': len(sent_ns) * len(publish),
+                  'expected': len(expected),
+                  'matched': matched,
+                  'from_startup': from_startup,
+                  'elapsed': elapsed,
+                  'latency_ms': latency_summary(latency)}
+
+        # the rate that the expected messages arrived at
+        timed = matched - from_startup
+        if timed > 1 and last_match_ns > first_match_ns:
+            result['throughput'] = (timed - 1) / \
+                ((last_match_ns - first_match_ns) / 1000000000)
+        if matched < len(expected):
+            result['missing'] = expected[matched]
+        if rejected:
+            result['rejected'] = rejected[:10]
+        return result
+
+    def run(self):
+        """
+        Start the components, run the steps and stop the components.
+        :return: the scenario result
+        """
+        start = time.monotonic()
+        result = {'name': self.name,
+                  'file': os.path.relpath(self.path, TESTS_DIRECTORY),
+                  'steps': []}
+
+        try:
+            error = self.start_components()
+            if error:
+                result['error'] = error
+            else:
+                for step in self.scenario.get('steps', []):
+                    step_result = self.runner.check_baseline(
+                        self.name, self.run_step(step))
+                    # start up messages are only for the first step
+                    self.runner.probe.backlog.clear()
+                    result['steps'].append(step_result)
+                    print('  %-30s %s' % (step_result['name'],
+                                          'pass' if step_result['passed']
+                                          else 'FAIL'))
+                    if not step_result['passed']:
+                        break
+        except KeyboardInterrupt:
+            self.stop_components()
+            raise
+
+        exit_codes = self.stop_components()
+        result['exit_codes'] = exit_codes
+        result['passed'] = not error and \
+            all(step['passed'] for step in result['steps']) and \
+            len(result['steps']) == len(self.scenario.get('steps', []))
+        result['duration'] = time.monotonic() - start
+        return result
+
+
+class ScenarioRunner(object):
+    """
+    Runs headless scenarios and writes the results as json.
+
+    usage: scenario_runner.py [-h] [-b BACK_PLANE_IP_ADDRESS] [-c BASELINE]
+                              [-g TOLERANCE] [-i SCENARIOS [SCENARIOS ...]]
+                              [-l LOG_DIRECTORY] [-o RESULTS]
+                              [-p PUBLISHER_PORT] [-s SUBSCRIBER_PORT]
+                              [-v COVERAGE]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -b BACK_PLANE_IP_ADDRESS
+                                IP address for the runner's own backplane
+          -c BASELINE           Results json of an earlier run to check
+                                latency against, or None
+          -g TOLERANCE          Fraction that p99 latency may grow by
+                                before a step fails
+          -i SCENARIOS [SCENARIOS ...]
+                                Scenario files - all in tests/ by default
+          -l LOG_DIRECTORY      Directory for component output
+          -o RESULTS            Results json file
+          -p PUBLISHER_PORT     Publisher IP port
+          -s SUBSCRIBER_PORT    Subscriber IP port
+          -v COVERAGE           Run components under coverage: true or false
+    """
+
+    # p99 latency may always grow by this many milliseconds, so that
+    # steps with sub millisecond latency are not failed by noise
+    LATENCY_ALLOWANCE = 1.0
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        self.back_plane_ip_address = kwargs['back_plane_ip_address']
+        self.publisher_port = kwargs['publisher_port']
+        self.subscriber_port = kwargs['subscriber_port']
+        self.coverage = kwargs['coverage']
+        self.tolerance = kwargs['tolerance']
+        self.log_directory = kwargs['log_directory']
+        os.makedirs(self.log_directory, exist_ok=True)
+
+        # step results of the baseline, keyed by [scenario, step]
+        self.baseline = {}
+        if kwargs['baseline']:
+            with open(kwargs['baseline']) as baseline_file:
+                for scenario in json.load(baseline_file)['scenarios']:
+                    for step in scenario['steps']:
+                        self.baseline[(scenario['name'], step['name'])] = step
+
+        start_backplane(self.back_plane_ip_address, self.publisher_port,
+                        self.subscriber_port)
+        self.probe = ScenarioProbe(self.back_plane_ip_address,
+                                   self.subscriber_port, self.publisher_port)
+
+    def check_baseline(self, scenario_name, step):
+        """
+        Fail a step whose p99 latency grew beyond the tolerance.
+        :param scenario_name: name of the scenario
+        :param step: step result
+        :return: the step result
+        """
+        baseline = self.baseline.get((scenario_name, step['name']))
+        if not baseline or not baseline['latency_ms'] or \
+                not step['latency_ms']:
+            return step
+
+        limit = max(baseline['latency_ms']['p99'] * (1 + self.tolerance),
+                    baseline['latency_ms']['p99'] + self.LATENCY_ALLOWANCE)
+        step['baseline_p99_ms'] = baseline['latency_ms']['p99']
+        if step['latency_ms']['p99'] > limit:
+            step['passed'] = False
+            step['regression'] = 'p99 latency %.3f ms exceeds %.3f ms' % (
+                step['latency_ms']['p99'], limit)
+        return step
+
+    def run(self, scenario_files):
+        """
+        :param scenario_files: scenario json files
+        :return: the results
+        """
+        results = {'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'scenarios': []}
+        for scenario_file in scenario_files:
+            scenario = Scenario(scenario_file, self)
+            print(scenario.name)
+            result = scenario.run()
+            if 'error' in result:
+                print('  ' + result['error'])
+            print('  %s in %.1f seconds' % ('pass' if result['passed']
+                                            else 'FAIL', result['duration']))
+            results['scenarios'].append(result)
+        results['passed'] = all(scenario['passed']
+                                for scenario in results['scenarios'])
+        return results
+
+    def clean_up(self):
+        self.probe.clean_up()
+
+
+def scenario_runner():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", dest="back_plane_ip_address", default="127.0.0.1",
+                        help="IP address for the runner's own backplane")
+    parser.add_argument("-c", dest="baseline", default="None",
+                        help="Results json of an earlier run to check "
+                             "latency against, or None")
+    parser.add_argument("-g", dest="tolerance", default=".5",
+                        help="Fraction that p99 latency may grow by "
+                             "before a step fails")
+    parser.add_argument("-i", dest="scenarios", default=None, nargs="+",
+                        help="Scenario files - all in tests/ by default")
+    parser.add_argument("-l", dest="log_directory", default="scenario_logs",
+                        help="Directory for component output")
+    parser.add_argument("-o", dest="results", default="scenario_results.json",
+                        help="Results json file")
+    parser.add_argument("-p", dest="publisher_port", default='43164',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43165',
+                        help="Subscriber IP port")
+    parser.add_argument("-v", dest="coverage", default="false",
+                        help="Run components under coverage: true or false")
+
+    args = parser.parse_args()
+
+    if args.baseline == 'None':
+        args.baseline = None
+    if args.scenarios is None:
+        args.scenarios = sorted(glob.glob(os.path.join(
+            TESTS_DIRECTORY, '*', '*.scenario.json')))
+    kw_options = {
+        'back_plane_ip_address': args.back_plane_ip_address,
+        'publisher_port': args.publisher_port,
+        'subscriber_port': args.subscriber_port,
+        'baseline': args.baseline,
+        'tolerance': float(args.tolerance),
+        'log_directory': os.path.abspath(args.log_directory),
+        'coverage': args.coverage.lower() == 'true'}
+
+    runner = ScenarioRunner(**kw_options)
+    try:
+        results = runner.run(args.scenarios)
+    except KeyboardInterrupt:
+        runner.clean_up()
+        sys.exit(1)
+
+    with open(args.results, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    runner.clean_up()
+    sys.exit(0 if results['passed'] else 1)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    scenario_runner()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+
+"""
+telemetry_dashboard.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+# noinspection PyCompatibility
+from tkinter import Tk, Canvas, Label
+
+import numpy as np
+from python_banyan.banyan_base import BanyanBase
+
+from gui_receiver import GuiReceiver
+
+# the report helpers live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from latency_histogram import LatencyHistogram
+# noinspection PyUnresolvedReferences
+from report_batch import unpack_edge_batch, unpack_input_batch
+
+
+class RingBuffer(object):
+    """
+    The latest capacity samples of one input, as receive times
+    and values in preallocated NumPy arrays.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: number of samples kept
+        """
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.capacity = capacity
+        self.next = 0
+        self.count = 0
+
+    def append(self, receive_time, value):
+        """
+        :param receive_time: time.monotonic() when the report arrived
+        :param value: input value
+        """
+        self.times[self.next] = receive_time
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self):
+        """
+        :return: the latest value, or None when empty
+        """
+        if not self.count:
+            return None
+        return self.values[self.next - 1]
+
+    def window(self, start_time):
+        """
+        :param start_time: oldest receive time wanted
+        :return: times and values since start_time, oldest first
+        """
+        if self.count < self.capacity:
+            times = self.times[:self.count]
+            values = self.values[:self.count]
+        else:
+            times = np.roll(self.times, -self.next)
+            values = np.roll(self.values, -self.next)
+        first = np.searchsorted(times, start_time)
+        return times[first:], values[first:]
+
+
+def decimate(times, values, start_time, duration, columns):
+    """
+    Reduce samples to the minimum and maximum of each plot column,
+    so that the points drawn do not depend on the report rate.
+
+    :param times: sample times, oldest first
+    :param values: sample values
+    :param start_time: time at the left edge of the plot
+    :param duration: seconds across the plot
+    :param columns: plot width in pixels
+    :return: column numbers, minimums and maximums
+    """
+    if not len(times):
+        return times, values, values
+    column = ((times - start_time) * (columns / duration)).astype(np.int64)
+    np.clip(column, 0, columns - 1, out=column)
+    starts = np.flatnonzero(np.diff(column, prepend=-1))
+    return column[starts], np.minimum.reduceat(values, starts), \
+        np.maximum.reduceat(values, starts)
+
+
+class TopicStatistics(object):
+    """
+    Message rate, report latency and drops for one topic.
+
+    Latency is taken from the monotonic_ns a gateway adds to its
+    reports when numeric time stamps are enabled, so it is only
+    meaningful when the gateway runs on the same computer. Drops
+    are the increases in the running 'dropped' totals reported by
+    gateways, plus gaps in the sequence numbers of message_injector.py
+    messages.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.drops = 0
+        self.latency = LatencyHistogram()
+
+        # last running 'dropped' total reported on the topic
+        self.dropped = 0
+
+        # highest sequence number seen from each injector thread
+        self.sequences = {}
+
+        # message count and time at the start of the rate interval
+        self.interval_messages = 0
+        self.interval_start = time.monotonic()
+        self.rate = 0.0
+
+    def record(self, payload, receive_ns):
+        """
+        :param payload: a message on the topic
+        :param receive_ns: time.monotonic_ns() when it arrived
+        """
+        self.messages += 1
+        if not isinstance(payload, dict):
+            return
+
+        if 'monotonic_ns' in payload:
+            self.latency.record(receive_ns - payload['monotonic_ns'])
+        elif 'sent_ns' in payload:
+            self.latency.record(receive_ns - payload['sent_ns'])
+
+        # 'dropped' is a running total - count only the increase.
+        # A lower total means the gateway was restarted.
+        if 'dropped' in payload:
+            dropped = payload['dropped']
+            if dropped >= self.dropped:
+                self.drops += dropped - self.dropped
+            else:
+                self.drops += dropped
+            self.dropped = dropped
+
+        if 'sequence' in payload:
+            thread = payload.get('thread', 0)
+            previous = self.sequences.get(thread)
+            if previous is not None and payload['sequence'] > previous + 1:
+                self.drops += payload['sequence'] - previous - 1
+            if previous is None or payload['sequence'] > previous:
+                self.sequences[thread] = payload['sequence']
+
+    def update_rate(self):
+        """
+        Compute the message rate since the last update, and start
+        a new latency interval.
+        """
+        now = time.monotonic()
+        self.rate = (self.messages - self.interval_messages) / \
+            (now - self.interval_start)
+        self.interval_messages = self.messages
+        self.interval_start = now
+        latency, self.latency = self.latency, LatencyHistogram()
+        return latency
+
+    def summary(self, topic, latency):
+        """
+        :param topic: topic name
+        :param latency: LatencyHistogram for the interval
+        :return: a line of statistics
+        """
+        line = '%-22s %9.1f msg/s  drops %-7d' % (topic, self.rate,
+                                                  self.drops)
+        if latency.count:
+            line += '  latency ms p50 %.2f  p99 %.2f  max %.2f' % (
+                latency.percentile(50) / 1000000,
+                latency.percentile(99) / 1000000, latency.max / 1000000)
+        return line
+
+
+class TelemetryDashboard(GuiReceiver, BanyanBase):
+    """
+    Rolling plots of the inputs reported by a gateway, with message
+    rate, latency and drop statistics for each topic.
+
+    Reports are added to a ring buffer for each input as they arrive.
+    The plots are redrawn at a fixed frame rate, each reduced to a
+    minimum and maximum per pixel column, so the cost of drawing does
+    not grow with the report rate.
+
+    usage: telemetry_dashboard.py [-h] [-a SUBSCRIPTION_TOPICS [...]]
+                                  [-b BACK_PLANE_IP_ADDRESS] [-c CAPACITY]
+                                  [-f FRAME_RATE] [-n PROCESS_NAME]
+                                  [-p PUBLISHER_PORT] [-r ROWS]
+                                  [-s SUBSCRIBER_PORT] [-w WINDOW]
+                                  [-y RECEIVE_MODE]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -a SUBSCRIPTION_TOPICS [SUBSCRIPTION_TOPICS ...]
+                                Banyan topics space delimited: topic1 topic2
+          -b BACK_PLANE_IP_ADDRESS
+                                None or IP address used by Back Plane
+          -c CAPACITY           Samples kept for each input
+          -f FRAME_RATE         Plot updates per second
+          -n PROCESS_NAME       Set process name in banner
+          -p PUBLISHER_PORT     Publisher IP port
+          -r ROWS               Number of inputs plotted
+          -s SUBSCRIBER_PORT    Subscriber IP port
+          -w WINDOW             Seconds shown in each plot
+          -y RECEIVE_MODE       Receive messages: poll or sleep
+    """
+
+    # plot geometry in pixels
+    PLOT_WIDTH = 600
+    ROW_HEIGHT = 50
+    LABEL_WIDTH = 200
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        super(TelemetryDashboard, self).__init__(
+            back_plane_ip_address=kwargs['back_plane_ip_address'],
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name=kwargs['process_name'])
+
+        for topic in kwargs['subscription_topics']:
+            self.set_subscriber_topic(topic)
+
+        self.capacity = kwargs['capacity']
+        self.frame_interval = int(1000 / kwargs['frame_rate'])
+        self.rows = kwargs['rows']
+        self.window = kwargs['window']
+
+        # a RingBuffer for each [report type, pin]
+        self.series = {}
+
+        # TopicStatistics for each topic
+        self.statistics = {topic: TopicStatistics()
+                           for topic in kwargs['subscription_topics']}
+
+        self.main = Tk()
+        self.main.title('Banyan Telemetry Dashboard')
+
+        self.status = Label(self.main, font='Courier 9', justify='left',
+                            anchor='w')
+        self.status.pack(fill='x')
+
+        self.canvas = Canvas(self.main, background='white',
+                             width=self.LABEL_WIDTH + self.PLOT_WIDTH,
+                             height=self.rows * self.ROW_HEIGHT)
+        self.canvas.pack(fill='both', expand=True)
+
+        # the canvas items of each row are created once and moved
+        self.row_labels = []
+        self.row_lines = []
+        for row in range(self.rows):
+            top = row * self.ROW_HEIGHT
+            self.canvas.create_line(0, top + self.ROW_HEIGHT - 1,
+                                    self.LABEL_WIDTH + self.PLOT_WIDTH,
+                                    top + self.ROW_HEIGHT - 1, fill='grey90')
+            self.row_labels.append(self.canvas.create_text(
+                5, top + self.ROW_HEIGHT // 2, anchor='w', text='',
+                font='Courier 9'))
+            self.row_lines.append(self.canvas.create_line(
+                0, 0, 0, 0, fill='blue', state='hidden'))
+
+        self.main.protocol('WM_DELETE_WINDOW', self.on_closing)
+
+        self.start_receiving(kwargs['receive_mode'])
+        self.main.after(self.frame_interval, self.draw_frame)
+        self.main.after(1000, self.update_statistics)
+
+        try:
+            self.main.mainloop()
+        except KeyboardInterrupt:
+            self.on_closing()
+
+    def incoming_message_processing(self, topic, payload):
+        """
+        Record a message in the statistics, and add input reports
+        to the ring buffers.
+        :param topic: Message Topic string
+        :param payload: Message Data
+        """
+        receive_ns = time.monotonic_ns()
+        if topic not in self.statistics:
+            self.statistics[topic] = TopicStatistics()
+        self.statistics[topic].record(payload, receive_ns)
+
+        if not isinstance(payload, dict):
+            return
+
+        if payload.get('report') == 'input_batch':
+            reports = unpack_input_batch(payload)
+        elif payload.get('report') == 'edge_batch':
+            reports = unpack_edge_batch(payload)
+        else:
+            reports = [payload]
+
+        receive_time = receive_ns / 1000000000
+        for report in reports:
+            value = report.get('value')
+            if 'pin' not in report or \
+                    not isinstance(value, (int, float, bool)):
+                continue
+            key = (report['report'], report['pin'])
+            if key not in self.series:
+                self.series[key] = RingBuffer(self.capacity)
+            self.series[key].append(receive_time, value)
+
+    def display_input(self, key, value, timestamp):
+        # the plots are drawn by draw_frame
+        pass
+
+    def draw_frame(self):
+        """
+        Redraw the plots from the ring buffers.
+        """
+        now = time.monotonic()
+        start_time = now - self.window
+        keys = sorted(self.series, key=str)[:self.rows]
+
+        for row in range(self.rows):
+            if row >= len(keys):
+                self.canvas.itemconfigure(self.row_lines[row], state='hidden')
+                self.canvas.itemconfigure(self.row_labels[row], text='')
+                continue
+
+            report_type, pin = keys[row]
+            buffer = self.series[keys[row]]
+            self.canvas.itemconfigure(
+                self.row_labels[row],
+                text='%s %s: %g' % (report_type, pin, buffer.latest()))
+
+            times, values = buffer.window(start_time)
+            columns, minimums, maximums = decimate(
+                times, values, start_time, self.window, self.PLOT_WIDTH)
+            if not len(columns):
+                self.canvas.itemconfigure(self.row_lines[row], state='hidden')
+                continue
+
+            # scale the values in the window to the row
+            low = minimums.min()
+            high = maximums.max()
+            scale = (self.ROW_HEIGHT - 10) / (high - low) if high > low else 0
+            bottom = (row + 1) * self.ROW_HEIGHT - 5
+
+            x = columns + self.LABEL_WIDTH
+            # a vertical stroke from the minimum to the maximum of each column
+            points = np.empty((len(x) * 2, 2))
+            points[0::2, 0] = x
+            points[1::2, 0] = x
+            points[0::2, 1] = bottom - (minimums - low) * scale
+            points[1::2, 1] = bottom - (maximums - low) * scale
+
+            self.canvas.coords(self.row_lines[row], *points.ravel().tolist())
+            self.canvas.itemconfigure(self.row_lines[row], state='normal')
+
+        self.main.after(self.frame_interval, self.draw_frame)
+
+    def update_statistics(self):
+        """
+        Show the statistics of each topic, once a second.
+        """
+        lines = []
+        for topic in sorted(self.statistics):
+            statistics = self.statistics[topic]
+            latency = statistics.update_rate()
+            lines.append(statistics.summary(topic, latency))
+        lines.append('%d inputs' % len(self.series))
+        self.status.configure(text='\n'.join(lines))
+        self.main.after(1000, self.update_statistics)
+
+    def on_closing(self):
+        """
+        Destroy the window
+        """
+        self.stop_receiving()
+        self.clean_up()
+        self.main.destroy()
+
+
+def telemetry_dashboard():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="subscription_topics",
+                        default=["report_from_hardware"], nargs="+",
+                        help="Banyan topics space delimited: topic1 topic2")
+    parser.add_argument("-b", dest="back_plane_ip_address", default="None",
+                        help="None or IP address used by Back Plane")
+    parser.add_argument("-c", dest="capacity", default="4096",
+                        help="Samples kept for each input")
+    parser.add_argument("-f", dest="frame_rate", default="10",
+                        help="Plot updates per second")
+    parser.add_argument("-n", dest="process_name",
+                        default="TelemetryDashboard",
+                        help="Set process name in banner")
+    parser.add_argument("-p", dest="publisher_port", default='43124',
+                        help="Publisher IP port")
+    parser.add_argument("-r", dest="rows", default="8",
+                        help="Number of inputs plotted")
+    parser.add_argument("-s", dest="subscriber_port", default='43125',
+                        help="Subscriber IP port")
+    parser.add_argument("-w", dest="window", default="10",
+                        help="Seconds shown in each plot")
+    parser.add_argument("-y", dest="receive_mode", default="poll",
+                        help="Receive messages: poll - wake when a message "
+                             "arrives or sleep - check every frame")
+
+    args = parser.parse_args()
+
+    if args.back_plane_ip_address == 'None':
+        args.back_plane_ip_address = None
+    kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
+                  'publisher_port': args.publisher_port,
+                  'subscriber_port': args.subscriber_port,
+                  'process_name': args.process_name,
+                  'subscription_topics': args.subscription_topics,
+                  'capacity': int(args.capacity),
+                  'frame_rate': float(args.frame_rate),
+                  'rows': int(args.rows),
+                  'window': float(args.window),
+                  'receive_mode': args.receive_mode}
+
+    TelemetryDashboard(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+
+if __name__ == '__main__':
+    telemetry_dashboard()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+timestamp_benchmark.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import time
+import timeit
+
+import msgpack
+
+
+class TimeStampBenchmark(object):
+    """
+    This class compares the cost of the report time stamp styles
+    used by the gateways:
+
+    legacy    - a formatted string built for every report
+    cached    - a formatted string rebuilt once per second
+    numeric   - epoch seconds plus monotonic nanoseconds
+
+    For each style, the time to build and pack a digital input report
+    and the packed size of the report are printed.
+
+    usage: timestamp_benchmark.py [-h] [-n NUMBER_OF_REPORTS]
+    """
+
+    def __init__(self, number_of_reports=100000):
+        """
+        :param number_of_reports: number of reports built for each style
+        """
+        self.number_of_reports = number_of_reports
+
+        self.time_stamp = (None, None)
+
+        for name, style in (('legacy', self.legacy_report),
+                            ('cached', self.cached_report),
+                            ('numeric', self.numeric_report)):
+            elapsed = timeit.timeit(style, number=self.number_of_reports)
+            print('%-8s: %6.3f usec per report  %3d bytes packed' %
+                  (name, elapsed / self.number_of_reports * 1000000,
+                   len(style())))
+
+    # noinspection PyMethodMayBeStatic
+    def legacy_report(self):
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        payload = {'report': 'digital_input', 'pin': 1, 'value': 1,
+                   'timestamp': timestamp}
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def cached_report(self):
+        t = int(time.time())
+        second, string = self.time_stamp
+        if t != second:
+            string = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+            self.time_stamp = (t, string)
+        payload = {'report': 'digital_input', 'pin': 1, 'value': 1,
+                   'timestamp': string}
+        return msgpack.packb(payload, use_bin_type=True)
+
+    # noinspection PyMethodMayBeStatic
+    def numeric_report(self):
+        payload = {'report': 'digital_input', 'pin': 1, 'value': 1,
+                   'timestamp': time.time(),
+                   'monotonic_ns': time.monotonic_ns()}
+        return msgpack.packb(payload, use_bin_type=True)
+
+
+def timestamp_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", dest="number_of_reports", default="100000",
+                        help="Number of reports built for each time stamp style")
+
+    args = parser.parse_args()
+
+    TimeStampBenchmark(int(args.number_of_reports))
+
+
+if __name__ == '__main__':
+    timestamp_benchmark()
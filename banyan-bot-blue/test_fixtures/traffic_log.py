@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+traffic_log.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import mmap
+import os
+import struct
+
+# A traffic log is a pair of append-only files.
+#
+# name       - the data file. An 8 byte magic, then for each message a
+#              record header of monotonic receive time in ns, topic
+#              length and payload length, followed by the topic and the
+#              payload exactly as received - the payload is not unpacked.
+# name.index - for each message, the offset of its record in the data
+#              file and its receive time, so that a reader can find any
+#              message without reading the ones before it.
+#
+# All integers are little endian. The data and index files are buffered
+# separately, so after an unclean exit either one may be ahead of the
+# other. The reader drops index entries for records that are not
+# complete in the data file, and indexes the complete records that
+# follow the last index entry.
+MAGIC = b'BANLOG1\n'
+RECORD_HEADER = struct.Struct('<QHI')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+
+def index_path(path):
+    """
+    :param path: data file path
+    :return: index file path
+    """
+    return path + '.index'
+
+
+class TrafficLogWriter(object):
+    """
+    Appends messages to a traffic log.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: data file path - an existing log is replaced
+        """
+        self.data = open(path, 'wb')
+        self.index = open(index_path(path), 'wb')
+        self.data.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.messages = 0
+        self.bytes = 0
+
+    def write(self, receive_ns, topic, payload):
+        """
+        :param receive_ns: time.monotonic_ns() when the message arrived
+        :param topic: topic bytes
+        :param payload: msgpack payload bytes
+        """
+        self.data.write(RECORD_HEADER.pack(receive_ns, len(topic),
+                                           len(payload)))
+        self.data.write(topic)
+        self.data.write(payload)
+        self.index.write(INDEX_ENTRY.pack(self.offset, receive_ns))
+        length = RECORD_HEADER.size + len(topic) + len(payload)
+        self.offset += length
+        self.messages += 1
+        self.bytes += length
+
+    def flush(self):
+        """
+        Hand the buffered records to the operating system.
+        """
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class TrafficLogReader(object):
+    """
+    Reads a traffic log through a memory map of its data file.
+
+    Messages are returned as receive time in ns, topic bytes and
+    payload bytes, and can be read by number or iterated.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: data file path
+        """
+        self.file = open(path, 'rb')
+        if os.path.getsize(path) <= len(MAGIC):
+            raise RuntimeError('Empty traffic log: ', path)
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise RuntimeError('Not a traffic log: ', path)
+
+        try:
+            with open(index_path(path), 'rb') as index:
+                entries = index.read()
+            entries = entries[:len(entries) - len(entries) % INDEX_ENTRY.size]
+            self.offsets = [offset for offset, receive_ns in
+                            INDEX_ENTRY.iter_unpack(entries)]
+        except FileNotFoundError:
+            self.offsets = []
+
+        # records written after the last index entry
+        self.scan()
+
+    def scan(self):
+        """
+        Drop index entries for records that are not complete in the
+        data file, then index the complete records that follow the
+        last index entry.
+        """
+        while self.offsets and not self.complete(self.offsets[-1]):
+            self.offsets.pop()
+
+        if self.offsets:
+            offset = self.offsets[-1] + self.record_length(self.offsets[-1])
+        else:
+            offset = len(MAGIC)
+        while self.complete(offset):
+            self.offsets.append(offset)
+            offset += self.record_length(offset)
+
+    def complete(self, offset):
+        """
+        :param offset: offset of a record in the data file
+        :return: True if the whole record is in the data file
+        """
+        if offset + RECORD_HEADER.size > len(self.data):
+            return False
+        return offset + self.record_length(offset) <= len(self.data)
+
+    def record_length(self, offset):
+        """
+        :param offset: offset of a record in the data file
+        :return: length of the record
+        """
+        receive_ns, topic_length, payload_length = \
+            RECORD_HEADER.unpack_from(self.data, offset)
+        return RECORD_HEADER.size + topic_length + payload_length
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, number):
+        """
+        :param number: message number
+        :return: receive time in ns, topic bytes and payload bytes
+        """
+        offset = self.offsets[number]
+        receive_ns, topic_length, payload_length = \
+            RECORD_HEADER.unpack_from(self.data, offset)
+        topic_start = offset + RECORD_HEADER.size
+        payload_start = topic_start + topic_length
+        return (receive_ns, self.data[topic_start:payload_start],
+                self.data[payload_start:payload_start + payload_length])
+
+    def __iter__(self):
+        for number in range(len(self.offsets)):
+            yield self[number]
+
+    def duration(self):
+        """
+        :return: seconds from the first message to the last
+        """
+        if not self.offsets:
+            return 0.0
+        return (self[-1][0] - self[0][0]) / 1000000000
+
+    def close(self):
+        self.data.close()
+        self.file.close()
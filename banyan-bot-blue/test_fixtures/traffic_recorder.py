@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+traffic_recorder.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+import zmq
+from python_banyan.banyan_base import BanyanBase
+
+from traffic_log import TrafficLogWriter
+
+# the socket options live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from zmq_options import SocketOptions
+
+
+class TrafficRecorder(SocketOptions, BanyanBase):
+    """
+    Records the Banyan messages on the backplane to a traffic log,
+    for traffic_replayer.py to publish again.
+
+    Messages are written as received, without being unpacked.
+    Use the throughput socket profile for busy backplanes, so
+    that bursts are not dropped by the subscriber.
+
+    usage: traffic_recorder.py [-h] [-a SUBSCRIPTION_TOPICS [...]]
+                               [-b BACK_PLANE_IP_ADDRESS] [-d DURATION]
+                               [-n PROCESS_NAME] [-o LOG_FILE]
+                               [-p PUBLISHER_PORT] [-s SUBSCRIBER_PORT]
+                               [-t LOOP_TIME] [-y RECEIVE_MODE]
+                               [-z SOCKET_PROFILE]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -a SUBSCRIPTION_TOPICS [SUBSCRIPTION_TOPICS ...]
+                                Banyan topics space delimited - all by default
+          -b BACK_PLANE_IP_ADDRESS
+                                None or IP address used by Back Plane
+          -d DURATION           Seconds to record for - 0 is until Control-C
+          -n PROCESS_NAME       Set process name in banner
+          -o LOG_FILE           Traffic log file
+          -p PUBLISHER_PORT     Publisher IP port
+          -s SUBSCRIBER_PORT    Subscriber IP port
+          -t LOOP_TIME          Event Loop Timer in seconds
+          -y RECEIVE_MODE       Receive loop: sleep or poll
+          -z SOCKET_PROFILE     Socket profile: default, low_latency
+                                or throughput
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        super(TrafficRecorder, self).__init__(
+            back_plane_ip_address=kwargs['back_plane_ip_address'],
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name=kwargs['process_name'],
+            loop_time=kwargs['loop_time'])
+
+        self.apply_socket_profile(kwargs['socket_profile'],
+                                  kwargs['receive_mode'])
+
+        self.log = TrafficLogWriter(kwargs['log_file'])
+        print('Recording to: ', kwargs['log_file'])
+
+        for topic in kwargs['subscription_topics']:
+            self.set_subscriber_topic(topic)
+
+        self.start_time = time.monotonic()
+        self.cleaned_up = False
+
+        if kwargs['duration']:
+            threading.Thread(target=self.finish, args=(kwargs['duration'],),
+                             daemon=True).start()
+
+        try:
+            self.receive_loop()
+        except KeyboardInterrupt:
+            self.clean_up()
+            sys.exit(0)
+
+    def receive_messages(self):
+        """
+        Write all of the messages waiting in the subscriber socket
+        to the log.
+
+        :return: the number of messages recorded
+        """
+        depth = 0
+        while True:
+            try:
+                topic, payload = self.subscriber.recv_multipart(zmq.NOBLOCK)
+            # if no messages are available, zmq throws this exception
+            except zmq.error.Again:
+                break
+            self.log.write(time.monotonic_ns(), topic, payload)
+            depth += 1
+
+        if depth:
+            self.queue_depths.record(depth)
+        return depth
+
+    def receive_idle(self):
+        """
+        Flush the log once the waiting messages are written.
+        """
+        self.log.flush()
+
+    # noinspection PyMethodMayBeStatic
+    def finish(self, duration):
+        """
+        Stop the receive loop the same way Control-C does.
+        :param duration: seconds to record for
+        """
+        time.sleep(duration)
+        os.kill(os.getpid(), signal.SIGINT)
+
+    def clean_up(self):
+        """
+        Close the log and report what was recorded.
+        """
+        if self.cleaned_up:
+            return
+        self.cleaned_up = True
+
+        self.log.close()
+        elapsed = time.monotonic() - self.start_time
+        print('Recorded %d messages, %d bytes in %.1f seconds' %
+              (self.log.messages, self.log.bytes, elapsed))
+        super(TrafficRecorder, self).clean_up()
+
+
+def traffic_recorder():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="subscription_topics", default=[""],
+                        nargs="+",
+                        help="Banyan topics space delimited - all by default")
+    parser.add_argument("-b", dest="back_plane_ip_address", default="None",
+                        help="None or IP address used by Back Plane")
+    parser.add_argument("-d", dest="duration", default="0",
+                        help="Seconds to record for - 0 is until Control-C")
+    parser.add_argument("-n", dest="process_name", default="TrafficRecorder",
+                        help="Set process name in banner")
+    parser.add_argument("-o", dest="log_file", default="traffic.log",
+                        help="Traffic log file")
+    parser.add_argument("-p", dest="publisher_port", default='43124',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43125',
+                        help="Subscriber IP port")
+    parser.add_argument("-t", dest="loop_time", default=".01",
+                        help="Event Loop Timer in seconds")
+    parser.add_argument("-y", dest="receive_mode", default="poll",
+                        help="Receive loop: sleep or poll")
+    parser.add_argument("-z", dest="socket_profile", default="throughput",
+                        help="Socket profile: default, low_latency "
+                             "or throughput")
+
+    args = parser.parse_args()
+
+    if args.back_plane_ip_address == 'None':
+        args.back_plane_ip_address = None
+    kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
+                  'publisher_port': args.publisher_port,
+                  'subscriber_port': args.subscriber_port,
+                  'process_name': args.process_name,
+                  'loop_time': float(args.loop_time),
+                  'subscription_topics': args.subscription_topics,
+                  'duration': float(args.duration),
+                  'log_file': args.log_file,
+                  'receive_mode': args.receive_mode,
+                  'socket_profile': args.socket_profile}
+
+    TrafficRecorder(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    traffic_recorder()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+"""
+traffic_replayer.py
+
+ Copyright (c) 2019 Alan Yorinks All right reserved.
+
+ Python Banyan is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+from python_banyan.banyan_base import BanyanBase
+
+from traffic_log import TrafficLogReader
+
+# the socket options live with the banyan assets
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'banyan_assets'))
+
+# noinspection PyUnresolvedReferences
+from latency_histogram import LatencyHistogram
+# noinspection PyUnresolvedReferences
+from zmq_options import SocketOptions
+
+
+class TrafficReplayer(SocketOptions, BanyanBase):
+    """
+    Publishes the messages of a traffic log recorded by
+    traffic_recorder.py, with their recorded spacing scaled by
+    the replay speed, or as fast as possible.
+
+    The recorded payload bytes are published unchanged. How late
+    each message was published compared with its scheduled time is
+    reported on exit, so that a replay that could not keep up is seen.
+
+    usage: traffic_replayer.py [-h] [-a TOPICS [TOPICS ...]]
+                               [-b BACK_PLANE_IP_ADDRESS] [-i LOG_FILE]
+                               [-l LOOPS] [-n PROCESS_NAME]
+                               [-p PUBLISHER_PORT] [-s SUBSCRIBER_PORT]
+                               [-x SPEED] [-z SOCKET_PROFILE]
+
+        optional arguments:
+          -h, --help            show this help message and exit
+          -a TOPICS [TOPICS ...]
+                                Topic prefixes replayed - all by default
+          -b BACK_PLANE_IP_ADDRESS
+                                None or IP address used by Back Plane
+          -i LOG_FILE           Traffic log file
+          -l LOOPS              Number of times the log is replayed -
+                                0 is until Control-C
+          -n PROCESS_NAME       Set process name in banner
+          -p PUBLISHER_PORT     Publisher IP port
+          -s SUBSCRIBER_PORT    Subscriber IP port
+          -x SPEED              Replay speed: 1 is as recorded, 2 is twice
+                                as fast, max is without waiting
+          -z SOCKET_PROFILE     Socket profile: default, low_latency
+                                or throughput
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: see the argparse section at the bottom of this file.
+        """
+        super(TrafficReplayer, self).__init__(
+            back_plane_ip_address=kwargs['back_plane_ip_address'],
+            subscriber_port=kwargs['subscriber_port'],
+            publisher_port=kwargs['publisher_port'],
+            process_name=kwargs['process_name'])
+
+        self.apply_socket_profile(kwargs['socket_profile'])
+
+        self.log = TrafficLogReader(kwargs['log_file'])
+        print('Replaying %d messages, %.1f seconds recorded' %
+              (len(self.log), self.log.duration()))
+
+        self.topics = [topic.encode() for topic in kwargs['topics']]
+        self.speed = kwargs['speed']
+
+        # ns that each message was published after its scheduled time
+        self.lateness = LatencyHistogram()
+        self.published = 0
+        self.cleaned_up = False
+
+        try:
+            start = time.monotonic()
+            loop = 0
+            while not kwargs['loops'] or loop < kwargs['loops']:
+                self.replay()
+                loop += 1
+            elapsed = time.monotonic() - start
+            print('Published %d messages in %.2f seconds (%.1f/s)' %
+                  (self.published, elapsed,
+                   self.published / elapsed if elapsed else 0.0))
+        except KeyboardInterrupt:
+            pass
+        self.clean_up()
+
+    def replay(self):
+        """
+        Publish the log once.
+        """
+        first_ns = self.log[0][0]
+        start_ns = time.monotonic_ns()
+        for receive_ns, topic, payload in self.log:
+            if self.topics and not topic.startswith(tuple(self.topics)):
+                continue
+
+            if self.speed:
+                scheduled_ns = start_ns + int((receive_ns - first_ns) /
+                                              self.speed)
+                delay = scheduled_ns - time.monotonic_ns()
+                if delay > 0:
+                    time.sleep(delay / 1000000000)
+                self.lateness.record(max(time.monotonic_ns() -
+                                         scheduled_ns, 0))
+
+            self.publisher.send_multipart([topic, payload])
+            self.published += 1
+
+    def clean_up(self):
+        """
+        Report the lateness and close the log.
+        """
+        if self.cleaned_up:
+            return
+        self.cleaned_up = True
+
+        if self.lateness.count:
+            line = 'Lateness usec: mean %.1f' % (self.lateness.mean() / 1000)
+            for percentile, value in self.lateness.report()['percentiles']:
+                line += '  p%g %.1f' % (percentile, value / 1000)
+            print(line)
+        self.log.close()
+        super(TrafficReplayer, self).clean_up()
+
+
+def traffic_replayer():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", dest="topics", default=[], nargs="+",
+                        help="Topic prefixes replayed - all by default")
+    parser.add_argument("-b", dest="back_plane_ip_address", default="None",
+                        help="None or IP address used by Back Plane")
+    parser.add_argument("-i", dest="log_file", default="traffic.log",
+                        help="Traffic log file")
+    parser.add_argument("-l", dest="loops", default="1",
+                        help="Number of times the log is replayed - "
+                             "0 is until Control-C")
+    parser.add_argument("-n", dest="process_name", default="TrafficReplayer",
+                        help="Set process name in banner")
+    parser.add_argument("-p", dest="publisher_port", default='43124',
+                        help="Publisher IP port")
+    parser.add_argument("-s", dest="subscriber_port", default='43125',
+                        help="Subscriber IP port")
+    parser.add_argument("-x", dest="speed", default="1",
+                        help="Replay speed: 1 is as recorded, 2 is twice "
+                             "as fast, max is without waiting")
+    parser.add_argument("-z", dest="socket_profile", default="throughput",
+                        help="Socket profile: default, low_latency "
+                             "or throughput")
+
+    args = parser.parse_args()
+
+    if args.back_plane_ip_address == 'None':
+        args.back_plane_ip_address = None
+
+    # a speed of 0 is without waiting
+    if args.speed == 'max':
+        speed = 0.0
+    else:
+        speed = float(args.speed)
+        if speed <= 0:
+            raise RuntimeError('Unknown replay speed: ', args.speed)
+
+    kw_options = {'back_plane_ip_address': args.back_plane_ip_address,
+                  'publisher_port': args.publisher_port,
+                  'subscriber_port': args.subscriber_port,
+                  'process_name': args.process_name,
+                  'topics': args.topics,
+                  'log_file': args.log_file,
+                  'loops': int(args.loops),
+                  'speed': speed,
+                  'socket_profile': args.socket_profile}
+
+    TrafficReplayer(**kw_options)
+
+
+# signal handler function called when Control-C occurs
+# noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
+def signal_handler(sig, frame):
+    print('Exiting Through Signal Handler')
+    raise KeyboardInterrupt
+
+
+# listen for SIGINT
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+if __name__ == '__main__':
+    traffic_replayer()